@@ -1,62 +1,230 @@
-from fastapi import APIRouter, Request, Depends, HTTPException, status
-from typing import List, Optional
+from fastapi import APIRouter, Request, Response, Depends, HTTPException, Query, status
+from typing import Dict, List, Optional
 
-from ...dependencies import limiter
-from ...models.product import ProductDetail, ProductSummary
-from ...repositories.product_repository import ProductRepository
-from ...services import recommender
+from ...core.config import settings
+from ...core.serialization import FastJSONResponse, dumps
+from ...dependencies import limiter, catalog, response_cache, executor, require_admin_token
+from ...models.product import (
+    ProductDetail, ProductSummary, ProductUpsert, RelatedBatchRequest, RelatedBatchResponse, Review, ReviewCreate,
+    SearchResponse
+)
+from ...repositories.listing import InvalidCursorError, SortOption
+from ...repositories.product_repository import CatalogUpdateError, ProductRepository
+from ...repositories.reviews import ReviewSortOption
+from ...services.response_cache import CachedResponse
 
 # Use dependency injection for the repository
 # This makes the endpoint easier to test
 def get_repository() -> ProductRepository:
-    """Dependency to provide the repository instance."""
-    return ProductRepository()
+    """Dependency to provide the current catalog snapshot, shared by all requests."""
+    return catalog.repository
+
+def validator_headers(etag: str) -> Dict[str, str]:
+    """Returns the ETag and Cache-Control headers of a cacheable response."""
+    return {"ETag": etag, "Cache-Control": f"public, max-age={settings.RESPONSE_CACHE_CONTROL_MAX_AGE}"}
+
+def client_has(request: Request, etag: str) -> bool:
+    """Returns True if the request's If-None-Match header matches the given ETag."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    client_etags = {etag.strip().removeprefix("W/") for etag in if_none_match.split(",")}
+    return etag in client_etags or "*" in client_etags
+
+def cached_json_response(request: Request, cached: CachedResponse) -> Response:
+    """
+    Builds the response for a cached body, answering 304 Not Modified if the client already has it.
+    """
+    headers = validator_headers(cached.etag)
+    if client_has(request, cached.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+# Optional sections of the item detail response
+DETAIL_INCLUDE_OPTIONS = {"related"}
 
 router = APIRouter()
 @router.get(
     "/items",
     response_model=List[ProductSummary],
     summary="List and Filter Products",
-    description="Fetches a list of all products, with optional filters for category and brand."
+    description=(
+        "Fetches a list of all products, with optional filters for category and brand. "
+        "Supports sorting, cursor pagination (the next page's cursor is returned in the X-Next-Cursor header) "
+        "and projecting each product to a subset of fields."
+    )
 )
-@limiter.limit("200/minute")
+@limiter.limit(settings.RATE_LIMIT_ITEMS)
 async def get_all_items(
     request: Request,
     category: Optional[str] = None,
     brand: Optional[str] = None,
+    sort: Optional[SortOption] = Query(None, description="Sort order. Defaults to catalog order."),
+    limit: Optional[int] = Query(None, ge=1, le=settings.ITEMS_MAX_PAGE_SIZE, description="Maximum number of products to return."),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page's X-Next-Cursor header."),
+    fields: Optional[str] = Query(None, description="Comma-separated list of fields to return, e.g. 'id,price'."),
     repo: ProductRepository = Depends(get_repository)
 ):
     """
     Endpoint to retrieve a list of product summaries.
-    Supports filtering by category name and brand.
+    Supports filtering by category name and brand, sorting by price or rating, and cursor pagination.
+    - A page only depends on the catalog version and the query parameters, so its ETag is derived from them and
+      conditional requests are answered 304 Not Modified without building the page.
     """
-    products = repo.find_all_products(category=category, brand=brand)
-    return products
+    etag = response_cache.make_etag(repr((repo.version, category, brand, sort, limit, cursor, fields)).encode())
+    if client_has(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=validator_headers(etag))
+
+    projection = None
+    if fields:
+        projection = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown_fields = [field for field in projection if field not in ProductSummary.model_fields]
+        if unknown_fields:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(unknown_fields)}."
+            )
+
+    try:
+        products, next_cursor = await executor.run(
+            repo.find_products_page, category=category, brand=brand, sort=sort, limit=limit, cursor=cursor
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    headers = validator_headers(etag)
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if projection:
+        products = [{field: product[field] for field in projection} for product in products]
+    # Summaries are built from catalog data validated at load time, so they are encoded without re-validation
+    return FastJSONResponse(content=products, headers=headers)
+
+@router.get(
+    "/items/search",
+    response_model=SearchResponse,
+    summary="Search Products",
+    description=(
+        "Full-text search over the title, brand, description and specifications of the products, ignoring accents "
+        "and case. The last word of the query matches as a prefix, for typeahead. Results are ranked by relevance "
+        "(BM25) and come with the number of matches per category and brand."
+    )
+)
+@limiter.limit(settings.RATE_LIMIT_SEARCH)
+async def search_items(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200, description="Words to search for, e.g. 'camara acc'."),
+    category: Optional[str] = Query(None, description="Only return products of this category name."),
+    brand: Optional[str] = Query(None, description="Only return products of this brand."),
+    limit: int = Query(settings.SEARCH_DEFAULT_PAGE_SIZE, ge=1, le=settings.ITEMS_MAX_PAGE_SIZE, description="Maximum number of products to return."),
+    offset: int = Query(0, ge=0, le=10_000, description="Number of results to skip."),
+    repo: ProductRepository = Depends(get_repository)
+):
+    """
+    Endpoint to search products by text.
+    - Answered from the snapshot's inverted index; typeahead prefixes are resolved without scanning the catalog.
+    - Served from the response cache, with ETag revalidation (304 Not Modified), since typeahead repeats prefixes.
+    """
+    cache_key = ("search", q, category, brand, limit, offset)
+    cached = response_cache.get(repo.version, cache_key)
+    if cached is None:
+        def render() -> bytes:
+            return dumps(repo.search_products(q, category=category, brand=brand, limit=limit, offset=offset))
+
+        cached = response_cache.put(repo.version, cache_key, await executor.run(render))
+    return cached_json_response(request, cached)
 
 @router.get(
     "/items/{item_id}",
     response_model=ProductDetail,
     summary="Get Product Details",
-    description="Fetches all details for a specific product, including seller and reviews."
+    description=(
+        "Fetches all details for a specific product, including seller, rating histogram and the first page of reviews "
+        "(the rest are paginated by /items/{item_id}/reviews). "
+        "Related products are only included with include=related; otherwise fetch them from /items/{item_id}/related."
+    )
 )
-@limiter.limit("100/minute")
+@limiter.limit(settings.RATE_LIMIT_ITEM_DETAIL)
 async def get_item_details(
     item_id: str,
     request: Request,
+    include: Optional[str] = Query(None, description="Comma-separated optional sections to embed. Supported: related."),
     repo: ProductRepository = Depends(get_repository)
 ):
     """
     Endpoint to retrieve the full details of a single product.
     - Handles 'Not Found' errors gracefully.
     - Protected by a rate limit of 100 requests per minute per IP.
+    - Served from the response cache, with ETag revalidation (304 Not Modified). Cached responses survive updates
+      to other products (and, without related products, to other products of the same category).
+    - Recommendations are left out of the critical path unless requested with include=related.
+    """
+    sections = {section.strip() for section in include.split(",") if section.strip()} if include else set()
+    unknown_sections = sections - DETAIL_INCLUDE_OPTIONS
+    if unknown_sections:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown include options: {', '.join(sorted(unknown_sections))}."
+        )
+    include_related = "related" in sections
+
+    def render() -> Optional[bytes]:
+        product_details = repo.find_product_details_by_id(
+            item_id, include_related=include_related, reviews_limit=settings.REVIEWS_PAGE_SIZE
+        )
+        if not product_details:
+            return None
+        return dumps(product_details)
+
+    cache_key = ("detail", item_id, include_related)
+    cached = response_cache.get(repo.version, cache_key, repo.changed_since)
+    if cached is None:
+        body = await executor.run(render)
+        if body is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Product with ID '{item_id}' not found."
+            )
+        cached = response_cache.put(repo.version, cache_key, body, repo.response_tags(item_id, include_related))
+    return cached_json_response(request, cached)
+
+@router.get(
+    "/items/{item_id}/reviews",
+    response_model=List[Review],
+    summary="List Product Reviews",
+    description=(
+        "Fetches the reviews of a product, most recent first or sorted by rating, with cursor pagination "
+        "(the next page's cursor is returned in the X-Next-Cursor header)."
+    )
+)
+@limiter.limit(settings.RATE_LIMIT_REVIEW_PAGES)
+async def get_item_reviews(
+    item_id: str,
+    request: Request,
+    sort: ReviewSortOption = Query("recent", description="Sort order: recent, rating_desc (highest first) or rating_asc (lowest first)."),
+    limit: int = Query(settings.REVIEWS_PAGE_SIZE, ge=1, le=settings.REVIEWS_MAX_PAGE_SIZE, description="Maximum number of reviews to return."),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page's X-Next-Cursor header or the item's reviews_next_cursor."),
+    repo: ProductRepository = Depends(get_repository)
+):
     """
-    product_details = repo.find_product_details_by_id(item_id)
-    if not product_details:
+    Endpoint to page through the reviews of a product.
+    - Pages are slices of the product's reviews pre-sorted at load time, so their cost does not grow with the
+      number of reviews of the product.
+    - Handles 'Not Found' errors and malformed cursors gracefully.
+    """
+    try:
+        page = await executor.run(repo.find_reviews_page, item_id, sort=sort, limit=limit, cursor=cursor)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if page is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Product with ID '{item_id}' not found."
         )
-    return product_details
+
+    reviews, next_cursor = page
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return FastJSONResponse(content=reviews, headers=headers)
 
 @router.get(
     "/items/{item_id}/related",
@@ -64,7 +232,7 @@ async def get_item_details(
     summary="Get Related Products",
     description="Fetches a list of recommended products based on content similarity using an ML model."
 )
-@limiter.limit("50/minute")
+@limiter.limit(settings.RATE_LIMIT_RELATED)
 async def get_related_items(
     item_id: str,
     request: Request,
@@ -73,21 +241,135 @@ async def get_related_items(
     """
     Endpoint to retrieve AI-powered product recommendations.
     - Protected by a stricter rate limit to account for higher computational cost.
+    - Served from the response cache, with ETag revalidation (304 Not Modified).
     """
-    all_products_df = repo.get_all_products_for_recommendation()
-    
     # Check if the base product exists
-    if item_id not in all_products_df['id'].values:
+    if not repo.has_product(item_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Product with ID '{item_id}' not found, cannot generate recommendations."
         )
         
-    recommended_ids = recommender.generate_recommendations(item_id, all_products_df)
-    
-    if not recommended_ids:
-        return []
-
-    recommended_products_summary = repo.find_products_by_ids(recommended_ids)
-    
-    return recommended_products_summary
\ No newline at end of file
+    def render() -> bytes:
+        recommended_ids = repo.recommendation_index.recommend(item_id)
+        related_products = repo.find_products_by_ids(recommended_ids)
+        return dumps(related_products)
+
+    cache_key = ("related", item_id)
+    cached = response_cache.get(repo.version, cache_key, repo.changed_since)
+    if cached is None:
+        cached = response_cache.put(
+            repo.version, cache_key, await executor.run(render), repo.response_tags(item_id, include_related=True)
+        )
+    return cached_json_response(request, cached)
+
+@router.post(
+    "/items/related:batch",
+    response_model=RelatedBatchResponse,
+    summary="Get Related Products in Batch",
+    description=(
+        "Fetches the recommended products of several products at once, as /items/{item_id}/related would return them. "
+        f"Accepts up to {settings.RELATED_BATCH_MAX_IDS} product IDs per request."
+    )
+)
+@limiter.limit(settings.RATE_LIMIT_RELATED_BATCH)
+async def get_related_items_batch(
+    batch: RelatedBatchRequest,
+    request: Request,
+    repo: ProductRepository = Depends(get_repository)
+):
+    """
+    Endpoint to retrieve the recommendations of many products in a single call, e.g. for carousels or emails.
+    - Products of the same category are recommended together, from the precomputed neighbour table
+      (or, for more neighbours than it holds, scored with a single matrix product).
+    - Unknown IDs are listed in not_found instead of failing the whole batch.
+    """
+    item_ids = list(dict.fromkeys(batch.ids))
+    if len(item_ids) > settings.RELATED_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.RELATED_BATCH_MAX_IDS} product IDs can be requested at once."
+        )
+
+    def render() -> bytes:
+        known_ids = [item_id for item_id in item_ids if repo.has_product(item_id)]
+        recommendations = repo.recommendation_index.recommend_many(known_ids, top_n=batch.top_n)
+        return dumps({
+            "results": {
+                item_id: repo.find_products_by_ids(recommended_ids)
+                for item_id, recommended_ids in recommendations.items()
+            },
+            "not_found": [item_id for item_id in item_ids if item_id not in recommendations]
+        })
+
+    return Response(content=await executor.run(render), media_type="application/json")
+
+@router.put(
+    "/items/{item_id}",
+    response_model=ProductDetail,
+    summary="Create or Replace a Product",
+    description=(
+        "Creates the product, or replaces it if it already exists, without reloading the catalog. "
+        "Responds 201 when the product is created and 200 when it is replaced. Requires the admin token. "
+        "The change is kept in the memory of the worker process that receives it, until the catalog is reloaded."
+    ),
+    dependencies=[Depends(require_admin_token)]
+)
+@limiter.limit(settings.RATE_LIMIT_UPSERT)
+async def upsert_item(item_id: str, product: ProductUpsert, request: Request):
+    """
+    Endpoint to insert or update a single product in the in-memory catalog.
+    - The update is applied to a copy-on-write snapshot, published atomically once its indexes are updated
+      and the recommendation model of the affected categories is refitted.
+    - Returns 400 if the product refers to an unknown category, seller or payment method.
+    - Not persisted nor shared with other worker processes (see CatalogProvider.apply).
+    """
+    record = {"id": item_id, **product.model_dump()}
+    created = False
+
+    def update(repository: ProductRepository) -> ProductRepository:
+        # Decided on the snapshot the update is applied to, while holding the catalog's update lock
+        nonlocal created
+        created = not repository.has_product(item_id)
+        return repository.with_products([record])
+
+    try:
+        repo = await executor.run(catalog.apply, update)
+    except CatalogUpdateError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    product_details = repo.find_product_details_by_id(item_id, include_related=False)
+    return FastJSONResponse(
+        content=product_details,
+        status_code=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+    )
+
+@router.post(
+    "/items/{item_id}/reviews",
+    response_model=Review,
+    status_code=status.HTTP_201_CREATED,
+    summary="Add a Product Review",
+    description=(
+        "Adds a review to a product, updating its rating aggregates without reloading the catalog. "
+        "Requires the admin token. The review is kept in the memory of the worker process that receives it, "
+        "until the catalog is reloaded."
+    ),
+    dependencies=[Depends(require_admin_token)]
+)
+@limiter.limit(settings.RATE_LIMIT_REVIEWS)
+async def add_item_review(item_id: str, review: ReviewCreate, request: Request):
+    """
+    Endpoint to append a review to a product of the in-memory catalog.
+    - The product's review statistics and listing rating are updated incrementally in a new snapshot.
+    - Handles 'Not Found' errors gracefully.
+    - Not persisted nor shared with other worker processes (see CatalogProvider.apply).
+    """
+    record = {"product_id": item_id, **review.model_dump()}
+    try:
+        await executor.run(catalog.apply, lambda repository: repository.with_reviews([record]))
+    except CatalogUpdateError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Product with ID '{item_id}' not found."
+        )
+    return FastJSONResponse(content=review.model_dump(), status_code=status.HTTP_201_CREATED)
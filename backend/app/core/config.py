@@ -1,3 +1,7 @@
+import tempfile
+from pathlib import Path
+from typing import List, Literal, Optional
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -7,5 +11,106 @@ class Settings(BaseSettings):
     APP_NAME: str = "Mercado Libre Challenge API"
     API_V1_STR: str = "/api/v1"
 
+    # --- Catalog Data ---
+    # Directory containing the catalog JSON files.
+    DATA_PATH: Path = Path("app/data")
+    # How often (in seconds) the data files are checked for changes.
+    # A value of 0 disables hot-reloading.
+    CATALOG_RELOAD_INTERVAL_SECONDS: float = 5.0
+    # Compiled columnar catalog (python -m app.repositories.columnar build). Used instead
+    # of the JSON files when it exists, so workers share its memory-mapped columns.
+    CATALOG_COMPILED_PATH: Optional[Path] = Path("app/data/compiled")
+    # Records per chunk when products or reviews are read from newline-delimited JSON
+    # (products.ndjson, reviews.ndjson), which are streamed instead of parsed as a whole.
+    CATALOG_CHUNK_SIZE: int = 50_000
+
+    # --- Catalog Updates ---
+    # Bearer token required by the endpoints that modify the catalog (PUT /items/{id}, POST /items/{id}/reviews).
+    # They are disabled while it is unset. Updates live in the memory of the worker process that received them:
+    # other workers do not see them and they are discarded when the data files change and the catalog is reloaded.
+    CATALOG_ADMIN_TOKEN: Optional[str] = None
+
+    # --- CORS ---
+    # Origins allowed to call the API from a browser
+    CORS_ALLOW_ORIGINS: List[str] = ["*"]
+
+    # --- Images ---
+    # Original product images, served at /images
+    IMAGES_PATH: Path = Path("public/images")
+    # Resized and WebP variants of the images (python -m app.services.images build), served at /images/variants
+    # with an immutable Cache-Control. Summaries and details link them instead of the originals.
+    IMAGE_VARIANTS_PATH: Path = Path("public/variants")
+    # Render the variants missing from IMAGE_VARIANTS_PATH at startup, in IMAGE_WORKERS processes
+    IMAGE_VARIANTS_AT_STARTUP: bool = True
+    IMAGE_WORKERS: int = 2
+
+    # --- Listing ---
+    # Largest page a client can request from /items
+    ITEMS_MAX_PAGE_SIZE: int = 100
+    # Results returned by /items/search when the client does not ask for a page size
+    SEARCH_DEFAULT_PAGE_SIZE: int = 20
+    # Reviews embedded in the item details and returned by /items/{item_id}/reviews when the client does not ask
+    # for a page size, and the largest page a client can request
+    REVIEWS_PAGE_SIZE: int = 10
+    REVIEWS_MAX_PAGE_SIZE: int = 100
+
+    # --- Recommendations ---
+    # Weights of the components of the similarity between products of a category, combined as a weighted mean:
+    # title and description text, specifications, price, brand and the reputation of the candidate's seller.
+    # Setting every weight but the text one to 0 ranks by text similarity only.
+    RECOMMENDER_TEXT_WEIGHT: float = 1.0
+    RECOMMENDER_SPECIFICATIONS_WEIGHT: float = 0.5
+    RECOMMENDER_PRICE_WEIGHT: float = 0.3
+    RECOMMENDER_BRAND_WEIGHT: float = 0.2
+    RECOMMENDER_SELLER_REPUTATION_WEIGHT: float = 0.1
+    # Compare products across categories instead of only within their own category
+    RECOMMENDER_CROSS_CATEGORY: bool = False
+    # "exact" precomputes the exact neighbours of every product when the catalog is loaded, which is quadratic in
+    # the size of a category. "ivf" builds an approximate inverted-file index instead, queried per request and
+    # ranking by text similarity only: suited to categories (or cross-category catalogs) of hundreds of thousands
+    # of products.
+    RECOMMENDER_BACKEND: Literal["exact", "ivf"] = "exact"
+    # Clusters of the ivf index (square root of the number of products when unset) and clusters scanned per
+    # query: more probes raise recall and latency; probing every cluster is exact.
+    RECOMMENDER_IVF_LISTS: Optional[int] = None
+    RECOMMENDER_IVF_PROBES: int = 8
+    # Neighbour tables precomputed offline (python -m app.services.neighbor_tables build) for the exact backend.
+    # Used at startup when the file exists and matches the options above, instead of ranking every product.
+    RECOMMENDER_NEIGHBORS_PATH: Optional[Path] = Path("app/data/neighbors.npz")
+    # Products per request to POST /items/related:batch
+    RELATED_BATCH_MAX_IDS: int = 100
+
+    # --- Rate Limiting ---
+    # Storage of the rate limit counters. The default SQLite file is shared by every worker process of the host,
+    # so limits hold across uvicorn workers; "memory://" counts per process instead (N workers allow N times the
+    # limit). Any storage URI of the limits package (e.g. redis://host:6379) works as well.
+    RATE_LIMIT_STORAGE_URI: str = f"sqlite:///{Path(tempfile.gettempdir()) / 'meli-rate-limits.sqlite3'}"
+    # "sliding-window-counter" weights the previous window's count, so a client cannot send twice its limit
+    # around the boundary between two windows as it can with "fixed-window".
+    RATE_LIMIT_STRATEGY: Literal["fixed-window", "sliding-window-counter"] = "sliding-window-counter"
+    # Limits per client address of each endpoint, e.g. "100/minute" or "10/second;500/hour"
+    RATE_LIMIT_ITEMS: str = "200/minute"
+    RATE_LIMIT_ITEM_DETAIL: str = "100/minute"
+    RATE_LIMIT_RELATED: str = "50/minute"
+    RATE_LIMIT_RELATED_BATCH: str = "20/minute"
+    RATE_LIMIT_UPSERT: str = "30/minute"
+    RATE_LIMIT_REVIEWS: str = "30/minute"
+    RATE_LIMIT_REVIEW_PAGES: str = "100/minute"
+    # Typeahead clients search on every keystroke
+    RATE_LIMIT_SEARCH: str = "600/minute"
+
+    # --- Response Cache ---
+    # Serialized item detail and related responses kept in memory per process
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1024
+    RESPONSE_CACHE_TTL_SECONDS: float = 300.0
+    # max-age sent to clients in the Cache-Control header of cached responses
+    RESPONSE_CACHE_CONTROL_MAX_AGE: int = 60
+
+    # --- Request Executor ---
+    # Threads running blocking repository and recommender work, per process
+    EXECUTOR_MAX_WORKERS: int = 4
+    # Calls allowed to wait for a thread; requests beyond that get 503 Service Unavailable
+    EXECUTOR_MAX_QUEUE: int = 64
+
 # Instantiate settings to be imported by other modules
-settings = Settings()
\ No newline at end of file
+settings = Settings()
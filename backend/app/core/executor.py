@@ -0,0 +1,64 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+class ExecutorSaturatedError(RuntimeError):
+    """Raised when a call is submitted while the executor's queue is full."""
+
+class BoundedExecutor:
+    """
+    Runs blocking (pandas / scikit-learn) calls on a bounded thread pool so they do not stall the event loop.
+    At most max_workers calls run at a time and at most max_queue more wait for a worker; calls beyond that
+    are rejected immediately with ExecutorSaturatedError instead of piling up (backpressure).
+    A thread pool is used rather than a process pool because the work reads the shared, in-memory catalog
+    snapshot, which would otherwise have to be copied into every worker process.
+    """
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        """Number of calls running or waiting for a worker."""
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of calls waiting for a worker."""
+        return max(0, self._in_flight - self.max_workers)
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="catalog-worker")
+            return self._pool
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Runs fn(*args, **kwargs) on the pool and returns its result.
+        Raises ExecutorSaturatedError if max_workers + max_queue calls are already in flight.
+        """
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                raise ExecutorSaturatedError("Too many requests are being processed. Please retry shortly.")
+            self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_pool(), functools.partial(fn, *args, **kwargs))
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def shutdown(self) -> None:
+        """Stops the worker threads. The pool is recreated if the executor is used again."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
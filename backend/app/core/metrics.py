@@ -0,0 +1,200 @@
+# In-process metrics exposed in the Prometheus text format at /metrics.
+# Request latencies are recorded per route by MetricsMiddleware, and the stages of request handling (catalog
+# lookups, review aggregation, recommendations, serialization) by timing spans: `with span("stage"): ...`.
+# Values computed elsewhere (cache hit counters, executor queue depth, catalog size) are sampled only when
+# /metrics is scraped. Recording a value takes a lock and a bisect, a few microseconds, so the instrumentation
+# can stay on in production. Metrics are kept per process: with several uvicorn workers each one reports its own.
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Mapping, Tuple, Union
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds (in seconds) of the latency histogram buckets, from 100 microseconds to 10 seconds
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+Labels = Tuple[str, ...]
+Sample = Union[float, Mapping[Labels, float]]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """Base class of the metrics of a Registry: a name, a help text and the names of its labels."""
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Histogram(Metric):
+    """Counts of observed values per bucket, with their sum, per combination of label values."""
+    type = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: the count of each bucket (not cumulative; the last one is +Inf) and the sum
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][bucket] += 1
+            series[1][0] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = [(labels, list(counts), total[0]) for labels, (counts, total) in self._series.items()]
+        lines = []
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{_format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+class Sampled(Metric):
+    """
+    A gauge or counter whose value is read from a callback when the metrics are rendered, e.g. the depth of a queue.
+    The callback returns a number, or a mapping from label values to numbers.
+    """
+    def __init__(
+        self, name: str, documentation: str, callback: Callable[[], Sample], labelnames: Tuple[str, ...] = (),
+        type: str = "gauge"
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self.type = type
+
+    def samples(self) -> List[str]:
+        value = self.callback()
+        values = value.items() if isinstance(value, Mapping) else [((), value)]
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in values]
+
+class Registry:
+    """The metrics of the application, rendered together in the Prometheus text exposition format."""
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        # Registering a metric again (e.g. when a module is reloaded) replaces it
+        self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def sampled(
+        self, name: str, documentation: str, callback: Callable[[], Sample], labelnames: Tuple[str, ...] = (),
+        type: str = "gauge"
+    ) -> Sampled:
+        return self.register(Sampled(name, documentation, callback, labelnames, type))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+registry = Registry()
+
+# Requests being handled, updated by MetricsMiddleware on the event loop
+_in_progress = [0]
+
+request_duration = registry.histogram(
+    "http_request_duration_seconds", "Time to handle a request, by method, route and status code.",
+    ("method", "route", "status")
+)
+requests_in_progress = registry.sampled(
+    "http_requests_in_progress", "Requests being handled.", lambda: _in_progress[0]
+)
+stage_duration = registry.histogram(
+    "request_stage_duration_seconds", "Time spent in each stage of request handling.", ("stage",)
+)
+
+class span:
+    """
+    Context manager recording the time spent in a stage of request handling:
+
+        with span("recommender.recommend"):
+            ...
+    """
+    __slots__ = ("stage", "_start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self) -> "span":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        stage_duration.observe(time.perf_counter() - self._start, self.stage)
+
+def _route_of(scope) -> str:
+    # The path template of the matched route (e.g. /api/v1/items/{item_id}), so that a label is not created
+    # per item; requests matching no route share a single label. Routes of included routers are matched under
+    # their prefix, which FastAPI only records in the effective route context.
+    context = (scope.get("fastapi") or {}).get("effective_route_context")
+    return getattr(context, "path", None) or getattr(scope.get("route"), "path", None) or "<unmatched>"
+
+class MetricsMiddleware:
+    """ASGI middleware recording the latency of every HTTP request by method, route and status code."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        _in_progress[0] += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _in_progress[0] -= 1
+            request_duration.observe(time.perf_counter() - start, scope["method"], _route_of(scope), str(status[0]))
@@ -0,0 +1,172 @@
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+from math import floor
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Tuple
+
+from limits.errors import ConfigurationError
+from limits.storage import SlidingWindowCounterSupport, Storage
+from limits.storage.base import TimestampedSlidingWindow
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """
+    Rate limit storage shared by every worker process of a host, kept in a SQLite database file.
+    The default in-memory storage of slowapi counts the requests of each process separately, so with N uvicorn
+    workers a client gets N times its limit. Here every process reads and updates the same counters, each check
+    and increment running in a single write transaction that SQLite serializes across processes with its file
+    lock. Supports the fixed-window and sliding-window-counter strategies.
+    Counters whose window has expired are evicted at most every eviction_interval seconds, so the file does not
+    grow with every remote address ever seen.
+    Registered for URIs like SQLAlchemy's: sqlite:///relative/path.db or sqlite:////absolute/path.db.
+    """
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(
+        self,
+        uri: Optional[str] = None,
+        wrap_exceptions: bool = False,
+        eviction_interval: float = 60.0,
+        timeout: float = 5.0,
+        clock: Callable[[], float] = time.time,
+        **options
+    ):
+        path = urllib.parse.urlparse(uri or "").path[1:]
+        if not path:
+            raise ConfigurationError(f"A database file is required for the sqlite rate limit storage: {uri!r}")
+        self.path = Path(path)
+        self.eviction_interval = float(eviction_interval)
+        self.timeout = float(timeout)
+        self.clock = clock
+        # Connections are per thread and per process: a connection must not be used after a fork
+        self._local = threading.local()
+        self._next_eviction = 0.0
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Transactions are opened explicitly (BEGIN IMMEDIATE) rather than by the sqlite3 module
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            # Readers do not block the writer. The counters can be lost on a power failure, which is acceptable.
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS counters_expires_at ON counters (expires_at)")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Runs the block in a write transaction. BEGIN IMMEDIATE takes the database's write lock up front, so
+        a check and the increment that follows it cannot interleave with another process's.
+        """
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    @staticmethod
+    def _get(connection: sqlite3.Connection, key: str, now: float) -> int:
+        row = connection.execute("SELECT count FROM counters WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+        return row[0] if row else 0
+
+    def _incr(self, connection: sqlite3.Connection, key: str, expiry: float, amount: int, now: float) -> int:
+        self._evict(connection, now)
+        row = connection.execute("SELECT count, expires_at FROM counters WHERE key = ?", (key,)).fetchone()
+        # An expired counter starts a new window
+        count, expires_at = (row[0] + amount, row[1]) if row and row[1] > now else (amount, now + expiry)
+        connection.execute(
+            "INSERT OR REPLACE INTO counters (key, count, expires_at) VALUES (?, ?, ?)", (key, count, expires_at)
+        )
+        return count
+
+    def _evict(self, connection: sqlite3.Connection, now: float) -> int:
+        if now < self._next_eviction:
+            return 0
+        self._next_eviction = now + self.eviction_interval
+        return connection.execute("DELETE FROM counters WHERE expires_at <= ?", (now,)).rowcount
+
+    def evict_expired(self) -> int:
+        """Deletes every expired counter now. Returns the number of counters deleted."""
+        self._next_eviction = 0.0
+        with self._transaction() as connection:
+            return self._evict(connection, self.clock())
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        with self._transaction() as connection:
+            return self._incr(connection, key, expiry, amount, self.clock())
+
+    def get(self, key: str) -> int:
+        return self._get(self._connection(), key, self.clock())
+
+    def get_expiry(self, key: str) -> float:
+        now = self.clock()
+        row = self._connection().execute(
+            "SELECT expires_at FROM counters WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        return row[0] if row else now
+
+    def check(self) -> bool:
+        try:
+            self._connection().execute("SELECT 1")
+        except sqlite3.Error:
+            return False
+        return True
+
+    def reset(self) -> Optional[int]:
+        with self._transaction() as connection:
+            return connection.execute("DELETE FROM counters").rowcount
+
+    def clear(self, key: str) -> None:
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM counters WHERE key = ?", (key,))
+
+    def _sliding_window(
+        self, connection: sqlite3.Connection, key: str, expiry: int, now: float
+    ) -> Tuple[int, float, int, float]:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count = self._get(connection, previous_key, now)
+        current_count = self._get(connection, current_key, now)
+        # Same weighting as the storages of the limits package: the share of the previous window still covered
+        previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry if previous_count else 0.0
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, current_count, current_ttl
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+        with self._transaction() as connection:
+            # Read the clock once the lock is held, after waiting for other processes' transactions
+            now = self.clock()
+            previous_count, previous_ttl, current_count, _ = self._sliding_window(connection, key, expiry, now)
+            if floor(previous_count * previous_ttl / expiry + current_count) + amount > limit:
+                return False
+            # A window's counter is read during the next window too, so it lives for two
+            self._incr(connection, self.sliding_window_keys(key, expiry, now)[1], 2 * expiry, amount, now)
+            return True
+
+    def get_sliding_window(self, key: str, expiry: int) -> Tuple[int, float, int, float]:
+        return self._sliding_window(self._connection(), key, expiry, self.clock())
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        with self._transaction() as connection:
+            connection.execute(
+                "DELETE FROM counters WHERE key IN (?, ?)", self.sliding_window_keys(key, expiry, self.clock())
+            )
@@ -1,6 +1,84 @@
-# This module configures and provides the rate limiter for the FastAPI application.
-# It uses SlowAPI to protect endpoints against excessive requests and potential abuse.
+# This module configures and provides the shared dependencies of the FastAPI application.
+# It uses SlowAPI to protect endpoints against excessive requests and potential abuse, with counters
+# shared by the worker processes of the host (see app.core.rate_limit),
+# holds the process-wide catalog snapshot served by the API, the variants of the product images,
+# the cache of serialized responses and the bounded executor that keeps blocking catalog work off the event loop.
+# It also checks the admin token of the endpoints that modify the catalog.
+import secrets
+from typing import Optional
+
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
-limiter = Limiter(key_func=get_remote_address)
\ No newline at end of file
+from .core import rate_limit  # noqa: F401  (registers the sqlite:// rate limit storage)
+from .core.config import settings
+from .core.executor import BoundedExecutor
+from .repositories.catalog_provider import CatalogProvider
+from .services.images import ImageService
+from .services.recommender import ApproximateSearch, RecommenderOptions, ScoringWeights
+from .services.response_cache import ResponseCache
+
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=settings.RATE_LIMIT_STORAGE_URI,
+    strategy=settings.RATE_LIMIT_STRATEGY
+)
+
+recommender_options = RecommenderOptions(
+    weights=ScoringWeights(
+        text=settings.RECOMMENDER_TEXT_WEIGHT,
+        specifications=settings.RECOMMENDER_SPECIFICATIONS_WEIGHT,
+        price=settings.RECOMMENDER_PRICE_WEIGHT,
+        brand=settings.RECOMMENDER_BRAND_WEIGHT,
+        seller_reputation=settings.RECOMMENDER_SELLER_REPUTATION_WEIGHT
+    ),
+    approximate=ApproximateSearch(
+        n_lists=settings.RECOMMENDER_IVF_LISTS,
+        n_probe=settings.RECOMMENDER_IVF_PROBES
+    ) if settings.RECOMMENDER_BACKEND == "ivf" else None,
+    cross_category=settings.RECOMMENDER_CROSS_CATEGORY
+)
+
+images = ImageService(settings.IMAGES_PATH, settings.IMAGE_VARIANTS_PATH, workers=settings.IMAGE_WORKERS)
+
+response_cache = ResponseCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS
+)
+
+# The response cache follows the snapshots the provider publishes
+catalog = CatalogProvider(
+    settings.DATA_PATH,
+    reload_interval=settings.CATALOG_RELOAD_INTERVAL_SECONDS,
+    compiled_path=settings.CATALOG_COMPILED_PATH,
+    chunk_size=settings.CATALOG_CHUNK_SIZE,
+    recommender_options=recommender_options,
+    neighbors_path=settings.RECOMMENDER_NEIGHBORS_PATH,
+    images=images,
+    on_publish=lambda repository: response_cache.publish(repository.version)
+)
+
+executor = BoundedExecutor(max_workers=settings.EXECUTOR_MAX_WORKERS, max_queue=settings.EXECUTOR_MAX_QUEUE)
+
+admin_bearer = HTTPBearer(auto_error=False, description="CATALOG_ADMIN_TOKEN, required to modify the catalog.")
+
+def require_admin_token(credentials: Optional[HTTPAuthorizationCredentials] = Depends(admin_bearer)) -> None:
+    """
+    Dependency of the endpoints that modify the catalog: requires the CATALOG_ADMIN_TOKEN as a bearer token.
+    Responds 403 while no token is configured and 401 when the request does not carry the right one.
+    """
+    if not settings.CATALOG_ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Catalog updates are disabled. Set CATALOG_ADMIN_TOKEN to enable them."
+        )
+    if credentials is None or not secrets.compare_digest(
+        credentials.credentials.encode(), settings.CATALOG_ADMIN_TOKEN.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or missing admin token.",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
@@ -1,36 +1,113 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
-from .dependencies import limiter
+from .core import metrics
+from .core.executor import ExecutorSaturatedError
+from .services.images import ImageVariantFiles
+from .dependencies import limiter, catalog, images, response_cache, executor
 from .api.endpoints import products
 
 from .core.config import settings
 
+# --- Lifespan ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Renders the missing image variants and loads the catalog snapshot once at startup, and watches the data
+    files for changes while the application is running.
+    """
+    if settings.IMAGE_VARIANTS_AT_STARTUP:
+        images.build()
+    catalog.load()
+    watcher = asyncio.create_task(catalog.watch())
+    yield
+    watcher.cancel()
+    with suppress(asyncio.CancelledError):
+        await watcher
+    executor.shutdown()
+
 # --- App Initialization ---
 app = FastAPI(
     title=settings.APP_NAME,
     description="API to support the item detail page, including AI-powered recommendations.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Permite todos los orígenes
+    allow_origins=settings.CORS_ALLOW_ORIGINS,  # Orígenes permitidos (todos por defecto)
     allow_credentials=True,
     allow_methods=["*"],   # Permite todos los métodos (GET, POST, etc.)
     allow_headers=["*"],   # Permite todas las cabeceras
+    expose_headers=["X-Next-Cursor"],  # Permite a los navegadores leer el cursor de paginación
+)
+
+# --- Metrics ---
+# Latency of every request, by route, exposed at /metrics with the stage timings recorded by the repository,
+# the recommender and the serializer (see app.core.metrics)
+app.add_middleware(metrics.MetricsMiddleware)
+
+def _cache_stat(name: str):
+    return lambda: response_cache.stats()[name]
+
+metrics.registry.sampled("response_cache_hits_total", "Response cache lookups answered from the cache.", _cache_stat("hits"), type="counter")
+metrics.registry.sampled("response_cache_misses_total", "Response cache lookups that built the response.", _cache_stat("misses"), type="counter")
+metrics.registry.sampled("response_cache_hit_ratio", "Share of response cache lookups answered from the cache.", _cache_stat("hit_ratio"))
+metrics.registry.sampled("response_cache_entries", "Responses held in the cache.", _cache_stat("entries"))
+metrics.registry.sampled("executor_in_flight", "Catalog calls running or waiting for a worker thread.", lambda: executor.in_flight)
+metrics.registry.sampled("executor_queue_depth", "Catalog calls waiting for a worker thread.", lambda: executor.queue_depth)
+
+# Size of the current catalog snapshot, measured once per snapshot version
+_measured_snapshot = {}
+
+def _snapshot_size():
+    repository = catalog.repository
+    if _measured_snapshot.get("version") != repository.version:
+        _measured_snapshot.update(repository.snapshot_size(), version=repository.version)
+    return _measured_snapshot
+
+metrics.registry.sampled(
+    "catalog_snapshot_records", "Records in the current catalog snapshot.",
+    lambda: {(table,): _snapshot_size()[table] for table in ("products", "reviews")}, ("table",)
+)
+metrics.registry.sampled(
+    "catalog_snapshot_products_bytes", "Memory taken by the product table of the current catalog snapshot.",
+    lambda: _snapshot_size()["products_bytes"]
 )
 
 # --- Rate Limiter Configuration ---
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+# --- Backpressure ---
+# Requests that find the executor queue full are rejected quickly instead of waiting indefinitely
+async def executor_saturated_handler(request: Request, exc: ExecutorSaturatedError):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "1"}
+    )
+
+app.add_exception_handler(ExecutorSaturatedError, executor_saturated_handler)
+
 # --- Static Files Mount ---
+# Resized and WebP variants of the images (JPEG for clients without WebP support), content-addressed and
+# cached by clients for a year. Mounted first: /images would match their URLs too.
+app.mount(
+    images.url_prefix,
+    ImageVariantFiles(directory=settings.IMAGE_VARIANTS_PATH, check_dir=False),
+    name="image_variants"
+)
 # This serves images from the 'public/images' directory
-app.mount("/images", StaticFiles(directory="public/images"), name="images")
+app.mount("/images", StaticFiles(directory=settings.IMAGES_PATH), name="images")
 
 # --- API Router Inclusion ---
 # Includes all endpoints defined in the products router
@@ -40,4 +117,17 @@ app.include_router(products.router, prefix=settings.API_V1_STR, tags=["Products"
 @app.get("/", tags=["Root"])
 async def read_root():
     """A simple health check endpoint."""
-    return {"status": "ok", "message": "Welcome to the Mercado Libre Challenge API!"}
\ No newline at end of file
+    return {"status": "ok", "message": "Welcome to the Mercado Libre Challenge API!"}
+
+@app.get("/metrics", tags=["Root"], response_class=Response)
+def read_metrics():
+    """
+    Metrics in the Prometheus text format. A regular function, so that measuring a new catalog snapshot
+    runs in a worker thread rather than on the event loop.
+    """
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/cache/stats", tags=["Root"])
+async def read_cache_stats():
+    """Hit and miss counters of the response cache, to help size it."""
+    return response_cache.stats()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class Price(BaseModel):
     """Model for the product price."""
@@ -63,7 +63,7 @@ class ProductSummary(BaseModel):
     id: str
     title: str
     price: Price
-    image: str = Field(..., description="Primary image for the product")
+    image: str = Field(..., description="Thumbnail of the primary image for the product (the original if it has no rendered variants)")
     average_rating: float
 
 class ProductDetail(BaseModel):
@@ -75,13 +75,76 @@ class ProductDetail(BaseModel):
     title: str
     price: Price
     description: str
-    images: List[str]
+    images: List[str] = Field(..., description="Detail-size variants of the product images (originals without rendered variants)")
     stock: int
     average_rating: float = Field(..., description="Calculated average rating from reviews")
     category: Category
     seller: Seller
-    reviews: List[Review]
+    reviews: List[Review] = Field(..., description="First page of reviews, most recent first")
+    review_count: int = Field(..., description="Total number of reviews")
+    rating_histogram: Dict[int, int] = Field(..., description="Number of reviews with each rating, from 1 to 5")
+    reviews_next_cursor: Optional[str] = Field(
+        None,
+        description="Cursor of the next page of reviews for /items/{item_id}/reviews (null if every review is included)"
+    )
     accepted_payment_methods: List[PaymentMethod]
     specifications: ProductSpecifications
-    related_products: List[ProductSummary]
+    related_products: List[ProductSummary] = Field(
+        default_factory=list,
+        description="Recommended products; only filled in when requested with include=related"
+    )
 
+class ProductUpsert(BaseModel):
+    """
+    Model for the body of a product creation or replacement.
+    Mirrors an entry of products.json; the product ID is taken from the URL.
+    """
+    title: str
+    category_id: int
+    seller_id: str
+    brand: Optional[str] = None
+    description: str = ""
+    price: Price
+    stock: int = Field(..., ge=0)
+    sku: Optional[str] = None
+    accepted_payment_method_ids: List[int] = Field(default_factory=list)
+    images: List[str] = Field(default_factory=list)
+    specifications: ProductSpecifications = Field(default_factory=ProductSpecifications)
+
+class ReviewCreate(BaseModel):
+    """Model for the body of a new product review."""
+    author: str
+    rating: int = Field(..., ge=1, le=5)
+    comment: str
+
+class RelatedBatchRequest(BaseModel):
+    """Model for the body of a batch of related products requests."""
+    ids: List[str] = Field(..., min_length=1, description="IDs of the products to get related products for")
+    top_n: int = Field(5, ge=1, le=50, description="Related products per product")
+
+class RelatedBatchResponse(BaseModel):
+    """Related products of each requested product, keyed by product ID."""
+    results: Dict[str, List[ProductSummary]]
+    not_found: List[str] = Field(default_factory=list, description="Requested IDs that are not in the catalog")
+
+class CategoryFacet(BaseModel):
+    """Number of search results in a category."""
+    id: int
+    name: str
+    count: int
+
+class BrandFacet(BaseModel):
+    """Number of search results of a brand."""
+    name: str
+    count: int
+
+class SearchFacets(BaseModel):
+    """Search result counts per category and brand, most frequent first."""
+    categories: List[CategoryFacet]
+    brands: List[BrandFacet]
+
+class SearchResponse(BaseModel):
+    """One page of full-text search results."""
+    total: int = Field(..., description="Number of products matching the query and filters")
+    items: List[ProductSummary] = Field(..., description="Matching products, most relevant first")
+    facets: SearchFacets = Field(..., description="Counts of the products matching the query, before the category and brand filters")
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Optional
+
+from app.repositories import columnar
+from app.repositories.ingestion import DEFAULT_CHUNK_SIZE
+from app.repositories.product_repository import ProductRepository, catalog_signature
+from app.services import neighbor_tables
+from app.services.images import ImageService
+from app.services.recommender import RecommenderOptions
+
+logger = logging.getLogger(__name__)
+
+class CatalogProvider:
+    """
+    Holds the process-wide ProductRepository snapshot shared by every request.
+    The snapshot is built once (at application startup) and swapped atomically for a freshly
+    loaded one when the modification times of the data files change. Requests keep a reference
+    to the snapshot they started with, so they always read a consistent catalog and never
+    trigger a reparse of the JSON files themselves.
+    If a compiled catalog (see app.repositories.columnar) of the current data files exists at compiled_path, it is
+    loaded instead of the JSON files, and rebuilding it triggers the reload; once the data files change, they are
+    loaded instead (with a warning) until the catalog is compiled again. Likewise, neighbour tables precomputed
+    offline (see app.services.neighbor_tables) are used from neighbors_path when it exists, and the rendered
+    variants of the product images (see app.services.images) are linked instead of the originals; when their
+    manifest is rewritten (e.g. by a build run from the command line), the next reload check links the new ones.
+    Updates made through apply() produce copy-on-write snapshots derived from the current one; they live in
+    memory only and are discarded when the data files change and the catalog is reloaded. Each worker process
+    holds its own provider, so an update is only seen by the process that applied it: changes meant to last,
+    or to reach every worker, must be written to the data files, which every process then reloads.
+    """
+    def __init__(
+        self,
+        data_path: Path,
+        reload_interval: float = 0.0,
+        compiled_path: Optional[Path] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        recommender_options: Optional[RecommenderOptions] = None,
+        neighbors_path: Optional[Path] = None,
+        images: Optional[ImageService] = None,
+        on_publish: Optional[Callable[[ProductRepository], None]] = None
+    ):
+        self.data_path = data_path
+        self.reload_interval = reload_interval
+        self.compiled_path = compiled_path
+        self.chunk_size = chunk_size
+        self.recommender_options = recommender_options
+        self.neighbors_path = neighbors_path
+        self.images = images
+        # Called with every snapshot published, once it is the current one (e.g. to move the response cache to it)
+        self.on_publish = on_publish
+        self._repository: Optional[ProductRepository] = None
+        # Serializes loads so that concurrent reloads do not parse the files twice
+        self._load_lock = threading.Lock()
+
+    @property
+    def repository(self) -> ProductRepository:
+        """
+        Returns the current catalog snapshot.
+        Loads it on first access if the application was started without the lifespan hook (e.g. in scripts).
+        """
+        repository = self._repository
+        if repository is None:
+            repository = self.load()
+        return repository
+
+    def _use_compiled(self) -> bool:
+        """Returns True if there is a compiled catalog and it was compiled from the current data files."""
+        if self.compiled_path is None:
+            return False
+        compiled_from = columnar.source_signature(self.compiled_path)
+        return compiled_from is not None and compiled_from == catalog_signature(self.data_path)
+
+    def _source_signature(self):
+        if self._use_compiled():
+            return columnar.compiled_signature(self.compiled_path)
+        return catalog_signature(self.data_path)
+
+    def _build(self) -> ProductRepository:
+        """
+        Loads a new snapshot from disk and prepares it to be served, before anyone can see it.
+        """
+        if self._use_compiled():
+            repository = ProductRepository.from_compiled(self.compiled_path, recommender_options=self.recommender_options)
+        else:
+            if self.compiled_path is not None and (self.compiled_path / columnar.MANIFEST_FILE).exists():
+                logger.warning(
+                    "The compiled catalog in %s was not compiled from the current data files; loading %s instead. "
+                    "Compile it again with 'python -m app.repositories.columnar build'.",
+                    self.compiled_path, self.data_path
+                )
+            repository = ProductRepository(
+                self.data_path, chunk_size=self.chunk_size, recommender_options=self.recommender_options
+            )
+        if self.neighbors_path is not None and self.neighbors_path.exists():
+            neighbor_tables.attach_neighbors(repository.recommendation_index, self.neighbors_path)
+        if self.images is not None:
+            repository.use_image_variants(self.images.variants())
+        repository.recommendation_index.warm()
+        return repository
+
+    def _publish(self, repository: ProductRepository) -> None:
+        """Makes repository the current snapshot. Called with the load lock held, so snapshots are published in order."""
+        # Rebinding a single attribute is atomic: readers see either the old or the new snapshot
+        self._repository = repository
+        if self.on_publish is not None:
+            self.on_publish(repository)
+
+    def load(self) -> ProductRepository:
+        """
+        Loads the catalog from disk and publishes it as the current snapshot.
+        """
+        with self._load_lock:
+            repository = self._build()
+            self._publish(repository)
+        return repository
+
+    def apply(self, update: Callable[[ProductRepository], ProductRepository]) -> ProductRepository:
+        """
+        Publishes the snapshot returned by update(current snapshot), e.g. lambda repository: repository.with_reviews(...).
+        Updates are serialized with each other and with reloads; readers are never blocked and keep seeing the
+        previous snapshot until the new one, fully built and with its recommendation models fitted, is published.
+        """
+        with self._load_lock:
+            current = self._repository
+            if current is None:
+                current = self._build()
+            repository = update(current)
+            repository.recommendation_index.warm()
+            self._publish(repository)
+        return repository
+
+    def _refresh_image_variants(self) -> bool:
+        """
+        Publishes a snapshot linking the image variants of the current manifest if it was rewritten since the
+        current snapshot was built (e.g. by a build run from the command line). Returns True if it did.
+        """
+        if self.images is None or self._repository is None:
+            return False
+        with self._load_lock:
+            current = self._repository
+            variants = self.images.variants()
+            if variants is current.image_variants:
+                return False
+            self._publish(current.with_image_variants(variants))
+        logger.info("Image variants reloaded from %s", self.images.manifest_path)
+        return True
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reloads the catalog if the data files changed since the current snapshot was built.
+        Otherwise, links the image variants again if their manifest changed.
+        Returns True if a new snapshot was published.
+        """
+        current = self._repository
+        if current is not None and current.signature == self._source_signature():
+            return self._refresh_image_variants()
+        with self._load_lock:
+            # Another thread may have reloaded while we were waiting for the lock
+            current = self._repository
+            if current is not None and current.signature == self._source_signature():
+                return False
+            self._publish(self._build())
+        logger.info("Catalog reloaded from %s", self._repository.data_path)
+        return True
+
+    async def watch(self) -> None:
+        """
+        Background task that periodically checks the data files and reloads the catalog when they change.
+        Parsing runs in a worker thread so the event loop keeps serving requests from the old snapshot.
+        A failed reload (e.g. a file caught mid-write) keeps the current snapshot and is retried on the next tick.
+        """
+        if self.reload_interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await asyncio.to_thread(self.reload_if_changed)
+            except Exception:
+                logger.exception("Catalog reload failed; keeping the current snapshot")
@@ -0,0 +1,241 @@
+# Compact columnar format for the catalog, built from the JSON (or NDJSON) files in app/data.
+#
+# Each table is stored as one file per column inside a directory, products in the flat layout of
+# app.repositories.product_columns (price amount and currency, one typed column per specification attribute):
+# - numeric and boolean columns as .npy arrays, memory-mapped read-only when loaded, so every
+#   worker process reading the same files shares their pages through the OS cache;
+# - nullable integer and boolean columns as an .npy array of values plus one of the missing ones (.mask.npy);
+# - text columns as a string table: the UTF-8 bytes of all values (.bin) plus an .npy array of offsets, with the
+#   rows missing a value in a .missing.npy array;
+# - list attributes (images, payment method IDs) as an .npy array of row offsets (.rows.npy) into a column holding
+#   the values of every row one after the other;
+# - values without a fixed shape (the dimensions specification, sellers' reputations) as a string table of
+#   compact JSON documents, decoded value by value with orjson.
+# Records are validated when the catalog is compiled, with the reviews grouped by product, so loading uses the
+# tables as they are (see ProductRepository.from_compiled): numeric columns, prices and review ratings included,
+# stay memory-mapped, and only text is decoded by each process.
+# A manifest.json file, written last, describes the tables and columns and records the signature of the data files
+# the catalog was compiled from, so that a build older than the data files is not used (see source_signature).
+# Each build is written to a new directory next to the output path, which is a symbolic link to the current build
+# swapped atomically when a build completes, so a process loading the catalog meanwhile reads the previous build
+# whole. Build the format with:
+#
+#     python -m app.repositories.columnar build --data app/data --output app/data/compiled
+import argparse
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import orjson
+import pandas as pd
+
+from app.repositories.ingestion import STREAMABLE_TABLES, TABLES, CatalogIngestion, read_records, table_path
+from app.repositories.product_columns import ListColumn, is_missing
+
+FORMAT_VERSION = 3
+MANIFEST_FILE = "manifest.json"
+
+def resolve_build(compiled_path: Path) -> Path:
+    """Returns the directory of the build the compiled catalog path currently points to."""
+    return Path(os.path.realpath(compiled_path))
+
+def compiled_signature(compiled_path: Path) -> Tuple[Tuple[str, int, int], ...]:
+    """
+    Returns the fingerprint of a compiled catalog: the directory of its current build, and the mtime and size of
+    its manifest, which is written last.
+    """
+    build = resolve_build(compiled_path)
+    try:
+        stat = (build / MANIFEST_FILE).stat()
+        return ((build.name, stat.st_mtime_ns, stat.st_size),)
+    except FileNotFoundError:
+        return ((MANIFEST_FILE, 0, 0),)
+
+def source_signature(compiled_path: Path) -> Optional[Tuple[Tuple[str, int, int], ...]]:
+    """
+    Returns the signature of the data files (see product_repository.catalog_signature) the compiled catalog was
+    built from, or None if there is no compiled catalog or its manifest does not record it.
+    """
+    try:
+        manifest = json.loads((resolve_build(compiled_path) / MANIFEST_FILE).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+    signature = manifest.get("source_signature")
+    return tuple(tuple(entry) for entry in signature) if signature is not None else None
+
+def _write_string_table(directory: Path, name: str, values: List[str]) -> None:
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    (directory / f"{name}.bin").write_bytes(b"".join(encoded))
+    np.save(directory / f"{name}.offsets.npy", offsets)
+
+def _read_string_table(directory: Path, name: str) -> List[bytes]:
+    data = (directory / f"{name}.bin").read_bytes()
+    offsets = np.load(directory / f"{name}.offsets.npy", mmap_mode="r").tolist()
+    return [data[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+def _write_column(directory: Path, name: str, values: pd.Series) -> Dict[str, Any]:
+    """Writes a column in the format that fits its values and returns its description for the manifest."""
+    if isinstance(values.dtype, (pd.Int64Dtype, pd.BooleanDtype)):
+        np.save(directory / f"{name}.npy", values.array._data)
+        np.save(directory / f"{name}.mask.npy", values.array._mask)
+        return {"kind": "nullable", "dtype": str(values.dtype)}
+    if isinstance(values.dtype, np.dtype) and values.dtype != object:
+        np.save(directory / f"{name}.npy", values.to_numpy())
+        return {"kind": "numeric"}
+    missing = np.array([is_missing(value) for value in values], dtype=bool)
+    if missing.any():
+        np.save(directory / f"{name}.missing.npy", missing)
+    present = [value for value, absent in zip(values, missing.tolist()) if not absent]
+    if all(isinstance(value, str) for value in present):
+        _write_string_table(directory, name, present)
+        return {"kind": "string", "missing": bool(missing.any())}
+    _write_string_table(directory, name, [orjson.dumps(value).decode("utf-8") for value in present])
+    return {"kind": "json", "missing": bool(missing.any())}
+
+def _read_column(directory: Path, name: str, description: Dict[str, Any], rows: int) -> Any:
+    """Reads a column written by _write_column: numeric arrays are memory-mapped, text is decoded."""
+    if description["kind"] == "numeric":
+        return np.load(directory / f"{name}.npy", mmap_mode="r")
+    if description["kind"] == "nullable":
+        values = np.load(directory / f"{name}.npy", mmap_mode="r")
+        mask = np.load(directory / f"{name}.mask.npy", mmap_mode="r")
+        array_type = pd.arrays.BooleanArray if description["dtype"] == "boolean" else pd.arrays.IntegerArray
+        return array_type(values, mask)
+    decode = (lambda value: value.decode("utf-8")) if description["kind"] == "string" else orjson.loads
+    present = [decode(value) for value in _read_string_table(directory, name)]
+    column = np.full(rows, None, dtype=object)
+    if description["missing"]:
+        column[~np.load(directory / f"{name}.missing.npy")] = present
+    else:
+        column[:] = present
+    return column
+
+def _write_table(
+    directory: Path,
+    table: str,
+    df: pd.DataFrame,
+    lists: Optional[Dict[str, ListColumn]] = None
+) -> Dict[str, Any]:
+    columns = []
+    for column in df.columns:
+        columns.append({"name": column, **_write_column(directory, f"{table}.{column}", df[column])})
+    list_columns = []
+    for column, values in (lists or {}).items():
+        name = f"{table}.{column}"
+        np.save(directory / f"{name}.rows.npy", values.offsets)
+        value_description = _write_column(directory, f"{name}.values", pd.Series(values.values, copy=False))
+        list_columns.append({"name": column, "values": value_description, "size": len(values.values)})
+    return {"rows": len(df), "columns": columns, "lists": list_columns}
+
+def _remove_old_builds(output_path: Path, previous: Optional[Path]) -> None:
+    """
+    Removes the builds of output_path older than the previous one, which is kept so that a process that resolved it
+    just before the swap can finish loading it. Newer builds (e.g. of a compilation in progress) are left alone.
+    """
+    if previous is None or not previous.is_dir():
+        return
+    cutoff = previous.stat().st_mtime_ns
+    for build in output_path.parent.glob(f".{output_path.name}-*"):
+        if build.is_dir() and not build.is_symlink() and build.stat().st_mtime_ns < cutoff:
+            shutil.rmtree(build, ignore_errors=True)
+
+def compile_catalog(data_path: Path, output_path: Path) -> Path:
+    """
+    Compiles the catalog JSON files of data_path into the columnar format at output_path.
+    The catalog is written to a new build directory, then output_path is atomically pointed to it, replacing any
+    previous build; the builds older than the previous one are removed.
+    Raises pydantic.ValidationError (or InvalidRatingError) if a record is invalid.
+    """
+    # Imported here: the repository module reads compiled catalogs with this one
+    from app.repositories.product_repository import catalog_signature
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{output_path.name}-", dir=output_path.parent))
+    link = output_path.parent / f"{staging.name}.link"
+    try:
+        # Taken before reading, like the signature of a snapshot, so that a change made meanwhile is not missed
+        signature = catalog_signature(data_path)
+        # Products and reviews are validated chunk by chunk as they are read, like when a snapshot is loaded
+        ingestion = CatalogIngestion()
+        for chunk in read_records(table_path(data_path, "products")):
+            ingestion.add_products(chunk)
+        for chunk in read_records(table_path(data_path, "reviews")):
+            ingestion.add_reviews(chunk)
+        frames = {
+            table: pd.concat(read_records(table_path(data_path, table)), ignore_index=True)
+            for table in TABLES if table not in STREAMABLE_TABLES
+        }
+        frames["products"], frames["reviews"] = ingestion.products_df(), ingestion.reviews_df()
+        manifest = {"format_version": FORMAT_VERSION, "source_signature": signature, "tables": {}}
+        for table, df in frames.items():
+            lists = ingestion.product_lists() if table == "products" else None
+            manifest["tables"][table] = _write_table(staging, table, df, lists)
+        (staging / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+        os.symlink(staging.name, link)
+        if output_path.is_dir() and not output_path.is_symlink():
+            # Compiled before builds were versioned: replaced once without the atomic swap
+            shutil.rmtree(output_path)
+        previous = resolve_build(output_path) if output_path.is_symlink() else None
+        os.replace(link, output_path)
+    except BaseException:
+        link.unlink(missing_ok=True)
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    _remove_old_builds(output_path, previous)
+    return output_path
+
+def load_catalog(compiled_path: Path) -> Dict[str, pd.DataFrame]:
+    """
+    Loads a compiled catalog. Returns one DataFrame per table plus the list attributes of the products, keyed like
+    the ProductRepository.from_dataframes arguments (e.g. 'products_df', 'product_lists').
+    Numeric columns, nullable ones and the offsets of list attributes are backed by read-only memory maps of the
+    .npy files; only text (and free-form specification values) is decoded.
+    Every file is read from the build the path points to when the load starts, even if it is rebuilt meanwhile.
+    """
+    compiled_path = resolve_build(compiled_path)
+    try:
+        manifest = json.loads((compiled_path / MANIFEST_FILE).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        raise RuntimeError(f"Compiled catalog not found in {compiled_path}. Build it with 'python -m app.repositories.columnar build'.")
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise RuntimeError(f"Unsupported compiled catalog format {manifest.get('format_version')} in {compiled_path}.")
+
+    frames: Dict[str, Any] = {}
+    for table, description in manifest["tables"].items():
+        columns = {
+            column["name"]: pd.Series(
+                _read_column(compiled_path, f"{table}.{column['name']}", column, description["rows"]), copy=False
+            )
+            for column in description["columns"]
+        }
+        frames[f"{table}_df"] = pd.DataFrame(columns, copy=False)
+        if table == "products":
+            frames["product_lists"] = {
+                column["name"]: ListColumn(
+                    np.load(compiled_path / f"{table}.{column['name']}.rows.npy", mmap_mode="r"),
+                    np.asarray(_read_column(compiled_path, f"{table}.{column['name']}.values", column["values"], column["size"]))
+                )
+                for column in description["lists"]
+            }
+    return frames
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compile the catalog JSON files into the columnar format.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    build = subcommands.add_parser("build", help="Compile the catalog")
+    build.add_argument("--data", type=Path, default=Path("app/data"), help="Directory with the catalog JSON files")
+    build.add_argument("--output", type=Path, default=Path("app/data/compiled"), help="Directory to write the compiled catalog to")
+    args = parser.parse_args()
+
+    output_path = compile_catalog(args.data, args.output)
+    print(f"Compiled catalog written to {output_path}")
+
+if __name__ == "__main__":
+    main()
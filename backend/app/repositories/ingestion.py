@@ -0,0 +1,166 @@
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+from pydantic import TypeAdapter
+from scipy import sparse
+
+from app.core.metrics import span
+from app.models.product import Price, ProductSpecifications, Review
+from app.repositories.product_columns import LIST_COLUMNS, ListColumn, flatten_products, split_lists
+from app.repositories.review_stats import ReviewStats
+from app.services import recommender
+
+# Tables of the catalog, named after their file in the data directory
+TABLES = ("products", "categories", "sellers", "reviews", "payment_methods")
+
+# Large tables that may also be provided as newline-delimited JSON (one record per line, e.g. products.ndjson).
+# Those files are read in chunks instead of being parsed as a single document.
+STREAMABLE_TABLES = ("products", "reviews")
+NDJSON_SUFFIX = ".ndjson"
+
+# Records per chunk when reading newline-delimited JSON
+DEFAULT_CHUNK_SIZE = 50_000
+
+# Review fields kept in memory; any other field in the source records is dropped as chunks arrive
+REVIEW_COLUMNS = ("id", "product_id", "author", "rating", "comment")
+
+# Validators of the nested values of the products, applied to each chunk as it is read (and to updated records)
+PRICE_LIST = TypeAdapter(List[Price])
+SPECIFICATIONS_LIST = TypeAdapter(List[ProductSpecifications])
+
+# Validator of each review field, applied column by column to each chunk of reviews as it is read
+_review_fields = {name: TypeAdapter(List[field.annotation]) for name, field in Review.model_fields.items()}
+
+def validated(adapter: TypeAdapter, records: List[Any]) -> List[Any]:
+    """
+    Validates records against a model and returns them in the model's serialized form,
+    so they can later be sent as-is without being validated again.
+    """
+    with span("repository.validate"):
+        return adapter.dump_python(adapter.validate_python(records))
+
+def table_path(data_path: Path, table: str) -> Path:
+    """
+    Returns the file a table is read from: <table>.ndjson for streamable tables when it exists,
+    <table>.json otherwise.
+    """
+    if table in STREAMABLE_TABLES:
+        ndjson_path = data_path / f"{table}{NDJSON_SUFFIX}"
+        if ndjson_path.exists():
+            return ndjson_path
+    return data_path / f"{table}.json"
+
+def read_records(path: Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Yields the records of a catalog file as DataFrames.
+    Newline-delimited JSON is streamed in chunks of at most chunk_size records, so the whole file is never
+    held in memory as text or parsed objects; a JSON array is read as a single chunk.
+    """
+    if path.suffix == NDJSON_SUFFIX:
+        with pd.read_json(path, lines=True, chunksize=chunk_size) as reader:
+            for chunk in reader:
+                yield chunk.reset_index(drop=True)
+    else:
+        yield pd.read_json(path)
+
+class CatalogIngestion:
+    """
+    Accumulates the products and reviews of a catalog one chunk at a time, updating the aggregates derived
+    from them as records arrive: review statistics, category membership (row positions per category) and the
+    term counts the recommender computes its TF-IDF features from. Each chunk is validated as it is added, through
+    the response models, so responses built from the records can be encoded directly without re-validating them
+    per request, and kept in the flat layout of app.repositories.product_columns. Once every chunk has been added,
+    the repository is built from the accumulated tables and aggregates without another pass over the data.
+    """
+    def __init__(self, validate: bool = True):
+        """
+        validate=False takes the chunks as already validated, e.g. the tables of a compiled catalog.
+        """
+        self.validate = validate
+        self.review_stats = ReviewStats()
+        self._product_chunks: List[pd.DataFrame] = []
+        self._list_chunks: Dict[str, List[ListColumn]] = {name: [] for name in LIST_COLUMNS}
+        self._term_count_chunks: List[sparse.csr_matrix] = []
+        self._category_position_chunks: Dict[int, List[np.ndarray]] = {}
+        self._review_chunks: List[pd.DataFrame] = []
+        self._product_count = 0
+
+    def add_products(self, products_df: pd.DataFrame, lists: Optional[Dict[str, ListColumn]] = None) -> None:
+        """
+        Adds a chunk of product records, appended after the previous chunks. The chunk may be nested, like the
+        records of products.json, or already flat, with its list attributes given apart in lists.
+        Raises pydantic.ValidationError if a record is invalid.
+        """
+        products_df = products_df.reset_index(drop=True)
+        if self.validate:
+            products_df = products_df.assign(
+                price=validated(PRICE_LIST, products_df['price'].tolist()),
+                specifications=validated(SPECIFICATIONS_LIST, products_df['specifications'].tolist())
+            )
+        products_df = flatten_products(products_df)
+        if lists is None:
+            products_df, lists = split_lists(products_df)
+        for name, column in lists.items():
+            self._list_chunks[name].append(column)
+        self._product_chunks.append(products_df)
+        self._term_count_chunks.append(recommender.product_term_counts(products_df))
+        for category_id, positions in products_df.groupby('category_id', sort=False).indices.items():
+            self._category_position_chunks.setdefault(category_id, []).append(positions + self._product_count)
+        self._product_count += len(products_df)
+
+    def add_reviews(self, reviews_df: pd.DataFrame) -> None:
+        """
+        Adds a chunk of review records, appended after the previous chunks.
+        Raises InvalidRatingError if a rating is invalid (checked first, while aggregating), or
+        pydantic.ValidationError if another field is.
+        """
+        reviews_df = reviews_df[[column for column in REVIEW_COLUMNS if column in reviews_df.columns]]
+        self.review_stats.update(reviews_df)
+        if self.validate:
+            # Field by field, so the chunk stays columnar instead of becoming one dictionary per review
+            reviews_df = reviews_df.assign(**{
+                name: validated(adapter, reviews_df[name].tolist()) for name, adapter in _review_fields.items()
+            })
+        self._review_chunks.append(reviews_df)
+
+    def products_df(self) -> pd.DataFrame:
+        if not self._product_chunks:
+            return pd.DataFrame(columns=['id', 'title', 'category_id'])
+        return pd.concat(self._product_chunks, ignore_index=True)
+
+    def product_lists(self) -> Dict[str, ListColumn]:
+        """
+        Returns the list attributes of every product (see LIST_COLUMNS), one row per product in catalog order.
+        """
+        return {name: ListColumn.concat(self._list_chunks[name], dtype) for name, dtype in LIST_COLUMNS.items()}
+
+    def reviews_df(self) -> pd.DataFrame:
+        """
+        Returns the reviews grouped by product (keeping their order within a product), so each product owns
+        a contiguous slice.
+        """
+        if not self._review_chunks:
+            return pd.DataFrame(columns=list(REVIEW_COLUMNS))
+        reviews_df = pd.concat(self._review_chunks, ignore_index=True)
+        if not reviews_df['product_id'].is_monotonic_increasing:
+            reviews_df = reviews_df.sort_values('product_id', kind='stable').reset_index(drop=True)
+        return reviews_df
+
+    def term_counts(self) -> sparse.csr_matrix:
+        """
+        Returns the term counts of every product, one row per product in catalog order.
+        """
+        if not self._term_count_chunks:
+            return recommender.product_term_counts(pd.DataFrame())
+        return sparse.vstack(self._term_count_chunks, format='csr')
+
+    def category_positions(self) -> Dict[int, np.ndarray]:
+        """
+        Returns the row positions of the products of each category, in catalog order.
+        """
+        return {
+            category_id: np.concatenate(chunks)
+            for category_id, chunks in self._category_position_chunks.items()
+        }
@@ -0,0 +1,256 @@
+import base64
+import binascii
+import copy
+import json
+
+import numpy as np
+import pandas as pd
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, get_args
+
+from app.repositories.product_columns import PRICE_AMOUNT, PRICE_CURRENCY, ListColumn
+from app.repositories.review_stats import ReviewStats
+
+_NO_POSITIONS = np.empty(0, dtype=np.intp)
+
+# Supported orderings of a listing. Every ordering is made total by breaking ties on catalog position.
+SortOption = Literal["price_asc", "price_desc", "rating_asc", "rating_desc"]
+SORT_OPTIONS = get_args(SortOption)
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor is malformed or belongs to a different ordering."""
+
+def _move_positions(
+    index: Dict[Any, np.ndarray],
+    positions: np.ndarray,
+    old_keys: List[Any],
+    new_keys: List[Any]
+) -> Dict[Any, np.ndarray]:
+    """
+    Returns a copy of an inverted index with each position moved from its old key (None for new rows) to its
+    new key. Only the arrays of the keys involved are rebuilt; the others are shared with the original index.
+    """
+    index = dict(index)
+    for position, old_key, new_key in zip(positions.tolist(), old_keys, new_keys):
+        if old_key == new_key:
+            continue
+        if old_key is not None and old_key in index:
+            index[old_key] = index[old_key][index[old_key] != position]
+        index[new_key] = np.union1d(index.get(new_key, _NO_POSITIONS), [position]).astype(np.intp)
+    return index
+
+class ListingIndex:
+    """
+    Columnar view of the catalog used to list and filter products.
+    Keeps one array per summary field plus inverted indexes (value -> sorted row positions) for the
+    filterable attributes, so a listing request intersects a few position arrays and builds its summaries
+    from column slices, without copying, merging or applying over the products DataFrame.
+    """
+    def __init__(
+        self,
+        products_df: pd.DataFrame,
+        images: ListColumn,
+        categories_df: pd.DataFrame,
+        review_stats: ReviewStats,
+        category_positions: Optional[Dict[int, np.ndarray]] = None
+    ):
+        """
+        products_df is the flat products table and images the images of its products
+        (see app.repositories.product_columns).
+        """
+        # --- Summary columns ---
+        self.ids = products_df['id'].to_numpy(dtype=object)
+        self.titles = products_df['title'].to_numpy(dtype=object)
+        self.currencies = products_df[PRICE_CURRENCY].to_numpy(dtype=object)
+        # Main image of each product ("" if it has none)
+        self.images = images.first("")
+        self.ratings = np.array([review_stats.average_rating(product_id) for product_id in self.ids], dtype=float)
+        self.price_amounts = products_df[PRICE_AMOUNT].to_numpy(dtype=float)
+        # Maps the URL of a main image to the URL served in summaries (e.g. its thumbnail), if set
+        self.image_url: Optional[Callable[[str], str]] = None
+
+        # --- Inverted indexes ---
+        # Category names are resolved to their ID once, here, instead of merging on every request
+        self._category_ids_by_name: Dict[str, int] = dict(zip(categories_df['name'], categories_df['id']))
+        if category_positions is None:
+            category_positions = products_df.groupby('category_id', sort=False).indices
+        self._positions_by_category: Dict[int, np.ndarray] = category_positions
+        self._positions_by_brand: Optional[Dict[str, np.ndarray]] = (
+            products_df.groupby('brand', sort=False).indices if 'brand' in products_df.columns else None
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def category_positions(self) -> Dict[int, np.ndarray]:
+        """
+        Returns the row positions of the products of each category ID.
+        """
+        return self._positions_by_category
+
+    def with_rows(
+        self,
+        previous_df: pd.DataFrame,
+        products_df: pd.DataFrame,
+        images: ListColumn,
+        positions: np.ndarray,
+        review_stats: ReviewStats
+    ) -> "ListingIndex":
+        """
+        Returns a new index reflecting the rows of products_df (and images) at the given positions, which replace
+        the same rows of previous_df (the products the index was built from) or are appended after its last row.
+        The index itself is left untouched, so readers holding it are unaffected.
+        """
+        positions = np.asarray(positions, dtype=np.intp)
+        listing = copy.copy(self)
+        size = len(products_df)
+        old_size = len(self.ids)
+
+        def resized(values: np.ndarray) -> np.ndarray:
+            grown = np.empty(size, dtype=values.dtype)
+            grown[:old_size] = values
+            return grown
+
+        listing.ids, listing.titles, listing.currencies, listing.images, listing.ratings, listing.price_amounts = (
+            resized(values)
+            for values in (self.ids, self.titles, self.currencies, self.images, self.ratings, self.price_amounts)
+        )
+        rows = products_df.iloc[positions]
+        for position, (_, row) in zip(positions.tolist(), rows.iterrows()):
+            listing.ids[position] = row['id']
+            listing.titles[position] = row['title']
+            listing.currencies[position] = row[PRICE_CURRENCY]
+            listing.images[position] = next(iter(images[position]), "")
+            listing.ratings[position] = review_stats.average_rating(row['id'])
+            listing.price_amounts[position] = row[PRICE_AMOUNT]
+
+        def previous(column: str) -> List[Any]:
+            values = previous_df[column]
+            return [values.iloc[position] if position < old_size else None for position in positions.tolist()]
+
+        listing._positions_by_category = _move_positions(
+            self._positions_by_category, positions, previous('category_id'), rows['category_id'].tolist()
+        )
+        if self._positions_by_brand is not None and 'brand' in rows.columns:
+            listing._positions_by_brand = _move_positions(
+                self._positions_by_brand, positions, previous('brand'), rows['brand'].tolist()
+            )
+        return listing
+
+    def with_ratings(self, positions: np.ndarray, review_stats: ReviewStats) -> "ListingIndex":
+        """
+        Returns a new index with the average ratings of the given positions refreshed from review_stats.
+        """
+        listing = copy.copy(self)
+        listing.ratings = self.ratings.copy()
+        for position in np.asarray(positions, dtype=np.intp).tolist():
+            listing.ratings[position] = review_stats.average_rating(self.ids[position])
+        return listing
+
+    def filter(self, category: Optional[str] = None, brand: Optional[str] = None) -> np.ndarray:
+        """
+        Returns the row positions, in catalog order, of the products matching all the given filters.
+        The brand filter is ignored if the catalog has no brand attribute.
+        """
+        filters = []
+        if brand and self._positions_by_brand is not None:
+            filters.append(self._positions_by_brand.get(brand, _NO_POSITIONS))
+        if category:
+            category_id = self._category_ids_by_name.get(category)
+            filters.append(self._positions_by_category.get(category_id, _NO_POSITIONS))
+
+        if not filters:
+            return np.arange(len(self.ids))
+        # Start with the most selective filter so intersections stay small
+        filters.sort(key=len)
+        positions = filters[0]
+        for other in filters[1:]:
+            positions = np.intersect1d(positions, other, assume_unique=True)
+        return positions
+
+    def summaries(self, positions: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        Builds the product summaries of the given row positions from the column arrays.
+        """
+        images = self.images[positions].tolist()
+        if self.image_url is not None:
+            images = [self.image_url(image) for image in images]
+        return [
+            # Prices are built inline, like the rest of the summary, rather than through product_columns.price
+            {
+                "id": product_id,
+                "title": title,
+                "price": {"amount": amount, "currency": currency},
+                "image": image,
+                "average_rating": rating
+            }
+            for product_id, title, amount, currency, image, rating in zip(
+                self.ids[positions].tolist(),
+                self.titles[positions].tolist(),
+                self.price_amounts[positions].tolist(),
+                self.currencies[positions].tolist(),
+                images,
+                self.ratings[positions].tolist()
+            )
+        ]
+
+    def _sort_keys(self, positions: np.ndarray, sort: Optional[str]) -> np.ndarray:
+        """
+        Returns the primary sort key of each position (ascending order); ties are broken by position.
+        """
+        if sort is None:
+            return positions.astype(float)
+        if sort == "price_asc":
+            return self.price_amounts[positions]
+        if sort == "price_desc":
+            return -self.price_amounts[positions]
+        if sort == "rating_asc":
+            return self.ratings[positions]
+        if sort == "rating_desc":
+            return -self.ratings[positions]
+        raise ValueError(f"Unsupported sort '{sort}'. Use one of: {', '.join(SORT_OPTIONS)}")
+
+    def paginate(
+        self,
+        positions: np.ndarray,
+        sort: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> Tuple[np.ndarray, Optional[str]]:
+        """
+        Orders the given positions and returns the page that follows the cursor, plus the cursor of the next page
+        (None on the last page). Cursors point to the last item returned (keyset pagination), so pages stay
+        stable even if products are added to or removed from earlier pages between requests.
+        """
+        positions = np.asarray(positions, dtype=np.intp)
+        keys = self._sort_keys(positions, sort)
+        if sort is not None:
+            order = np.lexsort((positions, keys))
+            positions, keys = positions[order], keys[order]
+
+        if cursor is not None:
+            last_key, last_position = self._decode_cursor(cursor, sort)
+            after = (keys > last_key) | ((keys == last_key) & (positions > last_position))
+            # The ordering is total, so everything after the cursor is a contiguous tail
+            start = int(np.argmax(after)) if after.any() else len(positions)
+            positions, keys = positions[start:], keys[start:]
+
+        if limit is None or len(positions) <= limit:
+            return positions, None
+        page = positions[:limit]
+        return page, self._encode_cursor(sort, keys[limit - 1], page[-1])
+
+    @staticmethod
+    def _encode_cursor(sort: Optional[str], key: float, position: int) -> str:
+        payload = json.dumps({"s": sort, "k": float(key), "p": int(position)}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def _decode_cursor(cursor: str, sort: Optional[str]) -> Tuple[float, int]:
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            cursor_sort, key, position = payload["s"], float(payload["k"]), int(payload["p"])
+        except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+            raise InvalidCursorError("Malformed pagination cursor.")
+        if cursor_sort != sort:
+            raise InvalidCursorError("The pagination cursor was issued for a different sort order.")
+        return key, position
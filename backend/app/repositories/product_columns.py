@@ -0,0 +1,207 @@
+# Layout of the products table held by a catalog snapshot.
+#
+# Products are kept as flat, typed columns instead of nested records, so they can be stored and loaded as arrays
+# (see app.repositories.columnar) and responses are assembled from them without keeping a dictionary per product:
+# - the price as a float column (price.amount) and a text one (price.currency);
+# - one column per attribute of ProductSpecifications (specifications.<name>), typed after the model: text,
+#   float (NaN when missing), nullable integer or nullable boolean; free-form attributes (dimensions) hold dicts;
+# - the lists of images and payment method IDs as ListColumns, kept next to the table (see ListColumn).
+# Tables read from the JSON files are flattened as they are ingested; nested tables (e.g. built by tests or
+# benchmarks) are flattened by the indexes that read them (see flatten_products).
+import math
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union, get_args
+
+import numpy as np
+import pandas as pd
+
+from app.models.product import ProductSpecifications
+
+PRICE_AMOUNT = "price.amount"
+PRICE_CURRENCY = "price.currency"
+
+# List attributes of a product record and the dtype of their values
+LIST_COLUMNS = {"images": object, "accepted_payment_method_ids": np.int64}
+
+def _column_dtype(annotation: Any) -> Union[str, type]:
+    """Returns the dtype of the column holding an Optional[...] attribute of ProductSpecifications."""
+    kind = next((arg for arg in get_args(annotation) if arg is not type(None)), annotation)
+    if kind is bool:
+        return "boolean"
+    if kind is int:
+        return "Int64"
+    if kind is float:
+        return "float64"
+    return object
+
+# Dtype of the column of each specification attribute, in the order of the model (and of its serialized form)
+SPECIFICATION_DTYPES = {
+    name: _column_dtype(field.annotation) for name, field in ProductSpecifications.model_fields.items()
+}
+
+def specification_column(name: str) -> str:
+    """Returns the column holding the given specification attribute."""
+    return f"specifications.{name}"
+
+def is_missing(value: Any) -> bool:
+    """Returns True for the values typed columns use for a missing attribute (None, NaN or pd.NA)."""
+    return value is None or value is pd.NA or (isinstance(value, float) and math.isnan(value))
+
+def _python_value(value: Any) -> Any:
+    """Returns a value read from a typed column as the plain Python value a response holds."""
+    if is_missing(value):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+def flatten_products(products_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns products_df with nested prices and specifications replaced by their flat, typed columns.
+    Tables without nested columns are returned as they are.
+    """
+    if 'price' not in products_df.columns and 'specifications' not in products_df.columns:
+        return products_df
+    columns = {}
+    if 'price' in products_df.columns:
+        prices = [price if isinstance(price, dict) else {} for price in products_df['price']]
+        columns[PRICE_AMOUNT] = pd.Series([price.get('amount') for price in prices], dtype="float64", index=products_df.index)
+        columns[PRICE_CURRENCY] = pd.Series([price.get('currency') for price in prices], dtype=object, index=products_df.index)
+    if 'specifications' in products_df.columns:
+        specifications = [value if isinstance(value, dict) else {} for value in products_df['specifications']]
+        for name, dtype in SPECIFICATION_DTYPES.items():
+            columns[specification_column(name)] = pd.Series(
+                [value.get(name) for value in specifications], dtype=dtype, index=products_df.index
+            )
+    return pd.concat([products_df.drop(columns=['price', 'specifications'], errors='ignore'), pd.DataFrame(columns)], axis=1)
+
+def flat_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns a product record (with the fields of products.json) as the values of a row of the flat table:
+    list attributes are left out, and missing attributes take the missing value of their column.
+    """
+    row = {name: value for name, value in record.items() if name not in ('price', 'specifications') and name not in LIST_COLUMNS}
+    if 'price' in record:
+        row[PRICE_AMOUNT] = float(record['price']['amount'])
+        row[PRICE_CURRENCY] = record['price']['currency']
+    if 'specifications' in record:
+        specifications = record['specifications'] or {}
+        for name, dtype in SPECIFICATION_DTYPES.items():
+            value = specifications.get(name)
+            if value is None:
+                value = np.nan if dtype == "float64" else (pd.NA if dtype in ("Int64", "boolean") else None)
+            row[specification_column(name)] = value
+    return row
+
+def price(amount: float, currency: str) -> Dict[str, Any]:
+    """Returns the serialized form of a price (see app.models.product.Price)."""
+    return {"amount": float(amount), "currency": currency}
+
+def column_arrays(products_df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Returns the array behind each column of products_df, for reading single rows without building a Series per
+    column. Arrays are shared with the table, not copied.
+    """
+    return {
+        name: series.to_numpy() if isinstance(series.dtype, np.dtype) else series.array
+        for name, series in products_df.items()
+    }
+
+def specifications(columns: Dict[str, Any], position: int) -> Dict[str, Any]:
+    """
+    Returns the serialized form of the specifications of the product at the given row position of the column
+    arrays (see column_arrays and app.models.product.ProductSpecifications): every attribute, None where the
+    product has none.
+    """
+    return {
+        name: _python_value(columns[specification_column(name)][position])
+        if specification_column(name) in columns else None
+        for name in SPECIFICATION_DTYPES
+    }
+
+class ListColumn:
+    """
+    A column of lists: the values of every row one after the other in a single array, plus the offset where the
+    values of each row start (and, last, where the values of the last row end). The arrays can be memory-mapped.
+    Treated as immutable: updates (see with_rows) return a new column.
+    """
+    def __init__(self, offsets: np.ndarray, values: np.ndarray):
+        self.offsets = offsets
+        self.values = values
+
+    @classmethod
+    def from_lists(cls, lists: Iterable[Optional[List[Any]]], dtype: Any) -> "ListColumn":
+        """Builds a column from one list per row; missing lists are taken as empty."""
+        lists = [values if isinstance(values, (list, tuple, np.ndarray)) else [] for values in lists]
+        offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum([len(values) for values in lists], out=offsets[1:])
+        values = np.empty(int(offsets[-1]), dtype=dtype)
+        values[:] = [value for row in lists for value in row]
+        return cls(offsets, values)
+
+    @classmethod
+    def concat(cls, columns: List["ListColumn"], dtype: Any) -> "ListColumn":
+        """Returns the rows of the given columns one after the other."""
+        if len(columns) == 1:
+            return columns[0]
+        if not columns:
+            return cls(np.zeros(1, dtype=np.int64), np.empty(0, dtype=dtype))
+        starts = np.cumsum([0] + [len(column.values) for column in columns[:-1]])
+        offsets = np.concatenate(
+            [np.zeros(1, dtype=np.int64)] + [column.offsets[1:] + start for column, start in zip(columns, starts)]
+        )
+        return cls(offsets, np.concatenate([column.values for column in columns]).astype(dtype, copy=False))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position: int) -> List[Any]:
+        return self.values[self.offsets[position]:self.offsets[position + 1]].tolist()
+
+    def first(self, default: Any) -> np.ndarray:
+        """Returns the first value of every row (default for empty rows) as an object array."""
+        starts, stops = self.offsets[:-1], self.offsets[1:]
+        present = stops > starts
+        first = np.full(len(self), default, dtype=object)
+        first[present] = self.values[starts[present]]
+        return first
+
+    def nbytes(self) -> int:
+        """Returns the bytes taken by the column, values included."""
+        size = self.offsets.nbytes + self.values.nbytes
+        if self.values.dtype == object:
+            size += sum(sys.getsizeof(value) for value in self.values.tolist())
+        return size
+
+    def with_rows(self, positions: List[int], lists: List[Optional[List[Any]]]) -> "ListColumn":
+        """
+        Returns a copy of the column with the given lists written at the given row positions; positions past the
+        last row append new rows (every row up to the new last one must be given). The column is left untouched.
+        """
+        replaced = dict(zip(positions, lists))
+        size = max(len(self), max(replaced) + 1)
+        old_lengths = np.diff(self.offsets)
+        lengths = np.zeros(size, dtype=np.int64)
+        lengths[:len(self)] = old_lengths
+        for position, values in replaced.items():
+            lengths[position] = len(values) if values is not None else 0
+        offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        keep = np.ones(size, dtype=bool)
+        keep[list(replaced)] = False
+        values = np.empty(int(offsets[-1]), dtype=self.values.dtype)
+        # Rows that are kept keep their order and lengths, so their values move as one block per row
+        values[np.repeat(keep, lengths)] = self.values[np.repeat(keep[:len(self)], old_lengths)]
+        for position, row in replaced.items():
+            values[offsets[position]:offsets[position + 1]] = row or []
+        return ListColumn(offsets, values)
+
+def split_lists(products_df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, ListColumn]]:
+    """
+    Returns products_df without its list attributes, and those attributes as ListColumns (of empty lists for
+    attributes the table does not have).
+    """
+    lists = {
+        name: ListColumn.from_lists(products_df[name] if name in products_df.columns else [None] * len(products_df), dtype)
+        for name, dtype in LIST_COLUMNS.items()
+    }
+    return products_df.drop(columns=list(LIST_COLUMNS), errors='ignore'), lists
@@ -1,8 +1,127 @@
+import copy
+import hashlib
+import itertools
+
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from pydantic import TypeAdapter
+from typing import List, Dict, Any, FrozenSet, Iterable, Optional, Tuple
 
+from app.core.metrics import span
+from app.models.product import Category, PaymentMethod, Review, Seller
+from app.repositories import columnar
+from app.repositories.ingestion import (
+    DEFAULT_CHUNK_SIZE, PRICE_LIST, SPECIFICATIONS_LIST, TABLES, CatalogIngestion, read_records, table_path, validated
+)
+from app.repositories.listing import ListingIndex
+from app.repositories.product_columns import (
+    PRICE_AMOUNT, PRICE_CURRENCY, ListColumn, column_arrays, flat_record, is_missing, price, specifications
+)
+from app.repositories.review_stats import RATING_LEVELS, ReviewStats
+from app.repositories.reviews import DEFAULT_PAGE_SIZE as REVIEWS_PAGE_SIZE, ReviewIndex
+from app.repositories.search import SearchIndex
 from app.services import recommender
+from app.services.images import ImageVariants
+
+def catalog_signature(data_path: Path) -> Tuple[Tuple[str, int, int], ...]:
+    """
+    Returns a cheap fingerprint of the catalog files (name, mtime and size of each one).
+    Two snapshots loaded from files with the same signature hold the same data.
+    Missing files are reported with a zero mtime and size so that their reappearance is detected.
+    """
+    signature = []
+    for table in TABLES:
+        path = table_path(data_path, table)
+        try:
+            stat = path.stat()
+            signature.append((path.name, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append((path.name, 0, 0))
+    return tuple(signature)
+
+def _version_of(signature: Tuple) -> str:
+    """Derives a short version identifier from a source signature."""
+    return hashlib.sha1(repr(signature).encode()).hexdigest()[:16]
+
+# Validators for the reference tables and added reviews, applied once per snapshot
+_category_list = TypeAdapter(List[Category])
+_seller_list = TypeAdapter(List[Seller])
+_review_list = TypeAdapter(List[Review])
+_payment_method_list = TypeAdapter(List[PaymentMethod])
+
+# Distinguishes repositories built from in-memory DataFrames, which have no files to fingerprint
+_in_memory_versions = itertools.count(1)
+
+# Distinguishes the snapshots derived from another one by in-memory updates
+_update_versions = itertools.count(1)
+
+# Tag of the responses that depend on the whole catalog (e.g. search results): every update changes them
+CATALOG_TAG = "catalog"
+
+# Number of updates walked back by changed_since before giving up on an old version
+_MAX_CHANGE_CHAIN = 64
+
+def product_tag(product_id: str) -> str:
+    """Tag of the responses that show the given product's own data."""
+    return f"product:{product_id}"
+
+def category_tag(category_id: int) -> str:
+    """Tag of the responses that show data of any product of the given category, e.g. its recommendations."""
+    return f"category:{category_id}"
+
+class CatalogUpdateError(ValueError):
+    """Raised when an update refers to a product, category, seller or payment method missing from the catalog."""
+
+def _with_rows(products_df: pd.DataFrame, positions: List[int], records: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Returns a copy of products_df with the given flat records (see product_columns.flat_record) written at the
+    given row positions; positions past the last row append new rows. Columns whose values do not change are
+    shared with products_df; the others are copied, keeping their dtype, leaving products_df untouched.
+    """
+    size = max(len(products_df), max(positions) + 1)
+    column_names = list(products_df.columns) + [
+        name for name in dict.fromkeys(key for record in records for key in record) if name not in products_df.columns
+    ]
+    columns = {}
+    for name in column_names:
+        new_values = [record.get(name) for record in records]
+        if name in products_df.columns:
+            series = products_df[name]
+            if size == len(products_df) and all(
+                _same_value(series.iloc[position], value) for position, value in zip(positions, new_values)
+            ):
+                columns[name] = series
+                continue
+            if not isinstance(series.dtype, np.dtype):
+                # Extension dtypes (nullable integers and booleans, text) hold their own missing value
+                column = series.reindex(range(size)) if size > len(series) else series.copy()
+                column.iloc[positions] = new_values
+                columns[name] = column
+                continue
+            values = series.to_numpy()
+        else:
+            values = np.full(len(products_df), None, dtype=object)
+        if values.dtype != object and any(value is None or value is pd.NA for value in new_values):
+            values = values.astype(object)
+        column = np.empty(size, dtype=values.dtype)
+        column[:len(values)] = values
+        for position, value in zip(positions, new_values):
+            column[position] = value
+        # With its dtype given, an object column of text is not inferred as a text dtype
+        columns[name] = pd.Series(column, dtype=column.dtype, copy=False)
+    return pd.DataFrame(columns, copy=False)
+
+def _same_value(current: Any, new: Any) -> bool:
+    if is_missing(new):
+        return is_missing(current)
+    if is_missing(current):
+        return False
+    try:
+        return bool(current == new)
+    except (TypeError, ValueError):
+        # Array-like values that do not compare to a single boolean
+        return False
 
 class ProductRepository:
     """
@@ -10,75 +129,415 @@ class ProductRepository:
     Loads data from JSON files and provides methods for querying, enriching, and summarizing product information.
     Abstracts the data source from the rest of the application for maintainability and testability.
     """
-    def __init__(self, data_path: Path = Path("app/data")):
+    def __init__(
+        self,
+        data_path: Path = Path("app/data"),
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        recommender_options: Optional[recommender.RecommenderOptions] = None
+    ):
         """
         Loads all required data files into memory as pandas DataFrames for efficient access.
+        Products and reviews given as newline-delimited JSON (products.ndjson, reviews.ndjson) are streamed
+        in chunks of chunk_size records, building their aggregates as they are read.
+        recommender_options configures the recommendation model (exact, text similarity only, by default).
         Raises RuntimeError if any data file is missing.
+        Instances are treated as immutable snapshots of the catalog: they are shared across requests and
+        replaced as a whole (never modified in place) when the data files change.
         """
         self.data_path = data_path
+        # Taken before reading so that a change made while loading triggers another reload
+        self.signature = catalog_signature(data_path)
+        # Identifies the data served by this snapshot, e.g. to key cached responses
+        self.version = _version_of(self.signature)
+        ingestion = CatalogIngestion()
         try:
-            self.products_df = pd.read_json(data_path / "products.json")
-            self.categories_df = pd.read_json(data_path / "categories.json").set_index('id')
-            self.sellers_df = pd.read_json(data_path / "sellers.json").set_index('id')
-            self.reviews_df = pd.read_json(data_path / "reviews.json")
-            self.payment_methods_df = pd.read_json(data_path / "payment_methods.json").set_index('id')
+            for chunk in read_records(table_path(data_path, "products"), chunk_size):
+                ingestion.add_products(chunk)
+            for chunk in read_records(table_path(data_path, "reviews"), chunk_size):
+                ingestion.add_reviews(chunk)
+            categories_df = pd.read_json(data_path / "categories.json")
+            sellers_df = pd.read_json(data_path / "sellers.json")
+            payment_methods_df = pd.read_json(data_path / "payment_methods.json")
         except FileNotFoundError as e:
             raise RuntimeError(f"Data file not found: {e}. Ensure all JSON files are in {data_path}")
 
+        self._build(ingestion, categories_df, sellers_df, payment_methods_df, recommender_options)
+
+    @classmethod
+    def from_dataframes(
+        cls,
+        products_df: pd.DataFrame,
+        categories_df: pd.DataFrame,
+        sellers_df: pd.DataFrame,
+        reviews_df: pd.DataFrame,
+        payment_methods_df: pd.DataFrame,
+        recommender_options: Optional[recommender.RecommenderOptions] = None,
+        prepared: bool = False,
+        product_lists: Optional[Dict[str, ListColumn]] = None
+    ) -> "ProductRepository":
+        """
+        Builds a repository from in-memory DataFrames with the same columns as the JSON files.
+        Useful for tests and benchmarks with generated catalogs.
+        prepared marks products and reviews tables already validated and grouped (see CatalogIngestion), e.g.
+        those of a compiled catalog, which are used as they are; their products may be flat, with their list
+        attributes given in product_lists (see app.repositories.product_columns).
+        """
+        repository = cls.__new__(cls)
+        repository.data_path = None
+        repository.signature = ()
+        repository.version = f"memory-{next(_in_memory_versions)}"
+        ingestion = CatalogIngestion(validate=not prepared)
+        ingestion.add_products(products_df, product_lists)
+        ingestion.add_reviews(reviews_df)
+        repository._build(ingestion, categories_df, sellers_df, payment_methods_df, recommender_options)
+        return repository
+
+    @classmethod
+    def from_compiled(
+        cls,
+        compiled_path: Path,
+        recommender_options: Optional[recommender.RecommenderOptions] = None
+    ) -> "ProductRepository":
+        """
+        Builds a repository from a catalog compiled with app.repositories.columnar, without parsing JSON files.
+        Its records were validated and its reviews grouped by product when it was compiled, so the tables are
+        served as loaded: numeric columns stay memory-mapped, and their pages are shared by all the processes
+        serving the catalog.
+        """
+        build_path = columnar.resolve_build(compiled_path)
+        signature = columnar.compiled_signature(build_path)
+        repository = cls.from_dataframes(
+            **columnar.load_catalog(build_path), recommender_options=recommender_options, prepared=True
+        )
+        repository.data_path = compiled_path
+        repository.signature = signature
+        repository.version = _version_of(signature)
+        return repository
+
+    def _build(
+        self,
+        ingestion: CatalogIngestion,
+        categories_df: pd.DataFrame,
+        sellers_df: pd.DataFrame,
+        payment_methods_df: pd.DataFrame,
+        recommender_options: Optional[recommender.RecommenderOptions] = None
+    ) -> None:
+        """
+        Stores the catalog DataFrames and builds the lookup structures derived from them,
+        reusing the aggregates the ingestion accumulated while the records were read.
+        """
+        # Records were validated chunk by chunk as they were added, and reviews come grouped by product
+        self.products_df = ingestion.products_df()
+        # Arrays of the columns of products_df, to read a single product's fields (see column_arrays)
+        self._product_columns: Dict[str, Any] = column_arrays(self.products_df)
+        # Images and payment method IDs of every product, one row per product (see product_columns.LIST_COLUMNS)
+        self.product_lists: Dict[str, ListColumn] = ingestion.product_lists()
+        self.categories_df = categories_df.set_index('id')
+        self.sellers_df = sellers_df.set_index('id')
+        self.reviews_df = ingestion.reviews_df()
+        self.payment_methods_df = payment_methods_df.set_index('id')
+        # Version of each of the last snapshots derived from this one by in-memory updates -> (version it was derived
+        # from, tags of the responses the update changed); see changed_since. Each derived snapshot holds its own
+        # copy, bounded to the _MAX_CHANGE_CHAIN links changed_since can walk.
+        self._changes: Dict[str, Tuple[str, FrozenSet[str]]] = {}
+        # Reviews of each product pre-sorted by recency and rating, for paginating them
+        self.review_index = ReviewIndex(self.reviews_df)
+
+        # --- Hash indexes ---
+        # Primary key -> row position, so lookups by ID do not scan the whole column
+        self._product_positions: Dict[str, int] = {product_id: i for i, product_id in enumerate(self.products_df['id'])}
+        # Small reference tables, kept as ready-to-serve records
+        self._categories: Dict[int, Dict[str, Any]] = {
+            record['id']: record for record in validated(_category_list, categories_df.to_dict('records'))
+        }
+        self._sellers: Dict[str, Dict[str, Any]] = {
+            record['id']: record for record in validated(_seller_list, sellers_df.to_dict('records'))
+        }
+        self._payment_methods: Dict[int, Dict[str, Any]] = {
+            record['id']: record for record in validated(_payment_method_list, payment_methods_df.to_dict('records'))
+        }
+
+        # Ratings aggregated while the reviews were read, so averages do not require scanning all reviews
+        self.review_stats: ReviewStats = ingestion.review_stats
+        category_positions = ingestion.category_positions()
+
+        # Column arrays and inverted indexes for listing and filtering products
+        self.listing = ListingIndex(
+            self.products_df, self.product_lists['images'], categories_df, self.review_stats, category_positions
+        )
+        # Inverted index of the product texts for full-text search, built once per snapshot
+        self.search_index = SearchIndex(self.products_df)
+        # Resized variants of the product images (see use_image_variants); the originals are served until set
+        self.image_variants: Optional[ImageVariants] = None
+
+        recommender_options = recommender_options or recommender.RecommenderOptions()
+        # Recommendation model for this snapshot; category models are fitted once, on first use or by warm()
+        self.recommendation_index = recommender.RecommendationIndex(
+            self.products_df,
+            term_counts=ingestion.term_counts(),
+            category_positions=category_positions,
+            weights=recommender_options.weights,
+            seller_reputations={seller_id: seller['reputation']['score'] for seller_id, seller in self._sellers.items()},
+            approximate=recommender_options.approximate,
+            cross_category=recommender_options.cross_category
+        )
+
+    def use_image_variants(self, image_variants: ImageVariants) -> "ProductRepository":
+        """
+        Makes summaries link the thumbnail variant of the main image and details the detail-size variant of
+        every image. Meant to be called on a snapshot being built, before it is published.
+        Returns the repository itself for chaining.
+        """
+        self.image_variants = image_variants
+        self.listing.image_url = lambda image: image_variants.url(image, "thumbnail")
+        return self
+
+    def with_image_variants(self, image_variants: ImageVariants) -> "ProductRepository":
+        """
+        Returns a new snapshot linking the given image variants (see use_image_variants), e.g. after they were
+        rendered again. Image URLs appear in every product response, so the new version records no change that
+        would let cached responses carry over (see changed_since).
+        """
+        repository = copy.copy(self)
+        repository.version = f"{self.version.partition('+')[0]}+{next(_update_versions)}"
+        repository.listing = copy.copy(self.listing)
+        return repository.use_image_variants(image_variants)
+
+    def _derive(self, changed_tags: Iterable[str]) -> "ProductRepository":
+        """
+        Returns a shallow copy of this snapshot under a new version, to apply an in-memory update to.
+        Updates replace the structures they change instead of modifying them, so this snapshot stays intact.
+        changed_tags are the tags of the responses the update changes (see response_tags).
+        """
+        repository = copy.copy(self)
+        repository.version = f"{self.version.partition('+')[0]}+{next(_update_versions)}"
+        # Links older than the last _MAX_CHANGE_CHAIN are never walked, so they are dropped
+        recent = itertools.islice(self._changes.items(), max(0, len(self._changes) - _MAX_CHANGE_CHAIN + 1), None)
+        repository._changes = dict(recent)
+        repository._changes[repository.version] = (self.version, frozenset(changed_tags) | {CATALOG_TAG})
+        return repository
+
+    def changed_since(self, version: str) -> Optional[FrozenSet[str]]:
+        """
+        Returns the tags of the responses changed by the in-memory updates made between the given snapshot version and
+        this one (empty if it is this version), or None if this snapshot was not derived from it, e.g. after a reload.
+        """
+        changed: FrozenSet[str] = frozenset()
+        current = self.version
+        for _ in range(_MAX_CHANGE_CHAIN):
+            if current == version:
+                return changed
+            change = self._changes.get(current)
+            if change is None:
+                return None
+            current, tags = change
+            changed |= tags
+        return None
+
+    def response_tags(self, item_id: str, include_related: bool) -> FrozenSet[str]:
+        """
+        Returns the tags of a response about the given product: its own data and, when it includes the product's
+        recommendations, the data of every product they may be drawn from.
+        """
+        tags = {product_tag(item_id)}
+        if include_related:
+            if self.recommendation_index.cross_category:
+                tags.add(CATALOG_TAG)
+            else:
+                position = self._product_positions[item_id]
+                tags.add(category_tag(int(self.products_df['category_id'].iat[position])))
+        return frozenset(tags)
+
+    def with_products(self, records: List[Dict[str, Any]]) -> "ProductRepository":
+        """
+        Returns a new snapshot with the given product records inserted, or replacing the products with the same ID.
+        Records have the fields of products.json. Listing indexes and the recommendation models of the categories
+        the products belong (or belonged) to are updated for the affected rows only.
+        Raises CatalogUpdateError if a record refers to an unknown category, seller or payment method.
+        """
+        for record in records:
+            if record['category_id'] not in self._categories:
+                raise CatalogUpdateError(f"Unknown category_id {record['category_id']}.")
+            if record['seller_id'] not in self._sellers:
+                raise CatalogUpdateError(f"Unknown seller_id '{record['seller_id']}'.")
+            unknown_methods = [method for method in record['accepted_payment_method_ids'] if method not in self._payment_methods]
+            if unknown_methods:
+                raise CatalogUpdateError(f"Unknown payment method IDs: {unknown_methods}.")
+        if not records:
+            return self
+        # Validated like the records loaded from the data files
+        records = [
+            {**record, "price": record_price, "specifications": record_specifications}
+            for record, record_price, record_specifications in zip(
+                records,
+                validated(PRICE_LIST, [record['price'] for record in records]),
+                validated(SPECIFICATIONS_LIST, [record['specifications'] for record in records])
+            )
+        ]
+
+        old_categories = self.products_df['category_id'].to_numpy()
+        changed_tags = set()
+        for record in records:
+            changed_tags.update((product_tag(record['id']), category_tag(record['category_id'])))
+            if record['id'] in self._product_positions:
+                changed_tags.add(category_tag(int(old_categories[self._product_positions[record['id']]])))
+
+        repository = self._derive(changed_tags)
+        product_positions = self._product_positions
+        positions = []
+        for record in records:
+            position = product_positions.get(record['id'])
+            if position is None:
+                if product_positions is self._product_positions:
+                    product_positions = dict(self._product_positions)
+                position = len(product_positions)
+                product_positions[record['id']] = position
+            positions.append(position)
+        # Later records win when the same product is given twice
+        last_records = dict(zip(positions, records))
+        positions, records = list(last_records), list(last_records.values())
+
+        old_size = len(self.products_df)
+        repository.products_df = _with_rows(self.products_df, positions, [flat_record(record) for record in records])
+        repository._product_columns = column_arrays(repository.products_df)
+        repository.product_lists = {
+            name: column.with_rows(positions, [record.get(name) for record in records])
+            for name, column in self.product_lists.items()
+        }
+        repository._product_positions = product_positions
+        repository.listing = self.listing.with_rows(
+            self.products_df, repository.products_df, repository.product_lists['images'], np.array(positions),
+            self.review_stats
+        )
+        repository.search_index = self.search_index.with_rows(repository.products_df, np.array(positions))
+        previous_category_ids = [int(old_categories[position]) if position < old_size else None for position in positions]
+        repository.recommendation_index = self.recommendation_index.with_products(
+            repository.products_df, np.array(positions), previous_category_ids, repository.listing.category_positions()
+        )
+        return repository
+
+    def with_reviews(self, records: List[Dict[str, Any]]) -> "ProductRepository":
+        """
+        Returns a new snapshot with the given reviews added. Records have the fields of reviews.json.
+        The review statistics and listing ratings of the reviewed products are updated incrementally.
+        Raises CatalogUpdateError if a review refers to an unknown product or has a rating outside 1-5.
+        """
+        for record in records:
+            if record['product_id'] not in self._product_positions:
+                raise CatalogUpdateError(f"Product with ID '{record['product_id']}' not found.")
+            if record['rating'] not in RATING_LEVELS:
+                raise CatalogUpdateError(f"Invalid review rating {record['rating']!r}.")
+        if not records:
+            return self
+
+        old_categories = self.products_df['category_id'].to_numpy()
+        changed_tags = set()
+        for record in records:
+            position = self._product_positions[record['product_id']]
+            changed_tags.update((product_tag(record['product_id']), category_tag(int(old_categories[position]))))
+
+        repository = self._derive(changed_tags)
+        repository.review_stats = self.review_stats.copy()
+        reviews = list(zip((record['product_id'] for record in records), validated(_review_list, records)))
+        for product_id, review in reviews:
+            repository.review_stats.add(product_id, review['rating'])
+        repository.review_index = self.review_index.with_reviews(reviews)
+        positions = sorted({self._product_positions[record['product_id']] for record in records})
+        repository.listing = self.listing.with_ratings(np.array(positions), repository.review_stats)
+        return repository
+
+    def snapshot_size(self) -> Dict[str, int]:
+        """
+        Returns the number of products and reviews of the snapshot and the bytes taken by its product table (list
+        attributes included).
+        Measuring the table walks every value, so callers polling it should keep the result per version.
+        """
+        return {
+            "products": len(self.products_df),
+            "reviews": len(self.review_index),
+            "products_bytes": int(self.products_df.memory_usage(deep=True).sum())
+            + sum(column.nbytes() for column in self.product_lists.values()),
+        }
+
+    def has_product(self, item_id: str) -> bool:
+        """
+        Returns True if a product with the given ID exists in the catalog.
+        """
+        return item_id in self._product_positions
+
     def get_all_products_for_recommendation(self) -> pd.DataFrame:
         """
         Returns a copy of the products DataFrame for use in recommendation algorithms.
         """
         return self.products_df.copy()
 
-    def find_product_details_by_id(self, item_id: str) -> Optional[Dict[str, Any]]:
+    def find_product_details_by_id(
+        self,
+        item_id: str,
+        include_related: bool = True,
+        reviews_limit: int = REVIEWS_PAGE_SIZE
+    ) -> Optional[Dict[str, Any]]:
         """
         Retrieves detailed information for a product by its ID, including related category, seller, reviews, payment methods, specifications, and recommended products.
+        Only the first reviews_limit reviews (most recent first) are embedded, along with the rating histogram and
+        the cursor of the next page of reviews (see find_reviews_page).
+        Recommended products are skipped (left empty) when include_related is False.
         Returns None if the product is not found.
         """
-        # Filter the DataFrame to find the product by ID
-        product_df_filtered = self.products_df[self.products_df['id'] == item_id]
+        # Find the product row through the ID index
+        position = self._product_positions.get(item_id)
 
         # Return None if the product does not exist
-        if product_df_filtered.empty:
+        if position is None:
             return None
 
-        # Extract the product data as a Series
-        product_series = product_df_filtered.iloc[0]
+        with span("repository.lookup"):
+            # Read the product's fields from the column arrays
+            columns = self._product_columns
+
+            def field(name: str) -> Any:
+                return columns[name][position]
 
-        # Enrich product data with related information
-        category = self.categories_df.loc[product_series['category_id']].to_dict()
-        category['id'] = product_series['category_id']
+            # Enrich product data with related information
+            category = dict(self._categories[int(field('category_id'))])
+            seller = dict(self._sellers[field('seller_id')])
 
-        seller = self.sellers_df.loc[product_series['seller_id']].to_dict()
-        seller['id'] = product_series['seller_id']
+            payment_method_ids = self.product_lists['accepted_payment_method_ids'][position]
+            accepted_payments = [dict(self._payment_methods[payment_method_id]) for payment_method_id in payment_method_ids]
 
-        product_reviews = self.reviews_df[self.reviews_df['product_id'] == item_id]
-        average_rating = product_reviews['rating'].mean() if not product_reviews.empty else 0.0
+            images = self.product_lists['images'][position]
+            if self.image_variants is not None:
+                images = [self.image_variants.url(image, "detail") for image in images]
 
-        payment_method_ids = product_series['accepted_payment_method_ids']
-        accepted_payments = self.payment_methods_df.loc[payment_method_ids].reset_index().to_dict('records')
+        with span("repository.reviews"):
+            product_reviews, reviews_next_cursor = self.review_index.page(item_id, limit=reviews_limit)
+            review_summary = self.review_stats.get(item_id)
+            average_rating = self.review_stats.average_rating(item_id)
 
-        # Generate recommended product IDs using the recommender service
-        all_products_df = self.get_all_products_for_recommendation()
-        product_category_id = product_series['category_id']
-        recommended_ids = recommender.generate_recommendations(item_id, product_category_id, all_products_df)
-        related_products = self.find_products_by_ids(recommended_ids)
+        # Look up recommended product IDs in the precomputed recommendation index
+        related_products = []
+        if include_related:
+            recommended_ids = self.recommendation_index.recommend(item_id)
+            related_products = self.find_products_by_ids(recommended_ids)
 
         # Assemble the final product details dictionary
+        # The fields follow the order of the ProductDetail model
         product_details = {
-            "id": product_series['id'],
-            "title": product_series['title'],
-            "description": product_series['description'],
-            "price": product_series['price'],
-            "images": product_series['images'],
-            "stock": product_series['stock'],
-            "average_rating": round(average_rating, 2),
+            "id": str(field('id')),
+            "title": str(field('title')),
+            "price": price(field(PRICE_AMOUNT), field(PRICE_CURRENCY)),
+            "description": str(field('description')),
+            "images": images,
+            "stock": int(field('stock')),
+            "average_rating": average_rating,
             "category": category,
             "seller": seller,
-            "reviews": product_reviews[['author', 'rating', 'comment']].to_dict('records'),
+            "reviews": product_reviews,
+            "review_count": review_summary.count,
+            "rating_histogram": {str(rating): count for rating, count in review_summary.histogram.items()},
+            "reviews_next_cursor": reviews_next_cursor,
             "accepted_payment_methods": accepted_payments,
-            "specifications": product_series['specifications'],
+            "specifications": specifications(columns, position),
             "related_products": related_products
         }
 
@@ -89,61 +548,86 @@ class ProductRepository:
         Retrieves summary information for multiple products by their IDs.
         Returns a list of product summaries including average rating and main image.
         """
-        
-        products_subset = self.products_df[self.products_df['id'].isin(item_ids)]
+        # Resolve positions through the ID index, keeping catalog order and skipping unknown IDs
+        with span("repository.summaries"):
+            positions = sorted({self._product_positions[item_id] for item_id in item_ids if item_id in self._product_positions})
+            return self.listing.summaries(positions)
 
-        # Using a functional approach with apply to process each row
-        def create_summary(row):
-            product_reviews = self.reviews_df[self.reviews_df['product_id'] == row['id']]
-            average_rating = product_reviews['rating'].mean() if not product_reviews.empty else 0.0
-            return {
-                "id": row['id'],
-                "title": row['title'],
-                "price": row['price'],
-                "image": row['images'][0] if row['images'] else "",
-                "average_rating": round(average_rating, 2)
-            }
-            
-        return list(products_subset.apply(create_summary, axis=1))
-    
-    def find_all_products(self, category: Optional[str] = None, brand: Optional[str] = None) -> List[Dict[str, Any]]:
+    def find_all_products(
+        self,
+        category: Optional[str] = None,
+        brand: Optional[str] = None,
+        sort: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
         """
         Retrieves all products, with optional filtering by category name and brand.
         Returns a list of product summaries for display on the main page.
         """
-        # Start with a copy of all products
-        filtered_df = self.products_df.copy()
-
-        # Filter by brand if specified and the column exists
-        if brand and 'brand' in filtered_df.columns:
-            filtered_df = filtered_df[filtered_df['brand'] == brand]
-
-        # Filter by category if specified
-        if category:
-            categories_for_merge = self.categories_df.reset_index()
-            merged_df = pd.merge(
-                filtered_df,
-                categories_for_merge,
-                left_on='category_id',
-                right_on='id',
-                suffixes=('', '_cat')
-            )
-            filtered_df = merged_df[merged_df['name'] == category]
+        products, _ = self.find_products_page(category=category, brand=brand, sort=sort)
+        return products
 
-        # Return an empty list if no products match the filters
-        if filtered_df.empty:
-            return []
+    def find_products_page(
+        self,
+        category: Optional[str] = None,
+        brand: Optional[str] = None,
+        sort: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Retrieves one page of product summaries matching the filters, in catalog order or sorted by price or rating.
+        Returns the summaries and the cursor of the next page (None if this is the last one).
+        Raises InvalidCursorError if the cursor is malformed or was issued for another sort order.
+        """
+        with span("repository.page"):
+            positions = self.listing.filter(category=category, brand=brand)
+            page, next_cursor = self.listing.paginate(positions, sort=sort, limit=limit, cursor=cursor)
+            return self.listing.summaries(page), next_cursor
+
+    def find_reviews_page(
+        self,
+        item_id: str,
+        sort: str = "recent",
+        limit: Optional[int] = REVIEWS_PAGE_SIZE,
+        cursor: Optional[str] = None
+    ) -> Optional[Tuple[List[Dict[str, Any]], Optional[str]]]:
+        """
+        Retrieves one page of a product's reviews, most recent first or sorted by rating (highest or lowest first).
+        Returns the reviews and the cursor of the next page (None if this is the last one), or None if the product
+        is not found.
+        Raises InvalidCursorError if the cursor is malformed or was issued for another sort order.
+        """
+        if item_id not in self._product_positions:
+            return None
+        with span("repository.reviews"):
+            return self.review_index.page(item_id, sort=sort, limit=limit, cursor=cursor)
 
-        # Create summary for each product
-        def create_summary(row):
-            product_reviews = self.reviews_df[self.reviews_df['product_id'] == row['id']]
-            average_rating = product_reviews['rating'].mean() if not product_reviews.empty else 0.0
+    def search_products(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        brand: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Searches the products whose title, brand, description or specifications contain every term of the query,
+        regardless of accents and case, the last term as a prefix (so partial input matches while typing).
+        Returns one page of the matching summaries, best BM25 score first, narrowed down by the category name and
+        brand filters, along with the total number of matches and the number of matches per category and brand
+        (counted before applying those filters, so they can be offered as alternatives).
+        """
+        with span("repository.search"):
+            within = self.listing.filter(category=category, brand=brand) if category or brand else None
+            results = self.search_index.search(query, limit=None if limit is None else offset + limit, within=within)
             return {
-                "id": row['id'],
-                "title": row['title'],
-                "price": row['price'],
-                "image": row['images'][0] if row['images'] else "",
-                "average_rating": round(average_rating, 2)
+                "total": results.total,
+                "items": self.listing.summaries(results.positions[offset:]),
+                "facets": {
+                    "categories": [
+                        {**self._categories[category_id], "count": count}
+                        for category_id, count in results.categories.items() if category_id in self._categories
+                    ],
+                    "brands": [{"name": name, "count": count} for name, count in results.brands.items()],
+                },
             }
-
-        return list(filtered_df.apply(create_summary, axis=1))
\ No newline at end of file
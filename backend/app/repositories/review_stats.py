@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+# Ratings a review can have
+RATING_LEVELS = (1, 2, 3, 4, 5)
+
+class InvalidRatingError(ValueError):
+    """Raised when a review has a rating outside RATING_LEVELS."""
+
+@dataclass
+class ReviewSummary:
+    """Aggregated review figures for a single product."""
+    count: int = 0
+    total: int = 0
+    histogram: Dict[int, int] = field(default_factory=lambda: {rating: 0 for rating in RATING_LEVELS})
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+class ReviewStats:
+    """
+    Pre-aggregated review statistics per product: count, sum, mean and rating histogram.
+    Built from a groupby over the reviews when the catalog is loaded (one per chunk when the reviews are
+    streamed), so the average rating of a product is a dictionary lookup instead of a scan over all the reviews.
+    """
+    def __init__(self, reviews_df: Optional[pd.DataFrame] = None):
+        self._summaries: Dict[str, ReviewSummary] = {}
+        if reviews_df is not None:
+            self.update(reviews_df)
+
+    def update(self, reviews_df: pd.DataFrame) -> None:
+        """
+        Merges a batch of reviews into the statistics.
+        Raises InvalidRatingError if a rating is not one of RATING_LEVELS, rather than leaving it out of the figures.
+        """
+        if reviews_df.empty:
+            return
+        invalid = ~reviews_df['rating'].isin(RATING_LEVELS)
+        if invalid.any():
+            raise InvalidRatingError(
+                f"Invalid review ratings {sorted(set(map(str, reviews_df['rating'][invalid])))}; "
+                f"ratings must be one of {RATING_LEVELS}."
+            )
+
+        # One row per product, one column per rating level, holding the number of reviews
+        histograms = (
+            reviews_df.groupby(['product_id', 'rating']).size()
+            .unstack(fill_value=0)
+            .reindex(columns=RATING_LEVELS, fill_value=0)
+        )
+        counts = histograms.sum(axis=1)
+        totals = histograms.to_numpy() @ np.array(RATING_LEVELS)
+
+        for product_id, row, count, total in zip(histograms.index, histograms.to_numpy(), counts, totals):
+            summary = self._summaries.get(product_id) or ReviewSummary()
+            histogram = dict(summary.histogram)
+            for rating, rating_count in zip(RATING_LEVELS, row.tolist()):
+                histogram[rating] = histogram.get(rating, 0) + rating_count
+            self._summaries[product_id] = ReviewSummary(
+                count=summary.count + int(count),
+                total=summary.total + int(total),
+                histogram=histogram
+            )
+
+    def copy(self) -> "ReviewStats":
+        """
+        Returns an independent copy of the statistics. Summaries are never modified in place (updates replace
+        them), so the copy shares them with the original and costs a single dictionary copy.
+        """
+        stats = ReviewStats()
+        stats._summaries = dict(self._summaries)
+        return stats
+
+    def get(self, product_id: str) -> ReviewSummary:
+        """
+        Returns the review summary of a product (an empty one if it has no reviews).
+        """
+        return self._summaries.get(product_id) or ReviewSummary()
+
+    def average_rating(self, product_id: str) -> float:
+        """
+        Returns the average rating of a product rounded to two decimals, or 0.0 if it has no reviews.
+        """
+        summary = self._summaries.get(product_id)
+        return round(summary.mean, 2) if summary else 0.0
+
+    def add(self, product_id: str, rating: int) -> None:
+        """
+        Updates the statistics of a product with a newly added review.
+        Raises InvalidRatingError if the rating is not one of RATING_LEVELS.
+        """
+        if rating not in RATING_LEVELS:
+            raise InvalidRatingError(f"Invalid review rating {rating!r}; ratings must be one of {RATING_LEVELS}.")
+        summary = self._summaries.get(product_id) or ReviewSummary()
+        histogram = dict(summary.histogram)
+        histogram[rating] = histogram.get(rating, 0) + 1
+        self._summaries[product_id] = ReviewSummary(count=summary.count + 1, total=summary.total + rating, histogram=histogram)
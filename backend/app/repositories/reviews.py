@@ -0,0 +1,241 @@
+import base64
+import binascii
+import bisect
+import copy
+import heapq
+import json
+
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Literal, Optional, Tuple, get_args
+
+from app.repositories.listing import InvalidCursorError
+
+# Supported orderings of a product's reviews. Reviews carry no date, so recency is the order in which they were
+# loaded (reviews added in memory being the most recent); rating ties are broken by recency as well.
+ReviewSortOption = Literal["recent", "rating_desc", "rating_asc"]
+REVIEW_SORT_OPTIONS = get_args(ReviewSortOption)
+
+# Reviews returned per page when no limit is given, e.g. the first page embedded in the product details
+DEFAULT_PAGE_SIZE = 10
+
+# Sort keys pack the rating above the review's arrival sequence number, which stays below this bound
+_SEQUENCE_SPAN = 1 << 40
+
+# Ratings walked, in order, by each ordering of the reviews added in memory; None walks them all at once
+_RATING_ORDER = {"recent": (None,), "rating_desc": (5, 4, 3, 2, 1), "rating_asc": (1, 2, 3, 4, 5)}
+
+def _sort_keys(ratings: np.ndarray, sequence: np.ndarray, sort: str) -> np.ndarray:
+    """
+    Returns the key of each review in the given ordering: ascending keys follow the ordering and, since sequence
+    numbers are unique within a product, no two reviews of a product share a key.
+    """
+    ratings = ratings.astype(np.int64)
+    if sort == "recent":
+        primary = np.zeros_like(ratings)
+    elif sort == "rating_desc":
+        primary = -ratings
+    elif sort == "rating_asc":
+        primary = ratings
+    else:
+        raise ValueError(f"Unsupported sort '{sort}'. Use one of: {', '.join(REVIEW_SORT_OPTIONS)}")
+    return primary * _SEQUENCE_SPAN - sequence.astype(np.int64)
+
+def _sort_primary(rating: Optional[int], sort: str) -> int:
+    """Returns the part of the sort key given by the rating (see _sort_keys)."""
+    if sort == "recent":
+        return 0
+    return -rating if sort == "rating_desc" else rating
+
+class _ProductAdditions:
+    """
+    Reviews added in memory to a product, in the order they were added, with the positions of those of each
+    rating. Lists are only appended to, so snapshots can share them, each seeing the prefix it was published with.
+    """
+    def __init__(self):
+        self.reviews: List[Dict[str, Any]] = []
+        # Position in the log of additions (see _Additions) of each review, increasing
+        self.log_positions: List[int] = []
+        self.by_rating: Dict[int, List[int]] = {}
+
+    def append(self, log_position: int, review: Dict[str, Any]) -> None:
+        self.by_rating.setdefault(review['rating'], []).append(len(self.reviews))
+        self.log_positions.append(log_position)
+        self.reviews.append(review)
+
+class _Additions:
+    """
+    Log of the reviews added in memory, shared by the indexes derived from one another by with_reviews.
+    An index sees the reviews logged before it was derived (a prefix of the log); later additions go to the end.
+    """
+    def __init__(self):
+        self.size = 0
+        self.products: Dict[str, _ProductAdditions] = {}
+
+    def append(self, product_id: str, review: Dict[str, Any]) -> None:
+        product = self.products.get(product_id)
+        if product is None:
+            product = self.products[product_id] = _ProductAdditions()
+        product.append(self.size, review)
+        self.size += 1
+
+    def prefix(self, size: int) -> "_Additions":
+        """Returns a new log with the first size reviews of this one."""
+        additions = _Additions()
+        entries = sorted(
+            (log_position, product_id, review)
+            for product_id, product in self.products.items()
+            for log_position, review in zip(product.log_positions, product.reviews)
+            if log_position < size
+        )
+        for _, product_id, review in entries:
+            additions.append(product_id, review)
+        return additions
+
+class ReviewIndex:
+    """
+    Reviews of every product pre-sorted in each supported ordering, for keyset pagination.
+    Reviews are stored grouped by product, one array per field; for each ordering, the slice of a product holds its
+    reviews' indexes in that order alongside their ascending sort keys, so a page is a binary search for the cursor
+    plus a slice, and only the reviews of the page are built as records.
+    Reviews added after loading are kept in a per-product overlay, grouped by rating in arrival order so that each
+    ordering walks it already sorted, and merged into the pages.
+    """
+    def __init__(self, reviews_df: pd.DataFrame):
+        """
+        reviews_df holds the validated reviews grouped by product (in file order within a product).
+        """
+        self._authors = reviews_df['author'].to_numpy()
+        self._ratings = reviews_df['rating'].to_numpy()
+        self._comments = reviews_df['comment'].to_numpy()
+        # Foreign key -> contiguous slice of the product's reviews
+        self._slices: Dict[str, slice] = {}
+        product_ids = reviews_df['product_id'].to_numpy()
+        starts = np.flatnonzero(np.r_[True, product_ids[1:] != product_ids[:-1]]) if len(product_ids) else np.empty(0, np.intp)
+        stops = np.r_[starts[1:], len(product_ids)].astype(np.intp)
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            self._slices[product_ids[start]] = slice(start, stop)
+
+        # Group number and position within its product of every review
+        groups = np.repeat(np.arange(len(starts)), stops - starts)
+        sequence = np.arange(len(product_ids)) - starts[groups] if len(product_ids) else np.empty(0, np.intp)
+        ratings = self._ratings.astype(np.int64, copy=False)
+        self._order: Dict[str, np.ndarray] = {}
+        self._keys: Dict[str, np.ndarray] = {}
+        for sort in REVIEW_SORT_OPTIONS:
+            keys = _sort_keys(ratings, sequence, sort)
+            order = np.lexsort((keys, groups))
+            self._order[sort], self._keys[sort] = order, keys[order]
+        # Reviews added in memory after loading (see with_reviews); this index sees the first _added_size of them
+        self._added = _Additions()
+        self._added_size = 0
+
+    def __len__(self) -> int:
+        return len(self._ratings) + self._added_size
+
+    def with_reviews(self, reviews: List[Tuple[str, Dict[str, Any]]]) -> "ReviewIndex":
+        """
+        Returns a new index with the given (product ID, review) pairs added as the most recent reviews of
+        their products. The pre-sorted arrays and the log of added reviews are shared, so adding a review takes
+        constant time; the index itself is left untouched, since it only sees the part of the log it was built with.
+        """
+        added = self._added
+        if added.size != self._added_size:
+            # Another index was already derived from this one: continue a copy of the log this index sees
+            added = added.prefix(self._added_size)
+        for product_id, review in reviews:
+            added.append(product_id, review)
+        index = copy.copy(self)
+        index._added, index._added_size = added, added.size
+        return index
+
+    def _reviews_at(self, rows: np.ndarray) -> List[Dict[str, Any]]:
+        """Returns the ready-to-serve form of the given rows."""
+        return [
+            {"author": author, "rating": rating, "comment": comment}
+            for author, rating, comment in zip(
+                self._authors[rows].tolist(), self._ratings[rows].tolist(), self._comments[rows].tolist()
+            )
+        ]
+
+    def _added_page(
+        self,
+        product_id: str,
+        base_count: int,
+        sort: str,
+        last_key: Optional[int],
+        wanted: Optional[int]
+    ) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Returns the (sort key, review) pairs of the reviews added to the product that follow last_key in the
+        given ordering, in that order, at most wanted of them. Within a rating, reviews are walked newest first.
+        """
+        product = self._added.products.get(product_id)
+        if product is None:
+            return []
+        # Reviews of the product this index sees
+        visible = bisect.bisect_left(product.log_positions, self._added_size)
+        pairs: List[Tuple[int, Dict[str, Any]]] = []
+        for rating in _RATING_ORDER[sort]:
+            positions = product.by_rating.get(rating, []) if rating is not None else range(len(product.reviews))
+            primary = _sort_primary(rating, sort) * _SEQUENCE_SPAN - base_count
+            # The key of the i-th added review is primary - i: those after the cursor have i < primary - last_key
+            stop = visible if last_key is None else max(0, min(visible, primary - last_key))
+            for j in range(bisect.bisect_left(positions, stop) - 1, -1, -1):
+                if wanted is not None and len(pairs) == wanted:
+                    return pairs
+                position = positions[j]
+                pairs.append((primary - position, product.reviews[position]))
+        return pairs
+
+    def page(
+        self,
+        product_id: str,
+        sort: str = "recent",
+        limit: Optional[int] = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Returns the product's reviews that follow the cursor in the given ordering, at most limit of them (all when
+        limit is None), plus the cursor of the next page (None on the last page). Cursors hold the sort key of the
+        last review returned, so pages stay stable while new reviews are added.
+        Raises InvalidCursorError if the cursor is malformed or was issued for another sort order.
+        """
+        if sort not in REVIEW_SORT_OPTIONS:
+            raise ValueError(f"Unsupported sort '{sort}'. Use one of: {', '.join(REVIEW_SORT_OPTIONS)}")
+        last_key = self._decode_cursor(cursor, sort) if cursor is not None else None
+        # One extra review tells whether there is a next page
+        wanted = None if limit is None else limit + 1
+
+        product_slice = self._slices.get(product_id, slice(0, 0))
+        keys = self._keys[sort][product_slice]
+        start = 0 if last_key is None else int(np.searchsorted(keys, last_key, side="right"))
+        stop = len(keys) if wanted is None else min(len(keys), start + wanted)
+        base_keys = keys[start:stop].tolist()
+        base_reviews = self._reviews_at(self._order[sort][product_slice][start:stop])
+
+        added = self._added_page(product_id, product_slice.stop - product_slice.start, sort, last_key, wanted)
+        if added:
+            merged = list(heapq.merge(zip(base_keys, base_reviews), added, key=lambda pair: pair[0]))[:wanted]
+            base_keys = [key for key, _ in merged]
+            base_reviews = [review for _, review in merged]
+
+        if limit is None or len(base_reviews) <= limit:
+            return base_reviews, None
+        return base_reviews[:limit], self._encode_cursor(sort, base_keys[limit - 1])
+
+    @staticmethod
+    def _encode_cursor(sort: str, key: int) -> str:
+        payload = json.dumps({"s": sort, "k": int(key)}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def _decode_cursor(cursor: str, sort: str) -> int:
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            cursor_sort, key = payload["s"], int(payload["k"])
+        except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+            raise InvalidCursorError("Malformed pagination cursor.")
+        if cursor_sort != sort:
+            raise InvalidCursorError("The pagination cursor was issued for a different sort order.")
+        return key
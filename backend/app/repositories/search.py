@@ -0,0 +1,465 @@
+import copy
+import math
+import re
+import unicodedata
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+
+from app.repositories.product_columns import SPECIFICATION_DTYPES, flatten_products, is_missing, specification_column
+
+# Fields indexed for full-text search and the weight of a term occurrence in each (BM25F-style: occurrences
+# are weighted and summed into a single term frequency per product)
+FIELD_WEIGHTS = {"title": 3.0, "brand": 2.0, "specifications": 1.0, "description": 1.0}
+# BM25 parameters: term frequency saturation and document length normalization
+K1 = 1.2
+B = 0.75
+# A prefix found in more products than this is broad: the ranked results and facets of a query made of that prefix
+# alone, which typeahead sends while the first word is typed, are computed once, when the index is built
+BROAD_POSTINGS = 20_000
+# Ranked results kept per broad prefix; deeper pages are computed per query
+PRECOMPUTED_RESULTS = 1_000
+# The delta of an updated index (see SearchIndex.with_rows) is indexed again on every update, so once it holds more
+# rows than the square root of twice the catalog size (and at least MIN_DELTA_ROWS) the whole index is rebuilt
+# instead. Indexing a row costs about the same in both, so that size balances indexing the delta on each update
+# against rebuilding once per that many updated rows: updates cost about the square root of the catalog size each,
+# however long the stream of updates goes on.
+MIN_DELTA_ROWS = 256
+
+# Frequent Spanish words that carry no meaning for search
+STOPWORDS = frozenset((
+    "a", "al", "con", "de", "del", "e", "el", "en", "es", "la", "las", "lo", "los", "o", "para", "por", "que",
+    "se", "su", "sus", "un", "una", "uno", "y"
+))
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+# Sorts after every character a token may contain, to find the end of the range of terms with a given prefix
+_PREFIX_END = "{"
+# Characters a term may start with, in sort order
+_INITIALS = "0123456789abcdefghijklmnopqrstuvwxyz"
+# Products whose offsets per initial are computed at once while building, to bound the memory taken
+_OFFSETS_CHUNK = 100_000
+_EMPTY = np.empty(0, dtype=np.intp)
+
+def fold(text: str) -> str:
+    """Lowercases the text and removes its accents and diacritics ("Cámara Acción Ñandú" -> "camara accion nandu")."""
+    # Decomposed, accented letters become the base letter plus combining marks, which the ASCII encoding drops
+    # along with any other non-ASCII character (none of which can be part of a term)
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+
+def tokenize(text: str) -> List[str]:
+    """Splits folded text into the terms the index holds, dropping stopwords."""
+    return [token for token in _TOKEN.findall(fold(text)) if token not in STOPWORDS]
+
+def _specification_text(value: Any) -> str:
+    if isinstance(value, dict):
+        return " ".join(_specification_text(item) for item in value.values())
+    if is_missing(value) or isinstance(value, (bool, np.bool_)):
+        return ""
+    return str(value)
+
+def _field_texts(products_df: pd.DataFrame) -> Dict[str, List[str]]:
+    products_df = flatten_products(products_df)
+
+    def column(name: str) -> List[str]:
+        if name not in products_df.columns:
+            return [""] * len(products_df)
+        return [value if isinstance(value, str) else "" for value in products_df[name]]
+
+    # Text of the attributes each product has, walking each attribute's column over the rows that have a value
+    specification_parts: List[List[str]] = [[] for _ in range(len(products_df))]
+    for name in SPECIFICATION_DTYPES:
+        if specification_column(name) not in products_df.columns:
+            continue
+        values = products_df[specification_column(name)]
+        present = np.flatnonzero(values.notna().to_numpy())
+        for row, value in zip(present.tolist(), values.to_numpy(dtype=object)[present].tolist()):
+            specification_parts[row].append(_specification_text(value))
+    specifications = [" ".join(parts) for parts in specification_parts]
+    return {
+        "title": column("title"),
+        "brand": column("brand"),
+        "description": column("description"),
+        "specifications": specifications,
+    }
+
+class _Postings:
+    """
+    BM25 impacts of a set of products, term-major: row t of the matrix holds, for every product containing term t,
+    the term's BM25 contribution to that product's score, so scoring a query sums a few rows. The same impacts are
+    also kept product-major, to check whether a few candidate products contain a term without reading its postings.
+    Terms are numbered in sorted order, so the terms sharing a prefix are a contiguous range of rows.
+    The corpus statistics (number of products, mean length, document frequencies) are those of the products
+    themselves, or those of `corpus` plus their own when the postings extend another set of products.
+    """
+    def __init__(self, products_df: pd.DataFrame, corpus: Optional["_Postings"] = None):
+        self.size = len(products_df)
+        fields = _field_texts(products_df)
+        matrices, vocabularies = [], []
+        for name, texts in fields.items():
+            vectorizer = CountVectorizer(tokenizer=tokenize, lowercase=False, token_pattern=None, dtype=np.float32)
+            try:
+                matrices.append(vectorizer.fit_transform(texts) * np.float32(FIELD_WEIGHTS[name]))
+                vocabularies.append(vectorizer.get_feature_names_out())
+            except ValueError:  # no term at all in this field
+                continue
+        self.terms = np.unique(np.concatenate(vocabularies)) if vocabularies else np.empty(0, dtype=object)
+        frequencies = sparse.csr_matrix((self.size, len(self.terms)), dtype=np.float32)
+        for matrix, vocabulary in zip(matrices, vocabularies):
+            matrix = matrix.tocoo()
+            columns = np.searchsorted(self.terms, vocabulary)[matrix.col]
+            frequencies = frequencies + sparse.csr_matrix(
+                (matrix.data, (matrix.row, columns)), shape=(self.size, len(self.terms))
+            )
+        frequencies = frequencies.tocsr()
+        frequencies.sort_indices()
+
+        lengths = np.asarray(frequencies.sum(axis=1)).ravel()
+        self.document_frequencies = np.diff(frequencies.tocsc().indptr)
+        if corpus is None:
+            self.n_products, self.total_length = self.size, float(lengths.sum())
+            document_frequencies = self.document_frequencies
+        else:
+            self.n_products = corpus.n_products + self.size
+            self.total_length = corpus.total_length + float(lengths.sum())
+            document_frequencies = self.document_frequencies + corpus.document_frequency(self.terms)
+        mean_length = self.total_length / max(self.n_products, 1) or 1.0
+        idf = np.log1p((self.n_products - document_frequencies + 0.5) / (document_frequencies + 0.5)).astype(np.float32)
+
+        tf = frequencies.data
+        row_lengths = np.repeat(lengths, np.diff(frequencies.indptr)).astype(np.float32)
+        impacts = idf[frequencies.indices] * tf * (K1 + 1) / (tf + K1 * (1 - B + B * row_lengths / mean_length))
+        self.by_product = sparse.csr_matrix(
+            (impacts.astype(np.float32), frequencies.indices, frequencies.indptr), shape=frequencies.shape
+        )
+        self.impacts = self.by_product.T.tocsr()
+        self.impacts.sort_indices()
+
+        # Initial of each term, and, per product, the offset in its row of the first term of each initial (and the
+        # row's length last), so a term is looked for among the few terms of the product sharing its initial
+        lookup = np.zeros(128, dtype=np.uint8)
+        lookup[np.frombuffer(_INITIALS.encode(), dtype=np.uint8)] = np.arange(len(_INITIALS))
+        self.term_initials = lookup[np.frombuffer("".join(term[0] for term in self.terms).encode(), dtype=np.uint8)]
+        longest = int(np.diff(self.by_product.indptr).max(initial=0))
+        self.initial_offsets = np.zeros((self.size, len(_INITIALS) + 1), dtype=np.uint16 if longest < 2 ** 16 else np.uint32)
+        for first in range(0, self.size, _OFFSETS_CHUNK):
+            indptr = self.by_product.indptr[first:first + _OFFSETS_CHUNK + 1]
+            rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+            keys = rows * (len(_INITIALS) + 1) + self.term_initials[self.by_product.indices[indptr[0]:indptr[-1]]] + 1
+            counts = np.bincount(keys, minlength=(len(indptr) - 1) * (len(_INITIALS) + 1))
+            self.initial_offsets[first:first + len(indptr) - 1] = counts.reshape(len(indptr) - 1, -1).cumsum(axis=1)
+
+    def document_frequency(self, terms: np.ndarray) -> np.ndarray:
+        """Returns the number of products containing each of the given terms (0 for unknown terms)."""
+        if not len(self.terms):
+            return np.zeros(len(terms), dtype=np.intp)
+        rows = np.minimum(np.searchsorted(self.terms, terms), len(self.terms) - 1)
+        return np.where(self.terms[rows] == terms, self.document_frequencies[rows], 0)
+
+    def term_range(self, token: str, prefix: bool) -> Tuple[int, int]:
+        """Returns the range of rows of the term, or of every term starting with it if prefix is set."""
+        if prefix:
+            start, stop = np.searchsorted(self.terms, [token, token + _PREFIX_END])
+            return int(start), int(stop)
+        start = int(np.searchsorted(self.terms, token))
+        return start, start + int(start < len(self.terms) and self.terms[start] == token)
+
+    def count(self, term_range: Tuple[int, int]) -> int:
+        """Returns the number of postings of a range of terms (an upper bound of the products containing any)."""
+        return int(self.impacts.indptr[term_range[1]] - self.impacts.indptr[term_range[0]])
+
+    def postings(self, term_range: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the products (in increasing order) containing any term of the range, and the terms' summed BM25
+        contribution to each.
+        """
+        start, stop = self.impacts.indptr[term_range[0]], self.impacts.indptr[term_range[1]]
+        products, impacts = self.impacts.indices[start:stop], self.impacts.data[start:stop]
+        if term_range[1] - term_range[0] <= 1:
+            return products, impacts
+        # Products containing several of the terms get the sum of their contributions. Few postings are merged
+        # by sorting them; many, by accumulating into a score per product, which avoids the sort.
+        if len(products) * 16 < self.size:
+            products, slots = np.unique(products, return_inverse=True)
+            return products, np.bincount(slots, weights=impacts).astype(np.float32)
+        scores = self.dense_scores(term_range)
+        products = np.flatnonzero(scores)
+        return products, scores[products].astype(np.float32)
+
+    def dense_scores(self, term_range: Tuple[int, int]) -> np.ndarray:
+        """Returns the summed BM25 contribution of the terms of the range to every product (0 if it has none)."""
+        start, stop = self.impacts.indptr[term_range[0]], self.impacts.indptr[term_range[1]]
+        return np.bincount(self.impacts.indices[start:stop], weights=self.impacts.data[start:stop], minlength=self.size)
+
+    def contains(self, candidates: np.ndarray, term_range: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns, for each candidate product, whether it contains a term of the range and the terms' summed BM25
+        contribution. Only the candidates' own terms sharing the range's initial (usually a handful, contiguous
+        in their row) are read, instead of the range's postings.
+        """
+        if term_range[0] == term_range[1]:
+            return np.zeros(len(candidates), dtype=bool), np.zeros(len(candidates), dtype=np.float32)
+        initial = int(self.term_initials[term_range[0]])
+        row_starts = self.by_product.indptr[candidates]
+        starts = row_starts + self.initial_offsets[candidates, initial]
+        lengths = self.initial_offsets[candidates, initial + 1] - self.initial_offsets[candidates, initial].astype(np.int64)
+        owners = np.repeat(np.arange(len(candidates)), lengths)
+        entries = np.arange(len(owners)) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        # A one-character prefix covers every term of its initial
+        if (term_range[0], term_range[1]) != tuple(np.searchsorted(self.term_initials, [initial, initial + 1])):
+            terms = self.by_product.indices[entries]
+            hits = (terms >= term_range[0]) & (terms < term_range[1])
+            owners, entries = owners[hits], entries[hits]
+        found = np.bincount(owners, minlength=len(candidates)) > 0
+        scores = np.bincount(owners, weights=self.by_product.data[entries], minlength=len(candidates))
+        return found, scores.astype(np.float32)
+
+    def match(self, tokens: List[str], prefix: bool) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the products (in increasing order) containing every token, the last one as a prefix if prefix
+        is set, and their BM25 scores.
+        """
+        ranges = [self.term_range(token, prefix and i == len(tokens) - 1) for i, token in enumerate(tokens)]
+        # Start from the rarest token so the candidates stay few, then check them against the other tokens
+        ranges.sort(key=self.count)
+        products, scores = self.postings(ranges[0])
+        for term_range in ranges[1:]:
+            if not len(products):
+                break
+            if len(products) * 8 < self.count(term_range):
+                # Cheaper to look for the token in the candidates' own terms than to read its postings
+                found, other_scores = self.contains(products, term_range)
+            elif len(products) * 64 > self.size:
+                # Many candidates: look them up in a dense score vector instead of searching the postings
+                other_scores = self.dense_scores(term_range)[products]
+                found = other_scores > 0
+            else:
+                other_products, impacts = self.postings(term_range)
+                slots = np.minimum(np.searchsorted(other_products, products), max(len(other_products) - 1, 0))
+                found = other_products[slots] == products if len(other_products) else np.zeros(len(products), dtype=bool)
+                other_scores = impacts[slots] if len(impacts) else np.zeros(len(products), dtype=np.float32)
+            products, scores = products[found], scores[found] + other_scores[found]
+        return products, scores
+
+class SearchResults(NamedTuple):
+    """Ranked page of a search, with the number of matches and their counts per category ID and brand."""
+    positions: np.ndarray
+    total: int
+    categories: Dict[int, int]
+    brands: Dict[str, int]
+
+class _Precomputed(NamedTuple):
+    """Best results of a broad prefix in the base postings, with the number of matches per category and brand code."""
+    term_range: Tuple[int, int]
+    positions: np.ndarray
+    scores: np.ndarray
+    total: int
+    category_totals: np.ndarray
+    brand_totals: np.ndarray
+
+class SearchIndex:
+    """
+    Inverted index for full-text search over the title, brand, description and specifications of the products,
+    with accent folding (queries and products match regardless of accents and case), prefix matching of the last
+    query term for typeahead, BM25 ranking and category and brand facet counts.
+    Built once per catalog snapshot, along with the answers of the broad one-word prefixes ("c", "ca", ...), whose
+    matches are a large part of the catalog. Updates (see with_rows) do not rebuild it: the updated rows are masked
+    out of the base postings and indexed again in a small delta, scored with the base corpus statistics, until the
+    delta grows too large (see MIN_DELTA_ROWS) and the index is built again from the current rows.
+    """
+    def __init__(self, products_df: pd.DataFrame):
+        self._base = _Postings(products_df)
+        self._stale: Optional[np.ndarray] = None
+        self._delta: Optional[_Postings] = None
+        self._delta_positions = _EMPTY
+        self._size = len(products_df)
+        # Facet values as small integer codes per row, counted with a bincount
+        self._category_codes: Dict[int, int] = {}
+        self._brand_codes: Dict[str, int] = {}
+        self._category_of = self._encode(products_df['category_id'].tolist(), self._category_codes)
+        brands = products_df['brand'].tolist() if 'brand' in products_df.columns else [None] * len(products_df)
+        self._brand_of = self._encode(brands, self._brand_codes)
+        # Codes of the rows as the base postings indexed them, to discount updated rows from precomputed facets
+        self._base_category_of, self._base_brand_of = self._category_of, self._brand_of
+        self._precomputed = self._precompute()
+
+    @staticmethod
+    def _encode(values: List[Any], codes: Dict[Any, int]) -> np.ndarray:
+        """Returns the code of each value, adding unseen values to codes (numbered from 1); missing values are coded 0."""
+        return np.array(
+            [0 if value is None or value != value else codes.setdefault(value, len(codes) + 1) for value in values],
+            dtype=np.int32
+        )
+
+    @staticmethod
+    def _totals(codes: np.ndarray, size: int) -> np.ndarray:
+        """Returns the number of occurrences of each code, the missing value's (0) included, for `size` known values."""
+        return np.bincount(codes, minlength=size + 1)
+
+    def _precompute(self) -> Dict[str, _Precomputed]:
+        """Computes the answers of the broad prefixes, from the shortest: prefixes of narrow ones are narrow too."""
+        precomputed = {}
+        terms = self._base.terms
+        prefixes = sorted({term[:1] for term in terms})
+        while prefixes:
+            longer = set()
+            for prefix in prefixes:
+                term_range = self._base.term_range(prefix, True)
+                if self._base.count(term_range) < BROAD_POSTINGS:
+                    continue
+                positions, scores = self._base.postings(term_range)
+                top = rank(positions, scores, PRECOMPUTED_RESULTS)
+                precomputed[prefix] = _Precomputed(
+                    term_range, top, scores[np.searchsorted(positions, top)], len(positions),
+                    self._totals(self._category_of[positions], len(self._category_codes)),
+                    self._totals(self._brand_of[positions], len(self._brand_codes))
+                )
+                longer.update(term[:len(prefix) + 1] for term in terms[term_range[0]:term_range[1]] if len(term) > len(prefix))
+            prefixes = sorted(longer)
+        return precomputed
+
+    def with_rows(self, products_df: pd.DataFrame, positions: np.ndarray) -> "SearchIndex":
+        """
+        Returns a new index reflecting the rows of products_df at the given positions, which replace the same rows
+        of the products the index was built from or are appended after its last row. The index is left untouched.
+        """
+        positions = np.asarray(positions, dtype=np.intp)
+        stale = np.zeros(len(products_df), dtype=bool)
+        if self._stale is not None:
+            stale[:len(self._stale)] = self._stale
+        stale[positions] = True
+        delta_positions = np.flatnonzero(stale)
+        if len(delta_positions) > max(MIN_DELTA_ROWS, math.isqrt(2 * len(products_df))):
+            return SearchIndex(products_df)
+
+        index = copy.copy(self)
+        index._size = len(products_df)
+        index._stale = stale
+        # Every row updated since the index was built is indexed again, in its current version
+        index._delta_positions = delta_positions
+        index._delta = _Postings(products_df.iloc[index._delta_positions], corpus=self._base)
+
+        index._category_codes, index._brand_codes = dict(self._category_codes), dict(self._brand_codes)
+        rows = products_df.iloc[positions]
+        index._category_of, index._brand_of = (
+            np.concatenate((values, np.zeros(index._size - len(values), dtype=values.dtype)))
+            for values in (self._category_of, self._brand_of)
+        )
+        index._category_of[positions] = self._encode(rows['category_id'].tolist(), index._category_codes)
+        brands = rows['brand'].tolist() if 'brand' in rows.columns else [None] * len(rows)
+        index._brand_of[positions] = self._encode(brands, index._brand_codes)
+        return index
+
+    def _tokens(self, query: str, prefix: bool) -> List[str]:
+        terms = _TOKEN.findall(fold(query))
+        tokens = [token for token in terms[:-1] if token not in STOPWORDS]
+        # The last term may be the start of a longer word being typed ("a" -> "apple"), so it is kept as a prefix
+        if terms and (prefix or terms[-1] not in STOPWORDS):
+            tokens.append(terms[-1])
+        return tokens
+
+    def match(self, query: str, prefix: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the row positions (in catalog order) of the products matching every term of the query, the last
+        one as a prefix if prefix is set, and their BM25 scores. Stopwords are ignored, except as that prefix.
+        A query with no indexable term matches nothing.
+        """
+        tokens = self._tokens(query, prefix)
+        if not tokens:
+            return _EMPTY, np.empty(0, dtype=np.float32)
+        positions, scores = self._base.match(tokens, prefix)
+        if self._delta is None:
+            return positions, scores
+        current = ~self._stale[positions]
+        delta_rows, delta_scores = self._delta.match(tokens, prefix)
+        positions = np.concatenate((positions[current], self._delta_positions[delta_rows]))
+        scores = np.concatenate((scores[current], delta_scores))
+        order = np.argsort(positions, kind="stable")
+        return positions[order], scores[order]
+
+    def facets(self, positions: np.ndarray) -> Tuple[Dict[int, int], Dict[str, int]]:
+        """Returns the number of the given products in each category (by ID) and of each brand, most frequent first."""
+        return (
+            self._facet_counts(self._category_codes, self._totals(self._category_of[positions], len(self._category_codes))),
+            self._facet_counts(self._brand_codes, self._totals(self._brand_of[positions], len(self._brand_codes)))
+        )
+
+    @staticmethod
+    def _facet_counts(codes: Dict[Any, int], totals: np.ndarray) -> Dict[Any, int]:
+        values, totals = list(codes), totals[1:]
+        return {values[code]: int(totals[code]) for code in np.argsort(-totals, kind="stable") if totals[code]}
+
+    def search(self, query: str, limit: Optional[int] = None, within: Optional[np.ndarray] = None) -> SearchResults:
+        """
+        Returns the first `limit` products matching the query (see match), best BM25 score first, restricted to
+        the sorted row positions `within` if given, with the total number of such products and the facet counts
+        of the query's matches (before the restriction to `within`).
+        """
+        tokens = self._tokens(query, True)
+        if len(tokens) == 1 and within is None and tokens[0] in self._precomputed:
+            results = self._from_precomputed(self._precomputed[tokens[0]], tokens[0], limit)
+            if results is not None:
+                return results
+        positions, scores = self.match(query)
+        categories, brands = self.facets(positions)
+        if within is not None:
+            matching = np.isin(positions, within, assume_unique=True)
+            positions, scores = positions[matching], scores[matching]
+        return SearchResults(rank(positions, scores, limit), len(positions), categories, brands)
+
+    def _from_precomputed(self, precomputed: _Precomputed, token: str, limit: Optional[int]) -> Optional[SearchResults]:
+        """
+        Answers a one-word prefix query from its precomputed results, corrected for the rows updated since the
+        index was built. Returns None when the precomputed results are too few for the requested page.
+        """
+        positions, scores = precomputed.positions, precomputed.scores
+        total, category_totals, brand_totals = precomputed.total, precomputed.category_totals, precomputed.brand_totals
+        truncated = precomputed.total > len(positions)
+        if self._delta is not None:
+            # Updated rows leave the base results (their old version is discounted from the counts)...
+            current = ~self._stale[positions]
+            positions, scores = positions[current], scores[current]
+            kept = len(positions)
+            stale = self._delta_positions[self._delta_positions < self._base.size]
+            found, _ = self._base.contains(stale, precomputed.term_range)
+            stale = stale[found]
+            # ...and are matched again in their current version
+            delta_rows, delta_scores = self._delta.match([token], True)
+            updated = self._delta_positions[delta_rows]
+            positions, scores = np.concatenate((positions, updated)), np.concatenate((scores, delta_scores))
+            total += len(updated) - len(stale)
+            categories, brands = len(self._category_codes), len(self._brand_codes)
+            category_totals = self._grown(category_totals, categories) - \
+                self._totals(self._base_category_of[stale], categories) + self._totals(self._category_of[updated], categories)
+            brand_totals = self._grown(brand_totals, brands) - \
+                self._totals(self._base_brand_of[stale], brands) + self._totals(self._brand_of[updated], brands)
+        else:
+            kept = len(positions)
+        # The best current base results are only known down to the kept ones
+        if total > kept and truncated and (limit is None or limit > kept):
+            return None
+        return SearchResults(
+            rank(positions, scores, limit), total,
+            self._facet_counts(self._category_codes, category_totals), self._facet_counts(self._brand_codes, brand_totals)
+        )
+
+    @staticmethod
+    def _grown(totals: np.ndarray, size: int) -> np.ndarray:
+        return np.concatenate((totals, np.zeros(size + 1 - len(totals), dtype=totals.dtype)))
+
+def rank(positions: np.ndarray, scores: np.ndarray, limit: Optional[int] = None) -> np.ndarray:
+    """
+    Returns the positions by decreasing score, ties broken by catalog order; only the first `limit` if given.
+    Broad typeahead queries match a large part of the catalog, so only the products that can make the cut are sorted.
+    """
+    if limit is not None and limit < len(positions):
+        if limit <= 0:
+            return _EMPTY
+        # Every product scoring at least the limit-th best score, ties included, so the tie-break stays exact
+        threshold = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+        candidates = scores >= threshold
+        positions, scores = positions[candidates], scores[candidates]
+    return positions[np.lexsort((positions, -scores))][:limit]
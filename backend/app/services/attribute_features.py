@@ -0,0 +1,205 @@
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from app.repositories.product_columns import PRICE_AMOUNT, flatten_products, is_missing, specification_column
+
+# Specification attributes compared as quantities. Values such as "8 GB" or "75 cm" are parsed into numbers,
+# log-scaled (quantities span orders of magnitude, e.g. 1 to 500 units per package) and min-max normalized
+# within the category, so the similarity of two values is 1 - (difference)^2, in [0, 1].
+NUMERIC_SPECIFICATIONS = (
+    "ram", "storage", "screen_size", "main_camera_resolution", "page_count", "units_per_package", "tip_size",
+    "dimensions.height", "dimensions.width", "dimensions.depth"
+)
+# Specification attributes compared by equality
+CATEGORICAL_SPECIFICATIONS = (
+    "color", "operating_system", "material", "style", "item_type", "size", "paper_type", "ink_color", "requires_assembly"
+)
+
+# Units converted to a common scale per kind of quantity (storage in GB, lengths in cm)
+_UNIT_FACTORS = {"tb": 1024.0, "gb": 1.0, "mb": 1 / 1024, "m": 100.0, "cm": 1.0, "mm": 0.1}
+_QUANTITY = re.compile(r"^\s*(\d+(?:[.,]\d+)?)\s*([a-zA-Z]*)")
+
+def parse_quantity(value: Any) -> Optional[float]:
+    """
+    Returns the number in a specification value ("256 GB" -> 256.0, "1 TB" -> 1024.0), or None if it has none.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return None if np.isnan(value) else float(value)
+    match = _QUANTITY.match(str(value))
+    if not match:
+        return None
+    number = float(match.group(1).replace(",", "."))
+    return number * _UNIT_FACTORS.get(match.group(2).lower(), 1.0)
+
+def _specification(products_df: pd.DataFrame, name: str) -> List[Any]:
+    """
+    Returns the value of a specification attribute for every product (None where it has none). Parts of free-form
+    attributes are named with a dot, e.g. "dimensions.height".
+    """
+    attribute, _, part = name.partition(".")
+    column = specification_column(attribute)
+    if column not in products_df.columns:
+        return [None] * len(products_df)
+    values = [None if is_missing(value) else value for value in products_df[column].tolist()]
+    if part:
+        values = [value.get(part) if isinstance(value, dict) else None for value in values]
+    return values
+
+def _min_max(values: np.ndarray, present: np.ndarray) -> tuple:
+    """Returns the minimum and the span of each column over the present values (a span of 1 if there is no range)."""
+    low = np.where(present, values, np.inf).min(axis=0)
+    high = np.where(present, values, -np.inf).max(axis=0)
+    low = np.where(np.isfinite(low), low, 0.0)
+    span = np.where(np.isfinite(high) & (high > low), high - low, 1.0)
+    return low, span
+
+class AttributeFeatures:
+    """
+    Encoded structured attributes of the products of a category: specifications, price, brand and the reputation
+    of the seller. Every similarity between two products is a bilinear form of their encodings (a sum of dot
+    products), so a whole block of products is scored with a few matrix products.
+    The encoder is fitted once, on the products of the category: the attributes it uses (those some product of the
+    category has), quantity ranges and categorical values are frozen, and products added later (see encode) are
+    encoded with them.
+    """
+    def __init__(self, products_df: pd.DataFrame, seller_reputations: Dict[str, float]):
+        products_df = flatten_products(products_df)
+        self._seller_reputations = seller_reputations
+        all_quantities = self._quantities(products_df)
+        # Quantities no product of the category has are left out
+        self._quantity_columns = np.flatnonzero((~np.isnan(all_quantities)).any(axis=0))
+        quantities = all_quantities[:, self._quantity_columns]
+        present = ~np.isnan(quantities)
+        self._quantity_low, self._quantity_span = _min_max(quantities, present)
+        price = self._log_prices(products_df)
+        self._price_low, self._price_span = (float(value[0]) for value in _min_max(price[:, None], np.ones((len(price), 1), dtype=bool)))
+
+        # One column per (attribute, value) seen in the category
+        self._category_columns: Dict[tuple, int] = {}
+        for name in CATEGORICAL_SPECIFICATIONS:
+            for value in _specification(products_df, name):
+                if value is not None:
+                    self._category_columns.setdefault((name, str(value)), len(self._category_columns))
+        self._category_attributes = tuple(dict.fromkeys(name for name, _ in self._category_columns))
+        brands = products_df['brand'] if 'brand' in products_df.columns else pd.Series([None] * len(products_df))
+        self._brand_codes: Dict[str, int] = {
+            brand: code for code, brand in enumerate(dict.fromkeys(brand for brand in brands if isinstance(brand, str)))
+        }
+
+        encoded = self._encode(products_df, all_quantities)
+        self.quantity_mask, self.quantities, self.categories, self.category_mask, self.prices, self.brands, self.reputations = encoded
+
+    @staticmethod
+    def _quantities(products_df: pd.DataFrame) -> np.ndarray:
+        columns = [[parse_quantity(value) for value in _specification(products_df, name)] for name in NUMERIC_SPECIFICATIONS]
+        quantities = np.array(columns, dtype=float).reshape(len(NUMERIC_SPECIFICATIONS), len(products_df)).T
+        return np.log1p(np.clip(quantities, 0, None))
+
+    @staticmethod
+    def _log_prices(products_df: pd.DataFrame) -> np.ndarray:
+        return np.log1p(products_df[PRICE_AMOUNT].to_numpy(dtype=float))
+
+    def encode(self, products_df: pd.DataFrame) -> tuple:
+        """
+        Encodes products with the fitted ranges and values. Returns, one row per product: the presence mask and
+        normalized values of the quantities, the one-hot matrix of categorical values and the presence mask of the
+        categorical attributes, the normalized price, the brand code (-1 if unknown) and the seller reputation.
+        """
+        products_df = flatten_products(products_df)
+        return self._encode(products_df, self._quantities(products_df))
+
+    def _encode(self, products_df: pd.DataFrame, all_quantities: np.ndarray) -> tuple:
+        n_products = len(products_df)
+        quantities = all_quantities[:, self._quantity_columns]
+        quantity_mask = (~np.isnan(quantities)).astype(float)
+        quantities = np.clip(np.nan_to_num((quantities - self._quantity_low) / self._quantity_span), 0.0, 1.0) * quantity_mask
+
+        rows: List[int] = []
+        columns: List[int] = []
+        category_mask = np.zeros((n_products, len(self._category_attributes)))
+        for attribute, name in enumerate(self._category_attributes):
+            for row, value in enumerate(_specification(products_df, name)):
+                if value is None:
+                    continue
+                category_mask[row, attribute] = 1.0
+                column = self._category_columns.get((name, str(value)))
+                # Values unseen when the category was fitted count as present but match nothing
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+        categories = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, columns)), shape=(n_products, len(self._category_columns))
+        )
+
+        prices = np.clip((self._log_prices(products_df) - self._price_low) / self._price_span, 0.0, 1.0)
+        brands = np.array(
+            [self._brand_codes.get(brand, -1) for brand in products_df.get('brand', pd.Series([None] * n_products))],
+            dtype=np.intp
+        )
+        reputations = np.array(
+            [self._seller_reputations.get(seller_id, 0.0) for seller_id in products_df['seller_id']], dtype=float
+        )
+        return quantity_mask, quantities, categories, category_mask, prices, brands, reputations
+
+    def with_rows(self, rows: np.ndarray, products_df: pd.DataFrame, size: int) -> "AttributeFeatures":
+        """
+        Returns a copy of the features resized to size products, with the given rows replaced by the encodings
+        of products_df (one product per row). The features themselves are left untouched.
+        """
+        features = object.__new__(AttributeFeatures)
+        features.__dict__.update(self.__dict__)
+        encoded = self.encode(products_df)
+        current = (
+            self.quantity_mask, self.quantities, self.categories, self.category_mask, self.prices, self.brands, self.reputations
+        )
+        updated = []
+        for values, new_values in zip(current, encoded):
+            if sparse.issparse(values):
+                keep = np.ones(size)
+                keep[rows] = 0
+                padded = sparse.vstack((values, sparse.csr_matrix((size - values.shape[0], values.shape[1])))).tocsr()
+                scatter = sparse.csr_matrix((np.ones(len(rows)), (rows, np.arange(len(rows)))), shape=(size, len(rows)))
+                updated.append((sparse.diags(keep) @ padded + scatter @ new_values).tocsr())
+            else:
+                padded = np.zeros((size,) + values.shape[1:], dtype=values.dtype)
+                padded[:len(values)] = values
+                padded[rows] = new_values
+                updated.append(padded)
+        features.quantity_mask, features.quantities, features.categories, features.category_mask, \
+            features.prices, features.brands, features.reputations = updated
+        return features
+
+    def specification_similarity(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Returns the similarity of the specifications of every product (rows of the result) to the given products
+        (columns): the mean, over the attributes both products have, of 1 - (difference)^2 for quantities and of
+        equality for categorical attributes. Products with no attribute in common have a similarity of 0.
+        """
+        mask, values = self.quantity_mask, self.quantities
+        squares = values * values
+        # Sum over shared quantities of 1 - (a - b)^2 = 1 - a^2 - b^2 + 2ab, as a single matrix product of stacked factors
+        left = np.hstack((mask, -squares, -mask, 2 * values))
+        right = np.hstack((mask[rows], mask[rows], squares[rows], values[rows]))
+        similarity = left @ right.T
+        similarity += self.categories @ self.categories[rows].T.toarray()
+        # Number of attributes both products have. Where there is none the sum above is 0 as well.
+        presence = np.hstack((mask, self.category_mask))
+        shared = presence @ presence[rows].T
+        similarity /= np.maximum(shared, 1.0, out=shared)
+        return similarity
+
+    def price_similarity(self, rows: np.ndarray) -> np.ndarray:
+        """Returns 1 - (difference of normalized log prices)^2 between every product and the given ones."""
+        similarity = np.subtract.outer(self.prices, self.prices[rows])
+        np.square(similarity, out=similarity)
+        return np.subtract(1.0, similarity, out=similarity)
+
+    def brand_similarity(self, rows: np.ndarray) -> np.ndarray:
+        """Returns 1 where a product has the same (known) brand as each of the given ones, 0 elsewhere."""
+        return ((self.brands[:, None] == self.brands[rows][None, :]) & (self.brands[:, None] >= 0)).astype(float)
@@ -0,0 +1,243 @@
+# Resized and WebP variants of the product images.
+#
+# Product records link the original images (e.g. /images/products/SMA001/1.jpg), some of them several hundred KB,
+# which listings would otherwise download to show as thumbnails. This module renders, for each original, a
+# thumbnail and a detail-size variant, each as WebP and JPEG, stored under the SHA-256 digest of the
+# original's content: /images/variants/<digest>/<variant>.<format>. A variant URL therefore never changes
+# content, so it is served with an immutable Cache-Control, and a replaced original gets new URLs.
+# URLs name the WebP file; clients that do not accept WebP (per their Accept header) are sent the JPEG one.
+# Variants are rendered in worker processes, only for originals not rendered yet, at startup or with:
+#
+#     python -m app.services.images build --source public/images --output public/variants --workers 4
+import argparse
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+
+logger = logging.getLogger(__name__)
+
+# Largest side, in pixels, of each variant. Smaller originals are not enlarged.
+VARIANT_SIZES = {"thumbnail": 400, "detail": 1200}
+# Encodings of each variant, with their Pillow save options. URLs point to the first one; the second is
+# served in its place to clients that do not accept it (see ImageVariantFiles).
+FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+SOURCE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+MANIFEST_FILE = "manifest.json"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def _digest(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(1 << 20), b""):
+            hasher.update(block)
+    return hasher.hexdigest()[:24]
+
+def _write_atomically(path: Path, write) -> None:
+    # Written next to the destination and renamed into place, so a reader (or another worker process rendering
+    # the same image) never sees a partial file
+    with tempfile.NamedTemporaryFile(dir=path.parent, suffix=path.suffix, delete=False) as temporary:
+        write(temporary)
+    # Temporary files are private to their owner; these are served
+    os.chmod(temporary.name, 0o644)
+    os.replace(temporary.name, path)
+
+def render_variants(source: Path, directory: Path) -> None:
+    """Renders every variant of the image at source, in every format, into directory."""
+    from PIL import Image, ImageOps
+
+    directory.mkdir(parents=True, exist_ok=True)
+    with Image.open(source) as original:
+        # Apply the camera orientation, which the encoders below would drop along with the EXIF data
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGB")
+        for variant, size in VARIANT_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+            for extension, options in FORMATS.items():
+                _write_atomically(directory / f"{variant}.{extension}", lambda file: resized.save(file, **options))
+
+def _render_task(task: Tuple[str, str]) -> Optional[str]:
+    source, directory = task
+    try:
+        render_variants(Path(source), Path(directory))
+    except Exception as e:  # an unreadable image keeps its original URL instead of failing the whole build
+        return f"{source}: {e}"
+    return None
+
+class ImageVariants:
+    """
+    Resolves the URL of an original image to the URL of one of its variants. Originals with no rendered
+    variants (e.g. linked by a product added after the last build) resolve to themselves.
+    """
+    def __init__(self, digests: Optional[Dict[str, str]] = None, url_prefix: str = "/images/variants"):
+        self._digests = digests or {}
+        self.url_prefix = url_prefix
+
+    def __len__(self) -> int:
+        return len(self._digests)
+
+    def url(self, original: str, variant: str) -> str:
+        digest = self._digests.get(original)
+        if digest is None:
+            return original
+        return f"{self.url_prefix}/{digest}/{variant}.{next(iter(FORMATS))}"
+
+class ImageService:
+    """
+    Renders the variants of the images under source_dir (linked as source_url_prefix/<relative path>) into
+    output_dir, served at url_prefix. A manifest in output_dir maps each original to its digest, with the size
+    and modification time it had, so later builds only hash and render the originals that changed.
+    """
+    def __init__(
+        self,
+        source_dir: Path,
+        output_dir: Path,
+        source_url_prefix: str = "/images",
+        url_prefix: str = "/images/variants",
+        workers: int = 1
+    ):
+        self.source_dir = source_dir
+        self.output_dir = output_dir
+        self.source_url_prefix = source_url_prefix
+        self.url_prefix = url_prefix
+        self.workers = workers
+        self._variants: Optional[ImageVariants] = None
+        self._manifest_signature: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.output_dir / MANIFEST_FILE
+
+    def _read_manifest(self) -> Dict[str, Dict]:
+        try:
+            return json.loads(self.manifest_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _sources(self) -> List[Path]:
+        output_dir = self.output_dir.resolve()
+        return sorted(
+            path for path in self.source_dir.rglob("*")
+            if path.suffix.lower() in SOURCE_SUFFIXES and output_dir not in path.resolve().parents
+        )
+
+    def build(self, workers: Optional[int] = None) -> ImageVariants:
+        """
+        Renders the variants of every original that does not have them yet, in up to `workers` processes,
+        writes the manifest and returns the resulting variants.
+        """
+        workers = self.workers if workers is None else workers
+        previous = self._read_manifest()
+        manifest: Dict[str, Dict] = {}
+        tasks = []
+        for source in self._sources():
+            stat = source.stat()
+            url = f"{self.source_url_prefix}/{source.relative_to(self.source_dir).as_posix()}"
+            entry = previous.get(url)
+            if entry is None or entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+                entry = {"digest": _digest(source), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            directory = self.output_dir / entry["digest"]
+            # Identical originals share their variants, rendered once
+            pending = str(directory) in {task[2] for task in tasks}
+            if not pending and not all(
+                (directory / f"{variant}.{extension}").exists() for variant in VARIANT_SIZES for extension in FORMATS
+            ):
+                tasks.append((url, str(source), str(directory)))
+            manifest[url] = entry
+
+        if tasks:
+            render_tasks = [(source, directory) for _, source, directory in tasks]
+            if workers > 1 and len(tasks) > 1:
+                with ProcessPoolExecutor(min(workers, len(tasks))) as pool:
+                    errors = list(pool.map(_render_task, render_tasks))
+            else:
+                errors = [_render_task(task) for task in render_tasks]
+            for (url, _, _), error in zip(tasks, errors):
+                if error is not None:
+                    logger.warning("Serving the original of %s: %s", url, error)
+                    manifest.pop(url)
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        _write_atomically(self.manifest_path, lambda file: file.write(json.dumps(manifest, indent=1).encode()))
+        logger.info("Image variants of %d originals ready (%d rendered)", len(manifest), len(tasks))
+        return self.variants()
+
+    def variants(self) -> ImageVariants:
+        """
+        Returns the variants listed in the manifest, reading it again only when it was rewritten
+        (e.g. by a build run from the command line).
+        """
+        try:
+            stat = self.manifest_path.stat()
+            signature = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            signature = None
+        with self._lock:
+            if self._variants is None or signature != self._manifest_signature:
+                digests = {url: entry["digest"] for url, entry in self._read_manifest().items()}
+                self._variants = ImageVariants(digests, self.url_prefix)
+                self._manifest_signature = signature
+            return self._variants
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    Static files whose URL changes whenever their content does (content-addressed), so clients and CDNs may
+    cache them for a year without revalidating. ETag and Last-Modified are still sent by StaticFiles.
+    """
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+class ImageVariantFiles(ImmutableStaticFiles):
+    """
+    Serves the image variants, negotiating their format: the WebP file their URLs name goes to the clients that
+    accept image/webp, and the JPEG rendering of the same variant to the others. Responses vary on Accept,
+    so shared caches keep both.
+    """
+    async def get_response(self, path: str, scope) -> Response:
+        preferred, fallback = FORMATS
+        if path.endswith(f".{preferred}") and not self._accepts(scope, f"image/{preferred}"):
+            path = f"{path[:-len(preferred)]}{fallback}"
+        response = await super().get_response(path, scope)
+        response.headers["Vary"] = "Accept"
+        return response
+
+    @staticmethod
+    def _accepts(scope, media_type: str) -> bool:
+        # Browsers that decode WebP name it explicitly; */* alone does not tell
+        accept = Headers(scope=scope).get("accept", "")
+        return media_type in {item.split(";")[0].strip() for item in accept.split(",")}
+
+def main() -> None:
+    from app.core.config import settings
+
+    parser = argparse.ArgumentParser(description="Render the resized and WebP variants of the product images.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    build = subcommands.add_parser("build", help="Render the variants of the images that do not have them yet")
+    build.add_argument("--source", type=Path, default=settings.IMAGES_PATH, help="Directory with the original images")
+    build.add_argument("--output", type=Path, default=settings.IMAGE_VARIANTS_PATH, help="Directory to write the variants to")
+    build.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes rendering images")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    variants = ImageService(args.source, args.output).build(workers=args.workers)
+    print(f"Variants of {len(variants)} images written to {args.output} in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# Offline precomputation of the recommendation neighbours of a whole catalog.
+#
+# Fitting the exact recommendation index ranks every product against every other product of its group, which is
+# quadratic in the size of the group (and of the whole catalog when recommending across categories). This job
+# does that work ahead of time, ranking blocks of rows in parallel worker processes, and writes the neighbour
+# tables of every group to a single .npz file. The backend loads the file at startup (RECOMMENDER_NEIGHBORS_PATH)
+# and then only fits the TF-IDF models, which is fast. Tables are tied to the scoring options they were computed
+# with and to the content of each group (a fingerprint of the IDs, texts and, when scored, attributes of its
+# products): a table whose group changed since, even with the same products, is ignored and computed again.
+# Build the file with:
+#
+#     python -m app.services.neighbor_tables build --data app/data --output app/data/neighbors.npz --workers 4
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.services.recommender import RecommendationIndex
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+
+# Rows ranked by each task sent to a worker process
+ROWS_PER_TASK = 2_000
+
+# Neighbour table of a group: product IDs (as strings), neighbour rows and their scores, n x top_k
+NeighborTable = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+# Group models of the running job. Worker processes are forked, so they inherit them instead of receiving copies.
+_job_groups: Dict[int, Any] = {}
+
+def _rank_block(task: Tuple[int, int, int]) -> Tuple[int, int, Tuple[np.ndarray, np.ndarray]]:
+    category_id, start, stop = task
+    group = _job_groups[category_id]
+    return category_id, start, group.rank_rows(np.arange(start, stop), group.top_k)
+
+def compute_neighbors(index: RecommendationIndex, workers: int = 1) -> Dict[int, NeighborTable]:
+    """
+    Returns the neighbour table of every group of the index, ranking blocks of ROWS_PER_TASK rows in up to
+    `workers` processes. Worker processes are forked (the group models are shared with them, not copied);
+    where fork is not available the rows are ranked in this process.
+    """
+    if index.approximate is not None:
+        raise ValueError("Neighbour tables are only precomputed for the exact recommendation backend.")
+    groups = {category_id: index.fit_group(category_id, rank=False) for category_id in index.groups()}
+    tasks = [
+        (category_id, start, min(start + ROWS_PER_TASK, len(group.ids)))
+        for category_id, group in groups.items()
+        for start in range(0, len(group.ids), ROWS_PER_TASK)
+    ]
+
+    def store(results) -> None:
+        for category_id, start, (neighbors, scores) in results:
+            group = groups[category_id]
+            group.neighbors[start:start + len(neighbors)] = neighbors
+            group.neighbor_scores[start:start + len(scores)] = scores
+
+    _job_groups.update(groups)
+    try:
+        if workers > 1 and "fork" in multiprocessing.get_all_start_methods():
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork")) as pool:
+                store(pool.map(_rank_block, tasks))
+        else:
+            store(map(_rank_block, tasks))
+    finally:
+        _job_groups.clear()
+    return {
+        category_id: (group.ids.astype(str), group.neighbors, group.neighbor_scores)
+        for category_id, group in groups.items()
+    }
+
+def table_options(index: RecommendationIndex) -> Dict[str, Any]:
+    """Returns the options a neighbour table depends on; a file is only used by an index with the same ones."""
+    return {
+        "format_version": FORMAT_VERSION,
+        "top_k": index.top_k,
+        "weights": asdict(index.weights),
+        "cross_category": index.cross_category,
+    }
+
+def table_metadata(index: RecommendationIndex) -> Dict[str, Any]:
+    """
+    Returns the metadata saved with the neighbour tables of the index: its options and the content fingerprint
+    of every group (see RecommendationIndex.group_fingerprint).
+    """
+    return {
+        **table_options(index),
+        "fingerprints": {str(category_id): index.group_fingerprint(category_id) for category_id in index.groups()},
+    }
+
+def save_neighbors(tables: Dict[int, NeighborTable], metadata: Dict[str, Any], path: Path) -> Path:
+    """
+    Writes the neighbour tables to an .npz file. The file is written next to its destination and renamed into
+    place, so a backend starting meanwhile never reads a partial file.
+    """
+    arrays = {"metadata": np.array(json.dumps(metadata))}
+    for category_id, (ids, neighbors, scores) in tables.items():
+        arrays[f"ids_{category_id}"] = ids
+        arrays[f"neighbors_{category_id}"] = neighbors
+        arrays[f"scores_{category_id}"] = scores
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, suffix=".npz", delete=False) as temporary:
+        np.savez(temporary, **arrays)
+    os.replace(temporary.name, path)
+    return path
+
+def load_neighbors(path: Path) -> Tuple[Dict[str, Any], Dict[int, NeighborTable]]:
+    """Reads a file written by save_neighbors, returning its metadata and tables."""
+    with np.load(path, allow_pickle=False) as data:
+        metadata = json.loads(str(data["metadata"]))
+        tables = {
+            int(name.removeprefix("ids_")): (
+                data[name], data[f"neighbors_{name.removeprefix('ids_')}"], data[f"scores_{name.removeprefix('ids_')}"]
+            )
+            for name in data.files if name.startswith("ids_")
+        }
+    return metadata, tables
+
+def attach_neighbors(index: RecommendationIndex, path: Path) -> bool:
+    """
+    Makes the index use the neighbour tables of the file, if they were computed with the same options,
+    for the groups whose content did not change since (same fingerprint).
+    Returns whether the file is used; an unreadable or mismatched file is logged and ignored.
+    """
+    try:
+        metadata, tables = load_neighbors(path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("Ignoring the precomputed neighbours in %s: %s", path, e)
+        return False
+    fingerprints = metadata.pop("fingerprints", {})
+    if metadata != table_options(index):
+        logger.warning("Ignoring the precomputed neighbours in %s: computed with other recommender options", path)
+        return False
+    groups = set(index.groups())
+    current = {
+        category_id: table
+        for category_id, table in tables.items()
+        if category_id in groups and fingerprints.get(str(category_id)) == index.group_fingerprint(category_id)
+    }
+    if len(current) < len(tables):
+        logger.info(
+            "%d of the %d neighbour tables in %s are out of date and will be computed again",
+            len(tables) - len(current), len(tables), path
+        )
+    index.use_neighbors(current)
+    return True
+
+def main() -> None:
+    # Imported here so that importing this module does not build the application's shared dependencies
+    from app.core.config import settings
+    from app.dependencies import recommender_options
+    from app.repositories.product_repository import ProductRepository
+
+    parser = argparse.ArgumentParser(description="Precompute the recommendation neighbours of the catalog.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    build = subcommands.add_parser("build", help="Compute the neighbour tables and write them to a file")
+    build.add_argument("--data", type=Path, default=settings.DATA_PATH, help="Directory with the catalog JSON files")
+    build.add_argument("--compiled", type=Path, default=None, help="Compiled catalog to read instead of the JSON files")
+    build.add_argument(
+        "--output", type=Path, default=settings.RECOMMENDER_NEIGHBORS_PATH or Path("app/data/neighbors.npz"),
+        help="File to write the neighbour tables to"
+    )
+    build.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes ranking rows")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.compiled is not None:
+        repository = ProductRepository.from_compiled(args.compiled, recommender_options=recommender_options)
+    else:
+        repository = ProductRepository(
+            args.data, chunk_size=settings.CATALOG_CHUNK_SIZE, recommender_options=recommender_options
+        )
+    index = repository.recommendation_index
+    tables = compute_neighbors(index, workers=args.workers)
+    output_path = save_neighbors(tables, table_metadata(index), args.output)
+    n_products = sum(len(ids) for ids, _, _ in tables.values())
+    print(
+        f"Neighbours of {n_products} products in {len(tables)} groups written to {output_path} "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+
+if __name__ == "__main__":
+    main()
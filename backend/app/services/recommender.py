@@ -1,7 +1,699 @@
+import copy
+import hashlib
+import threading
+from dataclasses import dataclass
+
+import numpy as np
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from typing import List
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from app.core.metrics import span
+from app.repositories.product_columns import (
+    PRICE_AMOUNT, PRICE_CURRENCY, SPECIFICATION_DTYPES, flatten_products, specification_column
+)
+from app.services.attribute_features import AttributeFeatures
+
+# Number of neighbours precomputed per product. Larger requests are scored on demand.
+DEFAULT_TOP_K = 10
+
+# Upper bound on the number of similarity scores held in memory while building the neighbour table
+_SCORE_BLOCK_SIZE = 4_000_000
+
+# Key of the single group of products compared with each other when recommending across categories
+_WHOLE_CATALOG = -1
+
+# Dimension of the dense random projection the IVF backend clusters products in
+_PROJECTION_DIM = 64
+# Iterations and sample size (per cluster) of the spherical k-means that trains the IVF clusters
+_KMEANS_ITERATIONS = 10
+_KMEANS_SAMPLES_PER_LIST = 64
+
+# Term counter for titles and descriptions. It is stateless (terms are hashed instead of looked up in a
+# fitted vocabulary), so documents can be counted chunk by chunk as the catalog is read, and the counts
+# of a category are just the rows of its products. Same tokenization as TfidfVectorizer(stop_words='english').
+_term_counter = HashingVectorizer(stop_words='english', alternate_sign=False, norm=None)
+
+@dataclass(frozen=True)
+class ScoringWeights:
+    """
+    Weights of the components of the similarity between two products of a category, each in [0, 1]:
+    TF-IDF cosine of title and description, similarity of the specifications, closeness of the (log) prices,
+    same brand, and the reputation of the candidate's seller (a prior favouring reputable sellers).
+    Scores are the weighted mean of the components. The defaults rank by text only.
+    """
+    text: float = 1.0
+    specifications: float = 0.0
+    price: float = 0.0
+    brand: float = 0.0
+    seller_reputation: float = 0.0
+
+    @property
+    def total(self) -> float:
+        return self.text + self.specifications + self.price + self.brand + self.seller_reputation
+
+    @property
+    def uses_attributes(self) -> bool:
+        """Whether any component other than the text has weight, i.e. whether attribute features are needed."""
+        return any((self.specifications, self.price, self.brand, self.seller_reputation))
+
+@dataclass(frozen=True)
+class ApproximateSearch:
+    """
+    Options of the approximate (IVF) recommendation backend. n_lists is the number of clusters products are
+    partitioned into (the square root of the group size by default) and n_probe the number of clusters
+    scanned per query: more probes give a higher recall at the cost of latency, and probing every cluster
+    is exact.
+    """
+    n_lists: Optional[int] = None
+    n_probe: int = 8
+
+@dataclass(frozen=True)
+class RecommenderOptions:
+    """
+    Configuration of the recommendation index of a catalog snapshot: how products are scored, whether the exact
+    or the approximate backend is used, and whether products are compared across categories.
+    """
+    weights: ScoringWeights = ScoringWeights()
+    approximate: Optional[ApproximateSearch] = None
+    cross_category: bool = False
+
+def product_term_counts(products_df: pd.DataFrame) -> sparse.csr_matrix:
+    """
+    Returns the sparse matrix of term counts of the title and description of each product, one row per product.
+    """
+    if products_df.empty:
+        return sparse.csr_matrix((0, _term_counter.n_features))
+    combined_features = products_df['title'] + ' ' + products_df.get('description', '')
+    return _term_counter.transform(combined_features.fillna(''))
+
+def top_n_indices(scores: np.ndarray, top_n: int) -> np.ndarray:
+    """
+    Returns the positions of the top_n highest scores, best first, in O(len(scores)).
+    Uses np.argpartition instead of a full sort. Ties are broken by position (catalog order),
+    including ties at the cut-off, so the result does not depend on the partitioning.
+    Positions scored -inf are never returned.
+    """
+    top_n = min(top_n, int(np.count_nonzero(scores != -np.inf)))
+    if top_n <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    # Score of the top_n-th best candidate
+    threshold = scores[np.argpartition(-scores, top_n - 1)[top_n - 1]]
+
+    above = np.flatnonzero(scores > threshold)
+    tied = np.flatnonzero(scores == threshold)[:top_n - len(above)]
+    # Order the winners by descending score, then by position
+    above = above[np.lexsort((above, -scores[above]))]
+    return np.concatenate((above, tied))
+
+class _ProductRows:
+    """
+    Product IDs of a group of products and their L2-normalized TF-IDF rows (so a dot product is the cosine
+    similarity), with the bookkeeping shared by the indexes built on them. Rows are never reordered or deleted
+    (removed products are only excluded from the results), so row positions stay valid across updates.
+    """
+    def __init__(self, ids: np.ndarray, term_counts: sparse.csr_matrix):
+        self.ids = ids
+        self.positions = {product_id: i for i, product_id in enumerate(self.ids)}
+        # Integer codes make excluding a product by ID a cheap vectorized comparison
+        self._id_codes, _ = pd.factorize(self.ids)
+        # Rows of removed products, never recommended
+        self._removed = np.empty(0, dtype=np.intp)
+
+        # Only the hashed terms that occur in the group are kept as columns.
+        # TfidfTransformer L2-normalizes each row by default, so cosine similarity is a plain dot product.
+        term_counts = sparse.csr_matrix(term_counts)
+        self._terms = np.unique(term_counts.indices)
+        self._transformer = TfidfTransformer()
+        self.tfidf_matrix = self._transformer.fit_transform(term_counts[:, self._terms]).tocsr()
+
+    def _with_rows(self, upserted_ids: List[str], term_counts: sparse.csr_matrix, removed_ids: Iterable[str]) -> tuple:
+        """
+        Returns a shallow copy with the given products inserted or replaced (one row of term_counts each) and
+        removed_ids removed, together with the rows of the upserted and of the removed products.
+        Changed products are vectorized with the fitted vocabulary and IDF weights; removed ones get an empty row.
+        """
+        index = copy.copy(self)
+        appended = [product_id for product_id in dict.fromkeys(upserted_ids) if product_id not in self.positions]
+        n_old = len(self.ids)
+        n_products = n_old + len(appended)
+        index.ids = np.concatenate((self.ids, np.array(appended, dtype=object)))
+        index.positions = dict(self.positions)
+        index.positions.update(zip(appended, range(n_old, n_products)))
+        index._id_codes = np.concatenate((self._id_codes, self._id_codes.max(initial=-1) + 1 + np.arange(len(appended))))
+
+        upserted = np.array([index.positions[product_id] for product_id in upserted_ids], dtype=np.intp)
+        removed = np.array([self.positions[product_id] for product_id in removed_ids if product_id in self.positions], dtype=np.intp)
+        removed = np.setdiff1d(removed, upserted)
+        index._removed = np.union1d(np.setdiff1d(self._removed, upserted), removed).astype(np.intp)
+
+        n_terms = self.tfidf_matrix.shape[1]
+        padded = sparse.vstack((self.tfidf_matrix, sparse.csr_matrix((len(appended), n_terms)))).tocsr()
+        keep = np.ones(n_products)
+        keep[np.union1d(upserted, removed)] = 0
+        scatter = sparse.csr_matrix(
+            (np.ones(len(upserted)), (upserted, np.arange(len(upserted)))), shape=(n_products, len(upserted))
+        )
+        new_rows = sparse.csr_matrix((0, n_terms))
+        if len(upserted):
+            new_rows = self._transformer.transform(sparse.csr_matrix(term_counts)[:, self._terms])
+        index.tfidf_matrix = (sparse.diags(keep) @ padded + scatter @ new_rows).tocsr()
+        return index, upserted, removed
+
+class _CategoryIndex(_ProductRows):
+    """
+    Exact recommendation data for the products of a single category (or of the whole catalog).
+    Holds the product IDs, their L2-normalized TF-IDF rows (so a dot product is the cosine similarity),
+    their encoded attributes when the weights use them, and the precomputed table of the top-K most similar
+    products for each row, with their scores. A fitted category is updated incrementally by with_changes():
+    rows are never reordered or deleted (removed products are only excluded from the results), so the neighbour
+    table stays valid.
+    """
+    def __init__(
+        self,
+        ids: np.ndarray,
+        term_counts: sparse.csr_matrix,
+        top_k: int,
+        weights: ScoringWeights = ScoringWeights(),
+        features: Optional[AttributeFeatures] = None,
+        neighbors: Optional[Tuple[np.ndarray, np.ndarray]] = None
+    ):
+        """
+        features (the encoded attributes of the products, row by row) are required when the weights use attributes.
+        neighbors, when given, is the neighbour table (rows and scores, n x top_k) computed beforehand for these
+        products and weights, e.g. by app.services.neighbor_tables; otherwise it is computed here.
+        """
+        super().__init__(ids, term_counts)
+        self.top_k = top_k
+        self.weights = weights
+        self.features = features if weights.uses_attributes else None
+
+        # Rank neighbours once, at build time
+        if neighbors is None:
+            neighbors = self.rank_rows(np.arange(len(ids)), top_k)
+        self.neighbors, self.neighbor_scores = neighbors
+
+    def _similarity(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Returns the symmetric part of the score of every product (rows of the result) against the given rows
+        (columns): the weighted sum of the text and attribute similarities, for a whole block at once.
+        """
+        # Sparse x dense product: much faster than sparse x sparse when most pairs share some term
+        similarity = np.asarray(self.tfidf_matrix @ self.tfidf_matrix[rows].T.toarray())
+        if self.features is None:
+            return similarity
+        weights = self.weights
+        similarity *= weights.text
+        if weights.specifications:
+            similarity += weights.specifications * self.features.specification_similarity(rows)
+        if weights.price:
+            similarity += weights.price * self.features.price_similarity(rows)
+        if weights.brand:
+            similarity += weights.brand * self.features.brand_similarity(rows)
+        return similarity
+
+    def _scores(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Returns the score of every product as a recommendation for each of the given rows (one column per row).
+        """
+        scores = self._similarity(rows)
+        if self.features is None:
+            return scores
+        if self.weights.seller_reputation:
+            # The prior is that of the candidate, the products along the rows
+            scores += self.weights.seller_reputation * self.features.reputations[:, None]
+        return scores / self.weights.total
+
+    def _rank(self, local_idx: int, scores: np.ndarray, top_n: int) -> np.ndarray:
+        # Exclude the reference product by ID: with tied scores it is not necessarily ranked first
+        scores[self._id_codes == self._id_codes[local_idx]] = -np.inf
+        scores[self._removed] = -np.inf
+        return top_n_indices(scores, top_n)
+
+    def rank_rows(self, rows: np.ndarray, top_n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the top_n neighbours of each of the given rows and their scores (-1 and -inf past the last one).
+        Rows are scored together, in blocks so that memory stays bounded instead of materializing
+        the full n x n similarity matrix.
+        """
+        n_products, n_terms = self.tfidf_matrix.shape
+        block_rows = max(1, _SCORE_BLOCK_SIZE // max(n_products, n_terms))
+        neighbors = np.full((len(rows), top_n), -1, dtype=np.intp)
+        neighbor_scores = np.full((len(rows), top_n), -np.inf)
+        for start in range(0, len(rows), block_rows):
+            block_idx = rows[start:start + block_rows]
+            block = self._scores(block_idx).T
+            for offset, (local_idx, scores) in enumerate(zip(block_idx.tolist(), block)):
+                top = self._rank(local_idx, scores, top_n)
+                neighbors[start + offset, :len(top)] = top
+                neighbor_scores[start + offset, :len(top)] = scores[top]
+        return neighbors, neighbor_scores
+
+    def _score_row(self, local_idx: int) -> np.ndarray:
+        # Score only the query row: a one-column block instead of the full similarity matrix
+        return self._scores(np.array([local_idx]))[:, 0]
+
+    def with_changes(
+        self,
+        upserted_df: pd.DataFrame,
+        term_counts: sparse.csr_matrix,
+        removed_ids: Iterable[str] = ()
+    ) -> "_CategoryIndex":
+        """
+        Returns a copy of the index with the products of upserted_df inserted or replaced (one row of term_counts
+        each) and removed_ids removed, leaving this index untouched.
+        Changed products are vectorized with the fitted vocabulary and IDF weights, and their attributes encoded
+        with the fitted ranges and values (terms and values new to the category are ignored until it is fitted
+        again, on the next catalog load). Only the neighbour lists that contained a
+        changed product are scored again; every other list just merges the changed products in, which is exact
+        because the rest of its scores did not change.
+        """
+        index, upserted, removed = self._with_rows(upserted_df['id'].tolist(), term_counts, removed_ids)
+        changed = np.union1d(upserted, removed)
+        n_products = len(index.ids)
+        n_appended = n_products - len(self.ids)
+        if self.features is not None:
+            index.features = self.features.with_rows(upserted, upserted_df, n_products)
+
+        index.neighbors = np.vstack((self.neighbors, np.full((n_appended, self.top_k), -1, dtype=np.intp)))
+        index.neighbor_scores = np.vstack((self.neighbor_scores, np.full((n_appended, self.top_k), -np.inf)))
+        index.neighbors[removed] = -1
+        index.neighbor_scores[removed] = -np.inf
+
+        # Lists that contained a changed product, and the lists of the upserted products, are recomputed
+        rescored = np.union1d(np.flatnonzero(np.isin(index.neighbors, changed).any(axis=1)), upserted)
+        rescored = np.setdiff1d(rescored, index._removed)
+        merged = np.ones(n_products, dtype=bool)
+        merged[rescored] = False
+        merged[index._removed] = False
+
+        if len(upserted):
+            # Similarity of every product to the upserted ones, merged into the lists they can enter
+            candidates = index._similarity(upserted)
+            if index.features is not None:
+                # Here the candidates are the upserted products, along the columns
+                candidates += index.weights.seller_reputation * index.features.reputations[upserted][None, :]
+                candidates /= index.weights.total
+            candidates[index._id_codes[:, None] == index._id_codes[upserted][None, :]] = -np.inf
+            last_scores, last_neighbors = index.neighbor_scores[:, -1:], index.neighbors[:, -1:]
+            enters = (
+                (candidates > last_scores)
+                | ((candidates == last_scores) & (upserted[None, :] < last_neighbors))
+                | ((last_neighbors < 0) & (candidates > -np.inf))
+            )
+            rows = np.flatnonzero(enters.any(axis=1) & merged)
+            if len(rows):
+                candidate_ids = np.hstack((index.neighbors[rows], np.broadcast_to(upserted, (len(rows), len(upserted)))))
+                candidate_scores = np.hstack((index.neighbor_scores[rows], candidates[rows]))
+                candidate_scores[candidate_ids < 0] = -np.inf
+                # Best first, ties broken by position, as in top_n_indices
+                order = np.lexsort((candidate_ids, -candidate_scores), axis=-1)[:, :self.top_k]
+                top_ids = np.take_along_axis(candidate_ids, order, axis=1)
+                top_scores = np.take_along_axis(candidate_scores, order, axis=1)
+                top_ids[top_scores == -np.inf] = -1
+                index.neighbors[rows] = top_ids
+                index.neighbor_scores[rows] = top_scores
+
+        index.neighbors[rescored], index.neighbor_scores[rescored] = index.rank_rows(rescored, self.top_k)
+        return index
+
+    def recommend(self, product_id: str, top_n: int) -> List[str]:
+        local_idx = self.positions[product_id]
+        if top_n <= self.top_k:
+            neighbors = self.neighbors[local_idx, :top_n]
+            neighbors = neighbors[neighbors >= 0]
+        else:
+            neighbors = self._rank(local_idx, self._score_row(local_idx), top_n)
+        return self.ids[neighbors].tolist()
+
+    def recommend_many(self, product_ids: List[str], top_n: int) -> List[List[str]]:
+        """
+        Returns the recommendations of several products: a slice of the neighbour table when top_n fits in it,
+        otherwise every product scored in a single block.
+        """
+        rows = np.array([self.positions[product_id] for product_id in product_ids], dtype=np.intp)
+        if top_n <= self.top_k:
+            neighbors = self.neighbors[rows, :top_n]
+        else:
+            neighbors, _ = self.rank_rows(rows, top_n)
+        return [self.ids[row[row >= 0]].tolist() for row in neighbors]
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+def _spherical_kmeans(vectors: np.ndarray, n_clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Returns n_clusters unit centroids of the unit rows of vectors, clustering by cosine similarity.
+    Trained on a random sample of the rows; a cluster that ends up empty keeps its previous centroid.
+    """
+    sample_size = min(len(vectors), n_clusters * _KMEANS_SAMPLES_PER_LIST)
+    sample = vectors[rng.choice(len(vectors), size=sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, size=n_clusters, replace=False)]
+    for _ in range(_KMEANS_ITERATIONS):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        filled = np.linalg.norm(sums, axis=1) > 0
+        centroids[filled] = _normalize_rows(sums[filled])
+    return centroids
+
+class _ApproximateIndex(_ProductRows):
+    """
+    Inverted-file (IVF) index over the TF-IDF rows of a group of products, for groups too large for the exact
+    neighbour table (whose build is quadratic in the group size).
+    Rows are mapped to a small dense space by a random Gaussian projection, which approximately preserves cosine
+    similarity, and partitioned with spherical k-means into inverted lists of row positions. A query scores
+    exactly, on the TF-IDF rows, only the products of the n_probe lists whose centroids are closest to it, so
+    its cost is about n_probe / n_lists of a full scan. Products are ranked by text similarity only.
+    Updated by with_changes() like _CategoryIndex: changed rows move to the list of their new nearest centroid,
+    and centroids stay fixed until the group is fitted again.
+    """
+    def __init__(self, ids: np.ndarray, term_counts: sparse.csr_matrix, options: ApproximateSearch, seed: int = 0):
+        super().__init__(ids, term_counts)
+        n_products, n_terms = self.tfidf_matrix.shape
+        self.n_lists = max(1, min(n_products, options.n_lists or int(round(np.sqrt(n_products)))))
+        self.n_probe = max(1, min(self.n_lists, options.n_probe))
+        rng = np.random.default_rng(seed)
+        self._projection = rng.standard_normal((n_terms, _PROJECTION_DIM)).astype(np.float32)
+
+        projected = self._project(self.tfidf_matrix)
+        self.centroids = _spherical_kmeans(projected, self.n_lists, rng)
+        self._list_of = self._assign(projected)
+        order = np.argsort(self._list_of, kind='stable')
+        bounds = np.searchsorted(self._list_of[order], np.arange(1, self.n_lists))
+        # Row positions of each list, sorted so that ties are broken by catalog order as in the exact index
+        self._lists: List[np.ndarray] = np.split(order, bounds)
+
+    def _project(self, tfidf_rows: sparse.csr_matrix) -> np.ndarray:
+        return _normalize_rows(np.asarray(tfidf_rows @ self._projection))
+
+    def _assign(self, projected: np.ndarray) -> np.ndarray:
+        """Returns the list (nearest centroid) of each projected row, scoring rows in bounded blocks."""
+        block_rows = max(1, _SCORE_BLOCK_SIZE // self.n_lists)
+        return np.concatenate([
+            np.argmax(projected[start:start + block_rows] @ self.centroids.T, axis=1)
+            for start in range(0, len(projected), block_rows)
+        ]).astype(np.intp) if len(projected) else np.empty(0, dtype=np.intp)
+
+    def with_changes(
+        self,
+        upserted_df: pd.DataFrame,
+        term_counts: sparse.csr_matrix,
+        removed_ids: Iterable[str] = ()
+    ) -> "_ApproximateIndex":
+        """
+        Returns a copy of the index with the products of upserted_df inserted or replaced (one row of term_counts
+        each) and removed_ids removed, leaving this index untouched. Only the lists that gain or lose a product
+        are copied.
+        """
+        index, upserted, removed = self._with_rows(upserted_df['id'].tolist(), term_counts, removed_ids)
+        n_appended = len(index.ids) - len(self.ids)
+        changed = np.union1d(upserted, removed)
+        old_lists = self._list_of[changed[changed < len(self._list_of)]]
+
+        index._list_of = np.concatenate((self._list_of, np.full(n_appended, -1, dtype=np.intp)))
+        index._list_of[removed] = -1
+        if len(upserted):
+            index._list_of[upserted] = index._assign(index._project(index.tfidf_matrix[upserted]))
+        index._lists = list(self._lists)
+        for list_idx in np.union1d(old_lists, index._list_of[upserted]).tolist():
+            if list_idx < 0:
+                continue
+            members = np.setdiff1d(self._lists[list_idx], changed)
+            index._lists[list_idx] = np.union1d(members, upserted[index._list_of[upserted] == list_idx])
+        return index
+
+    def search(self, rows: np.ndarray, top_n: int, n_probe: Optional[int] = None) -> List[np.ndarray]:
+        """
+        Returns, for each of the given rows, the rows of the top_n products most similar to it, best first,
+        scanning the n_probe lists closest to it (the index's default when None). The lists to probe are
+        found for all the rows with a single product against the centroids.
+        """
+        queries = self.tfidf_matrix[rows]
+        list_scores = self._project(queries) @ self.centroids.T
+        results = []
+        for local_idx, query, centroid_scores in zip(rows.tolist(), queries, list_scores):
+            probes = top_n_indices(centroid_scores, n_probe or self.n_probe)
+            candidates = np.sort(np.concatenate([self._lists[list_idx] for list_idx in probes.tolist()]))
+            scores = np.asarray(self.tfidf_matrix[candidates] @ query.toarray().ravel())
+            scores[self._id_codes[candidates] == self._id_codes[local_idx]] = -np.inf
+            results.append(candidates[top_n_indices(scores, top_n)])
+        return results
+
+    def recommend(self, product_id: str, top_n: int, n_probe: Optional[int] = None) -> List[str]:
+        return self.recommend_many([product_id], top_n, n_probe)[0]
+
+    def recommend_many(self, product_ids: List[str], top_n: int, n_probe: Optional[int] = None) -> List[List[str]]:
+        rows = np.array([self.positions[product_id] for product_id in product_ids], dtype=np.intp)
+        return [self.ids[neighbors].tolist() for neighbors in self.search(rows, top_n, n_probe)]
+
+class RecommendationIndex:
+    """
+    Content-based recommendation index built once per catalog snapshot.
+    Products are grouped by category (or all together, with cross_category) and, within each group, compared by
+    the TF-IDF similarity of their title and description, combined according to the scoring weights with the
+    similarity of their specifications, prices and brands and the reputation of their sellers. Each group is
+    fitted once, on first use or all together by warm(), which the catalog provider calls before publishing a
+    snapshot so that no scikit-learn work happens on the request path.
+    By default each group precomputes the exact top-K neighbours of every product; with approximate search
+    options it is an IVF index queried per request instead, which scales to much larger groups.
+    """
+    def __init__(
+        self,
+        products_df: pd.DataFrame,
+        top_k: int = DEFAULT_TOP_K,
+        term_counts: Optional[sparse.csr_matrix] = None,
+        category_positions: Optional[Dict[int, np.ndarray]] = None,
+        weights: ScoringWeights = ScoringWeights(),
+        seller_reputations: Optional[Dict[str, float]] = None,
+        approximate: Optional[ApproximateSearch] = None,
+        cross_category: bool = False
+    ):
+        """
+        term_counts and category_positions, when given, must be aligned with the rows of products_df
+        (see CatalogIngestion); otherwise they are computed from products_df.
+        seller_reputations maps seller IDs to their reputation score, on any scale.
+        """
+        self.top_k = top_k
+        self.weights = weights
+        self.approximate = approximate
+        self.cross_category = cross_category
+        # Reputations min-max normalized across sellers, so the prior is in [0, 1]
+        seller_reputations = seller_reputations or {}
+        low, high = min(seller_reputations.values(), default=0.0), max(seller_reputations.values(), default=0.0)
+        self._seller_reputations: Dict[str, float] = {
+            seller_id: (score - low) / (high - low) if high > low else 1.0
+            for seller_id, score in seller_reputations.items()
+        }
+        # Attributes are read from the flat columns of the products (see app.repositories.product_columns)
+        self._products_df = flatten_products(products_df)
+        self._term_counts = term_counts
+        self._categories: Dict[int, Union[_CategoryIndex, _ApproximateIndex]] = {}
+        self._lock = threading.Lock()
+
+        if cross_category:
+            category_positions = {_WHOLE_CATALOG: np.arange(len(products_df))}
+        elif category_positions is None:
+            category_positions = products_df.groupby('category_id', sort=False).indices
+        # Row positions of the products of each group (category).
+        # If there are fewer than two products, no recommendations can be made.
+        self._category_positions: Dict[int, np.ndarray] = {
+            category_id: positions
+            for category_id, positions in category_positions.items()
+            if len(positions) >= 2
+        }
+        self._product_categories: Dict[str, int] = dict(zip(products_df['id'], self._groups(products_df['category_id'])))
+        # Categories whose rows in term_counts are out of date; their term counts are recomputed from the text
+        self._stale_term_counts: frozenset = frozenset()
+        # Neighbour tables computed offline (see use_neighbors), per group: product IDs, neighbours and scores
+        self._precomputed: Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def _groups(self, category_ids: Iterable[Optional[int]]) -> List[Optional[int]]:
+        """Returns the group of products of each category: the category itself, or the whole catalog."""
+        if not self.cross_category:
+            return list(category_ids)
+        return [None if category_id is None else _WHOLE_CATALOG for category_id in category_ids]
+
+    def _category(self, category_id: int) -> Union[_CategoryIndex, _ApproximateIndex]:
+        category_index = self._categories.get(category_id)
+        if category_index is None:
+            with self._lock:
+                category_index = self._categories.get(category_id)
+                if category_index is None:
+                    with span("recommender.fit"):
+                        category_index = self.fit_group(category_id)
+                    self._categories[category_id] = category_index
+        return category_index
+
+    def fit_group(self, category_id: int, rank: bool = True) -> Union[_CategoryIndex, _ApproximateIndex]:
+        """
+        Fits the model of a group of products, without caching it (see _category).
+        With rank=False the exact backend leaves the neighbour table empty, for callers that rank the rows
+        themselves with rank_rows() (see app.services.neighbor_tables).
+        """
+        positions = self._category_positions[category_id]
+        ids = self._products_df['id'].to_numpy()[positions]
+        term_counts = self.group_term_counts(category_id)
+        if self.approximate is not None:
+            return _ApproximateIndex(ids, term_counts, self.approximate)
+        neighbors = None
+        if not rank:
+            neighbors = (np.full((len(ids), self.top_k), -1, dtype=np.intp), np.full((len(ids), self.top_k), -np.inf))
+        elif category_id in self._precomputed:
+            precomputed_ids, precomputed_neighbors, precomputed_scores = self._precomputed[category_id]
+            # Only used if the group still holds exactly the products the table was computed for
+            if np.array_equal(precomputed_ids, ids.astype(str)) and precomputed_neighbors.shape == (len(ids), self.top_k):
+                neighbors = (precomputed_neighbors, precomputed_scores)
+        features = None
+        if self.weights.uses_attributes:
+            features = AttributeFeatures(self._products_df.iloc[positions], self._seller_reputations)
+        return _CategoryIndex(ids, term_counts, self.top_k, self.weights, features, neighbors)
+
+    def group_term_counts(self, category_id: int) -> sparse.csr_matrix:
+        """Returns the term counts of the products of a group, one row per product."""
+        positions = self._category_positions[category_id]
+        if self._term_counts is not None and category_id not in self._stale_term_counts:
+            return self._term_counts[positions]
+        return product_term_counts(self._products_df.iloc[positions])
+
+    def group_fingerprint(self, category_id: int) -> str:
+        """
+        Returns a digest of everything the neighbour table of a group is computed from: the IDs, titles and
+        descriptions of its products and, when the weights use them, their attributes and sellers' reputations.
+        A precomputed table only applies to a group with the same fingerprint.
+        """
+        rows = self._products_df.iloc[self._category_positions[category_id]]
+        content = [rows['id'].tolist(), rows['title'].tolist(), rows.get('description', pd.Series(dtype=object)).tolist()]
+        if self.weights.uses_attributes:
+            content += [
+                rows[PRICE_AMOUNT].tolist(),
+                rows[PRICE_CURRENCY].tolist(),
+                [
+                    rows[specification_column(name)].tolist()
+                    for name in SPECIFICATION_DTYPES if specification_column(name) in rows.columns
+                ],
+                rows.get('brand', pd.Series(dtype=object)).tolist(),
+                [self._seller_reputations.get(seller_id) for seller_id in rows['seller_id']],
+            ]
+        return hashlib.sha256(repr(content).encode()).hexdigest()
+
+    def groups(self) -> List[int]:
+        """Returns the keys of the groups of products that get recommendations (categories, or the whole catalog)."""
+        return list(self._category_positions)
+
+    def use_neighbors(self, tables: Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]]) -> "RecommendationIndex":
+        """
+        Makes groups fitted from now on take their neighbour table from the given precomputed ones (product IDs as
+        strings, neighbour rows and scores per group, computed with the same weights and top_k), instead of
+        computing it. A table whose IDs no longer match its group is ignored. Returns the index itself for chaining.
+        """
+        self._precomputed = dict(tables)
+        return self
+
+    def with_products(
+        self,
+        products_df: pd.DataFrame,
+        positions: np.ndarray,
+        previous_category_ids: List[Optional[int]],
+        category_positions: Dict[int, np.ndarray]
+    ) -> "RecommendationIndex":
+        """
+        Returns a new index for products_df, an updated version of the catalog this index was built from in which
+        only the rows at the given positions changed (previous_category_ids holds their category before the
+        change, None for new rows, and category_positions maps every category to its rows).
+        Fitted categories are updated incrementally and all the others are shared with this index,
+        which is left untouched.
+        """
+        positions = np.asarray(positions, dtype=np.intp)
+        rows = products_df.iloc[positions]
+        ids = rows['id'].tolist()
+        category_ids = self._groups(rows['category_id'].tolist())
+        previous_category_ids = self._groups(previous_category_ids)
+        if self.cross_category:
+            category_positions = {_WHOLE_CATALOG: np.arange(len(products_df))}
+        term_counts = product_term_counts(rows)
+
+        index = copy.copy(self)
+        index._products_df = flatten_products(products_df)
+        index._lock = threading.Lock()
+        index._categories = dict(self._categories)
+        index._category_positions = dict(self._category_positions)
+        stale = set()
+        for category_id in set(category_ids) | {category_id for category_id in previous_category_ids if category_id is not None}:
+            members = category_positions.get(category_id, [])
+            if len(members) >= 2:
+                index._category_positions[category_id] = members
+            else:
+                index._category_positions.pop(category_id, None)
+
+            fitted = self._categories.get(category_id)
+            if fitted is None or len(members) < 2:
+                # Fitted from scratch on first use, from the current text
+                index._categories.pop(category_id, None)
+                stale.add(category_id)
+                continue
+            upserted = [i for i, new_category_id in enumerate(category_ids) if new_category_id == category_id]
+            removed_ids = [
+                product_id
+                for product_id, old_category_id, new_category_id in zip(ids, previous_category_ids, category_ids)
+                if old_category_id == category_id and new_category_id != category_id
+            ]
+            index._categories[category_id] = fitted.with_changes(
+                rows.iloc[upserted], term_counts[upserted], removed_ids
+            )
+
+        index._product_categories = dict(self._product_categories)
+        index._product_categories.update(zip(ids, category_ids))
+        index._stale_term_counts = self._stale_term_counts | stale
+        # The texts of stale groups changed, so their precomputed tables no longer apply
+        index._precomputed = {
+            category_id: table for category_id, table in self._precomputed.items() if category_id not in stale
+        }
+        return index
+
+    def warm(self) -> "RecommendationIndex":
+        """
+        Fits every category up front. Returns the index itself for chaining.
+        """
+        for category_id in self._category_positions:
+            self._category(category_id)
+        return self
+
+    def recommend(self, product_id: str, top_n: int = 5, n_probe: Optional[int] = None) -> List[str]:
+        """
+        Returns the IDs of the products most similar to the given one, within its category (or the whole catalog).
+        Returns an empty list if the product is unknown or is the only product of its category.
+        n_probe overrides the number of clusters scanned by the approximate backend; the exact one ignores it.
+        """
+        category_id: Optional[int] = self._product_categories.get(product_id)
+        if category_id not in self._category_positions:
+            return []
+        with span("recommender.recommend"):
+            category_index = self._category(category_id)
+            if isinstance(category_index, _ApproximateIndex):
+                return category_index.recommend(product_id, top_n, n_probe)
+            return category_index.recommend(product_id, top_n)
+
+    def recommend_many(self, product_ids: List[str], top_n: int = 5) -> Dict[str, List[str]]:
+        """
+        Returns the recommendations of each of the given products, as recommend() would, computing those of the
+        products of the same category together. Unknown products and products alone in their category get an
+        empty list.
+        """
+        recommendations: Dict[str, List[str]] = {product_id: [] for product_id in product_ids}
+        by_category: Dict[int, List[str]] = {}
+        for product_id in recommendations:
+            category_id = self._product_categories.get(product_id)
+            if category_id in self._category_positions:
+                by_category.setdefault(category_id, []).append(product_id)
+        with span("recommender.recommend_many"):
+            for category_id, category_product_ids in by_category.items():
+                results = self._category(category_id).recommend_many(category_product_ids, top_n)
+                recommendations.update(zip(category_product_ids, results))
+        return recommendations
 
 def generate_recommendations(
     product_id: str,
@@ -12,6 +704,7 @@ def generate_recommendations(
     """
     Generates product recommendations based on content similarity within the same category.
     This function filters products by category, computes text-based similarity, and returns the most relevant product IDs.
+    It builds a throwaway RecommendationIndex; callers serving many lookups should keep an index instead.
     Args:
         product_id (str): The ID of the reference product.
         category_id (int): The category to filter products by.
@@ -21,35 +714,7 @@ def generate_recommendations(
         List[str]: List of recommended product IDs.
     """
     # Filter products to include only those in the specified category
-    category_products_df = products_df[products_df['category_id'] == category_id].copy()
-
-    # If there are fewer than two products, no recommendations can be made
-    if len(category_products_df) < 2:
-        return []
-
-    # Combine title and description for feature extraction
-    category_products_df['combined_features'] = category_products_df['title'] + ' ' + category_products_df.get('description', '')
-
-    # Compute TF-IDF matrix and cosine similarity for content-based filtering
-    tfidf = TfidfVectorizer(stop_words='english')
-    tfidf_matrix = tfidf.fit_transform(category_products_df['combined_features'].fillna(''))
-    cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
-
-    # Find the index of the reference product within the filtered DataFrame
-    try:
-        idx = category_products_df.index[category_products_df['id'] == product_id].tolist()[0]
-        local_idx = category_products_df.index.get_loc(idx)
-    except (IndexError, KeyError):
-        return []
-
-    # Sort products by similarity score (excluding the reference product itself)
-    sim_scores = list(enumerate(cosine_sim[local_idx]))
-    sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-
-    # Select the top N most similar products
-    top_similar_local_indices = [i[0] for i in sim_scores[1:top_n + 1]]
-
-    # Retrieve the IDs of the recommended products
-    recommended_product_ids = category_products_df.iloc[top_similar_local_indices]['id'].tolist()
+    category_products_df = products_df[products_df['category_id'] == category_id]
 
-    return recommended_product_ids
\ No newline at end of file
+    index = RecommendationIndex(category_products_df, top_k=top_n)
+    return index.recommend(product_id, top_n)
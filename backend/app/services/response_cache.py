@@ -0,0 +1,106 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, Hashable, Optional
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """A serialized response body and its strong ETag."""
+    body: bytes
+    etag: str
+
+# Returns the tags of the responses changed since a catalog version, or None if they are unknown
+# (see ProductRepository.changed_since)
+ChangedSince = Callable[[str], Optional[FrozenSet[str]]]
+
+class ResponseCache:
+    """
+    In-process LRU cache of serialized responses with a time-to-live per entry.
+    Entries remember the catalog version they were built from and may carry tags naming the data they show
+    (e.g. a product or a category). When the catalog moves to a new version, an entry is still served if none of its
+    tags were changed in between, so in-memory updates only invalidate the responses they affect; entries without
+    tags, or from an unrelated version, are rebuilt. Hit and miss counters are kept to help size the cache.
+    The current version is set by whoever publishes the snapshots (see publish), never by lookups: a request still
+    running on a replaced snapshot must not make the cache drop the responses built from the current one.
+    """
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def publish(self, version: str) -> None:
+        """
+        Makes version the current catalog version, e.g. when a new snapshot is published: from then on only
+        bodies built from it are stored.
+        """
+        with self._lock:
+            self._version = version
+
+    @staticmethod
+    def make_etag(body: bytes) -> str:
+        """Returns a strong ETag derived from the response content."""
+        return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+    def get(self, version: str, key: Hashable, changed_since: Optional[ChangedSince] = None) -> Optional[CachedResponse]:
+        """
+        Returns the cached response for key under the given catalog version, or None on a miss.
+        changed_since tells which tags changed since the version an entry was built from, so entries built from an
+        earlier version can be carried over to the current one; without it, only entries built from this very
+        version are served.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self._clock():
+                expires, cached, entry_version, tags = entry
+                carry_over = entry_version != version and version == self._version
+                if carry_over and tags is not None and changed_since is not None:
+                    changed = changed_since(entry_version)
+                    if changed is not None and not changed & tags:
+                        # Still current: carried over to the new version
+                        self._entries[key] = entry = (expires, cached, version, tags)
+                        entry_version = version
+                if entry_version == version:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return cached
+            self.misses += 1
+            return None
+
+    def put(self, version: str, key: Hashable, body: bytes, tags: Optional[FrozenSet[str]] = None) -> CachedResponse:
+        """
+        Caches a serialized body built from the given catalog version and returns it with its ETag.
+        tags name the data the body shows (see get). Bodies built from any other version than the current one
+        (see publish), e.g. from a snapshot that has since been replaced, are returned but not stored.
+        """
+        cached = CachedResponse(body=body, etag=self.make_etag(body))
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = (self._clock() + self.ttl_seconds, cached, version, tags)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return cached
+
+    def clear(self) -> None:
+        """Drops every cached response."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the cache counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
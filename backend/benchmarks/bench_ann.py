@@ -0,0 +1,70 @@
+# Recall and latency harness of the approximate (IVF) recommendation backend against the exact engine.
+# For each number of probed clusters, reports recall@K (the share of the exact top-K neighbours the approximate
+# backend returns) and the per-query latency, within a category and across categories. Above EXACT_MAX_SIZE the
+# exact neighbours are found by scanning every cluster of the IVF index, which scores every product exactly,
+# instead of building the quadratic exact index.
+# Run from the backend directory: python -m benchmarks.bench_ann
+import time
+from typing import Callable, Iterable, List
+
+import numpy as np
+
+from app.services.recommender import ApproximateSearch, RecommendationIndex
+from benchmarks.synthetic import make_products
+
+CATALOG_SIZES = (20_000, 200_000)
+N_CATEGORIES = 4
+EXACT_MAX_SIZE = 20_000
+PROBES = (1, 4, 8, 16, 32)
+K = 10
+QUERIES = 200
+
+def recall_at_k(
+    recommend: Callable[[str, int], List[str]],
+    exact_recommend: Callable[[str, int], List[str]],
+    product_ids: Iterable[str],
+    k: int = K
+) -> float:
+    """
+    Returns the mean, over the given products, of the share of the exact top-k recommendations that
+    the approximate recommender also returns in its top k.
+    """
+    recalls = []
+    for product_id in product_ids:
+        expected = set(exact_recommend(product_id, k))
+        if expected:
+            recalls.append(len(expected & set(recommend(product_id, k))) / len(expected))
+    return float(np.mean(recalls)) if recalls else 1.0
+
+def main():
+    print(f"{'products':>9} {'scope':>9} {'probes':>7} {'build s':>8} {f'recall@{K}':>10} {'query us':>9}")
+    for size in CATALOG_SIZES:
+        products_df = make_products(size, n_categories=N_CATEGORIES)
+        query_ids = products_df['id'].sample(QUERIES, random_state=0).tolist()
+        for cross_category in (False, True):
+            scope = "catalog" if cross_category else "category"
+            start = time.perf_counter()
+            index = RecommendationIndex(products_df, approximate=ApproximateSearch(), cross_category=cross_category).warm()
+            build_s = time.perf_counter() - start
+
+            exact_size = size if cross_category else size // N_CATEGORIES
+            if exact_size <= EXACT_MAX_SIZE:
+                exact_recommend = RecommendationIndex(products_df, cross_category=cross_category).warm().recommend
+            else:
+                # Probing every cluster scores every product exactly
+                def exact_recommend(product_id, k):
+                    return index.recommend(product_id, k, n_probe=size)
+
+            for n_probe in PROBES:
+                def recommend(product_id, k):
+                    return index.recommend(product_id, k, n_probe=n_probe)
+
+                start = time.perf_counter()
+                for product_id in query_ids:
+                    recommend(product_id, K)
+                query_us = (time.perf_counter() - start) / QUERIES * 1_000_000
+                recall = recall_at_k(recommend, exact_recommend, query_ids)
+                print(f"{size:>9} {scope:>9} {n_probe:>7} {build_s:>8.1f} {recall:>10.3f} {query_us:>9.0f}")
+
+if __name__ == "__main__":
+    main()
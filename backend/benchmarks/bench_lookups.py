@@ -0,0 +1,54 @@
+# Microbenchmark of ID lookups: full column scans versus the repository's hash indexes.
+# Run from the backend directory: python -m benchmarks.bench_lookups
+import time
+
+import numpy as np
+
+from app.repositories.product_repository import ProductRepository
+from benchmarks.synthetic import make_catalog
+
+CATALOG_SIZES = (1_000, 100_000, 1_000_000)
+QUERIES = 200
+
+def scan_lookup(repository, item_id):
+    """The previous lookups: boolean masks over the whole products and reviews frames."""
+    product = repository.products_df[repository.products_df['id'] == item_id].iloc[0]
+    reviews = repository.reviews_df[repository.reviews_df['product_id'] == item_id]
+    seller = repository.sellers_df.loc[product['seller_id']].to_dict()
+    return product, reviews, seller
+
+def index_lookup(repository, item_id):
+    """The indexed lookups used by find_product_details_by_id."""
+    product = repository.products_df.iloc[repository._product_positions[item_id]]
+    reviews = repository.review_index.page(item_id)
+    seller = repository._sellers[product['seller_id']]
+    return product, reviews, seller
+
+def per_query_us(fn, repository, query_ids):
+    start = time.perf_counter()
+    for item_id in query_ids:
+        fn(repository, item_id)
+    return (time.perf_counter() - start) / len(query_ids) * 1_000_000
+
+def main():
+    print(f"{'products':>9} {'build s':>8} {'scan us':>10} {'index us':>9} {'details us':>11} {'by ids us':>10}")
+    rng = np.random.default_rng(1)
+    for size in CATALOG_SIZES:
+        catalog = make_catalog(size)
+        start = time.perf_counter()
+        repository = ProductRepository.from_dataframes(**catalog)
+        build_s = time.perf_counter() - start
+
+        query_ids = catalog["products_df"]["id"].to_numpy()[rng.integers(0, size, size=QUERIES)].tolist()
+        # Full scans get slow quickly; a handful of queries is enough to measure them
+        scan_us = per_query_us(scan_lookup, repository, query_ids[:max(5, QUERIES * 1_000 // size)])
+        index_us = per_query_us(index_lookup, repository, query_ids)
+
+        # End to end repository methods (recommendations excluded: they are benchmarked separately)
+        repository.recommendation_index.recommend = lambda item_id, top_n=5: []
+        details_us = per_query_us(lambda repo, item_id: repo.find_product_details_by_id(item_id), repository, query_ids)
+        by_ids_us = per_query_us(lambda repo, item_id: repo.find_products_by_ids([item_id] * 5), repository, query_ids)
+        print(f"{size:>9} {build_s:>8.2f} {scan_us:>10.1f} {index_us:>9.1f} {details_us:>11.1f} {by_ids_us:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Benchmark of the recommender scoring path against category size, ranking by text only and with the hybrid weights
+# (text, specifications, price, brand and seller reputation).
+# Run from the backend directory: python -m benchmarks.bench_recommender
+import time
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+from app.services.recommender import RecommendationIndex, ScoringWeights
+from benchmarks.synthetic import make_products
+
+CATEGORY_SIZES = (100, 1_000, 5_000, 20_000)
+# The full-matrix baseline needs n x n floats; skip it beyond this size
+BASELINE_MAX_SIZE = 5_000
+QUERIES = 50
+HYBRID_WEIGHTS = ScoringWeights(text=1.0, specifications=0.5, price=0.3, brand=0.2, seller_reputation=0.1)
+SELLER_REPUTATIONS = {f"S{i:03d}": 2.5 + i / 4 for i in range(10)}
+
+def full_matrix_recommendations(product_id, category_products_df, top_n=5):
+    """The previous algorithm: full n x n similarity matrix followed by a Python sort of one row."""
+    tfidf_matrix = TfidfVectorizer(stop_words='english').fit_transform(
+        category_products_df['title'] + ' ' + category_products_df['description'])
+    cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
+    local_idx = category_products_df.index.get_loc(
+        category_products_df.index[category_products_df['id'] == product_id][0])
+    sim_scores = sorted(enumerate(cosine_sim[local_idx]), key=lambda x: x[1], reverse=True)
+    return category_products_df.iloc[[i[0] for i in sim_scores[1:top_n + 1]]]['id'].tolist()
+
+def timed(fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def main():
+    print(f"{'products':>9} {'scoring':>8} {'full matrix ms':>15} {'index build ms':>15} {'lookup us':>10} {'row scoring us':>15}")
+    for size in CATEGORY_SIZES:
+        products_df = make_products(size, n_categories=1)
+        query_ids = products_df['id'].iloc[:QUERIES].tolist()
+
+        baseline = "skipped"
+        if size <= BASELINE_MAX_SIZE:
+            baseline = f"{timed(lambda: full_matrix_recommendations(query_ids[0], products_df)):.1f}"
+
+        for scoring, weights in (("text", ScoringWeights()), ("hybrid", HYBRID_WEIGHTS)):
+            index = None
+            def build():
+                nonlocal index
+                index = RecommendationIndex(products_df, weights=weights, seller_reputations=SELLER_REPUTATIONS).warm()
+            build_ms = timed(build)
+
+            lookup_us = timed(lambda: [index.recommend(product_id) for product_id in query_ids]) / QUERIES * 1000
+            # top_n above the precomputed K forces the on-demand single-row scoring path
+            row_us = timed(lambda: [index.recommend(product_id, top_n=index.top_k + 1) for product_id in query_ids]) / QUERIES * 1000
+            print(f"{size:>9} {scoring:>8} {baseline:>15} {build_ms:>15.1f} {lookup_us:>10.1f} {row_us:>15.1f}")
+
+if __name__ == "__main__":
+    main()
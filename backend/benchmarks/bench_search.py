@@ -0,0 +1,69 @@
+# Typeahead latency of the full-text search index.
+# Titles and descriptions are drawn from a vocabulary of VOCABULARY_SIZE made-up words (some of them accented) with
+# Zipf-Mandelbrot frequencies, so a few words are common and most are rare, as in real catalogs. Every query is a
+# keystroke of typing two consecutive words of a random product's title, unaccented ("c", "ca", ..., "camara ne"),
+# answered by ProductRepository.search_products (matching, ranking, facets and summaries of the first page).
+# Run from the backend directory: python -m benchmarks.bench_search
+import time
+
+import numpy as np
+
+from app.repositories.product_repository import ProductRepository
+from app.repositories.search import fold
+from benchmarks.synthetic import make_catalog
+
+CATALOG_SIZES = (10_000, 100_000, 1_000_000)
+VOCABULARY_SIZE = 50_000
+# Zipf-Mandelbrot offset: the most frequent word is in a few percent of the products, not in all of them
+ZIPF_OFFSET = 50
+TITLE_WORDS = 6
+DESCRIPTION_WORDS = 20
+TYPED_TITLES = 100
+PAGE_SIZE = 10
+
+SYLLABLES = "ma me mi mo mu ca co cu ra re ri ro la le li lo ta te ti to pa pe pi po sa se si so na ne ni no ba bo ñu ár ón".split()
+
+def make_vocabulary(size: int, rng: np.random.Generator) -> np.ndarray:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES, size=rng.integers(2, 5))))
+    return rng.permutation(sorted(words))
+
+def make_texts(n_products: int, n_words: int, vocabulary: np.ndarray, rng: np.random.Generator) -> list:
+    weights = 1.0 / (np.arange(len(vocabulary)) + ZIPF_OFFSET)
+    words = vocabulary[rng.choice(len(vocabulary), size=(n_products, n_words), p=weights / weights.sum())]
+    return [" ".join(row) for row in words]
+
+def keystrokes(title: str) -> list:
+    words = fold(title).split()[:2]
+    typed = " ".join(words)
+    return [typed[:end] for end in range(1, len(typed) + 1) if not typed[:end].endswith(" ")]
+
+def main():
+    print(f"{'products':>9} {'build s':>8} {'broad':>6} {'queries':>8} {'p50 ms':>7} {'p90 ms':>7} {'p99 ms':>7} {'max ms':>7}")
+    rng = np.random.default_rng(0)
+    vocabulary = make_vocabulary(VOCABULARY_SIZE, rng)
+    for size in CATALOG_SIZES:
+        catalog = make_catalog(size, reviews_per_product=1)
+        catalog["products_df"]["title"] = make_texts(size, TITLE_WORDS, vocabulary, rng)
+        catalog["products_df"]["description"] = make_texts(size, DESCRIPTION_WORDS, vocabulary, rng)
+        start = time.perf_counter()
+        repository = ProductRepository.from_dataframes(**catalog)
+        build_s = time.perf_counter() - start
+
+        titles = catalog["products_df"]["title"].to_numpy()[rng.integers(0, size, size=TYPED_TITLES)]
+        queries = [query for title in titles for query in keystrokes(title)]
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            repository.search_products(query, limit=PAGE_SIZE)
+            latencies.append((time.perf_counter() - start) * 1000)
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        broad = len(repository.search_index._precomputed)
+        print(
+            f"{size:>9} {build_s:>8.1f} {broad:>6} {len(queries):>8} "
+            f"{p50:>7.2f} {p90:>7.2f} {p99:>7.2f} {max(latencies):>7.2f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+# Benchmark of item detail serialization for products with large review lists:
+# validating against ProductDetail on every response versus encoding the prevalidated data with orjson.
+# Details embed a single page of reviews, so the body no longer grows with the number of reviews.
+# Run from the backend directory: python -m benchmarks.bench_serialization
+import time
+
+from app.core.serialization import dumps
+from app.models.product import ProductDetail
+from app.repositories.product_repository import ProductRepository
+from benchmarks.synthetic import make_catalog
+
+REVIEW_COUNTS = (10, 1_000, 10_000, 100_000)
+
+def per_call_ms(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def main():
+    print(f"{'reviews':>8} {'validate+dump ms':>17} {'orjson ms':>10} {'speedup':>8} {'body KB':>8}")
+    for review_count in REVIEW_COUNTS:
+        catalog = make_catalog(100, reviews_per_product=0)
+        reviews_df = make_catalog(review_count, reviews_per_product=1)["reviews_df"]
+        # Every review belongs to the first product
+        catalog["reviews_df"] = reviews_df.assign(product_id=catalog["products_df"]["id"].iloc[0])
+        repository = ProductRepository.from_dataframes(**catalog)
+        details = repository.find_product_details_by_id(catalog["products_df"]["id"].iloc[0], include_related=False)
+
+        repeat = max(3, 100_000 // review_count)
+        validated_ms = per_call_ms(lambda: ProductDetail.model_validate(details).model_dump_json(), repeat)
+        fast_ms = per_call_ms(lambda: dumps(details), repeat)
+        print(f"{review_count:>8} {validated_ms:>17.3f} {fast_ms:>10.3f} {validated_ms / fast_ms:>7.1f}x {len(dumps(details)) / 1024:>8.0f}")
+
+if __name__ == "__main__":
+    main()
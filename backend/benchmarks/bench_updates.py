@@ -0,0 +1,114 @@
+# Benchmark of in-memory catalog updates (CatalogProvider.apply) while reader threads serve product details.
+# Reports update throughput (single and batched), alone and with reader threads running, and the read throughput
+# and latency with and without writes. Readers run in a tight loop, so on few cores they compete with the
+# writer for the GIL: compare the rows with and without readers to see the update cost itself.
+# Run from the backend directory: python -m benchmarks.bench_updates
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.repositories.catalog_provider import CatalogProvider
+from benchmarks.synthetic import make_catalog
+
+CATALOG_SIZES = (10_000, 100_000)
+N_CATEGORIES = 50
+READER_COUNTS = (0, 2)
+DURATION_S = 3.0
+BATCH_SIZE = 100
+
+def write_catalog(catalog, data_path: Path) -> None:
+    """Writes a synthetic catalog as data files, products and reviews as NDJSON."""
+    catalog["products_df"].to_json(data_path / "products.ndjson", orient="records", lines=True)
+    catalog["reviews_df"].to_json(data_path / "reviews.ndjson", orient="records", lines=True)
+    for table in ("categories", "sellers", "payment_methods"):
+        catalog[f"{table}_df"].to_json(data_path / f"{table}.json", orient="records")
+
+def run_readers(provider, product_ids, readers: int, stop: threading.Event):
+    """Starts reader threads fetching random product details until stop is set; returns their latency lists."""
+    latencies = [[] for _ in range(readers)]
+
+    def read(samples, seed):
+        rng = np.random.default_rng(seed)
+        while not stop.is_set():
+            item_id = product_ids[rng.integers(0, len(product_ids))]
+            start = time.perf_counter()
+            provider.repository.find_product_details_by_id(item_id, include_related=False)
+            samples.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=read, args=(samples, seed)) for seed, samples in enumerate(latencies)]
+    for thread in threads:
+        thread.start()
+    return threads, latencies
+
+def measure(provider, product_ids, readers, writer=None):
+    """Runs the readers for DURATION_S, with the writer (if any) applying updates meanwhile."""
+    stop = threading.Event()
+    threads, latencies = run_readers(provider, product_ids, readers, stop)
+    updates = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < DURATION_S:
+        if writer is None:
+            time.sleep(0.05)
+        else:
+            updates += writer()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in threads:
+        thread.join()
+    if not readers:
+        return updates / elapsed, 0.0, float("nan"), float("nan")
+    samples = np.concatenate([np.array(samples) for samples in latencies]) * 1_000_000
+    return updates / elapsed, len(samples) / elapsed, np.percentile(samples, 50), np.percentile(samples, 99)
+
+def main():
+    print(
+        f"{'products':>9} {'writer':>14} {'readers':>8} {'updates/s':>10} {'reads/s':>9} {'read p50 us':>12} {'read p99 us':>12}"
+    )
+    rng = np.random.default_rng(1)
+    for size in CATALOG_SIZES:
+        catalog = make_catalog(size, n_categories=N_CATEGORIES)
+        products_df = catalog["products_df"]
+        product_ids = products_df["id"].tolist()
+        records = products_df.to_dict("records")
+
+        with tempfile.TemporaryDirectory() as directory:
+            write_catalog(catalog, Path(directory))
+            provider = CatalogProvider(Path(directory))
+            provider.load()
+
+            def upsert(batch_size):
+                batch = []
+                for position in rng.integers(0, size, size=batch_size).tolist():
+                    record = dict(records[position], stock=int(rng.integers(0, 100)))
+                    record["price"] = {"amount": float(rng.integers(1_000, 5_000_000)), "currency": "COP"}
+                    batch.append(record)
+                provider.apply(lambda repository: repository.with_products(batch))
+                return batch_size
+
+            def review(batch_size):
+                batch = [
+                    {"product_id": product_ids[position], "author": "Bench", "rating": int(rng.integers(1, 6)), "comment": "ok"}
+                    for position in rng.integers(0, size, size=batch_size).tolist()
+                ]
+                provider.apply(lambda repository: repository.with_reviews(batch))
+                return batch_size
+
+            writers = {
+                "none": None,
+                "upsert": lambda: upsert(1),
+                f"upsert x{BATCH_SIZE}": lambda: upsert(BATCH_SIZE),
+                "review": lambda: review(1),
+                f"review x{BATCH_SIZE}": lambda: review(BATCH_SIZE),
+            }
+            for name, writer in writers.items():
+                for readers in READER_COUNTS:
+                    if writer is None and not readers:
+                        continue
+                    updates_s, reads_s, p50, p99 = measure(provider, product_ids, readers, writer)
+                    print(f"{size:>9} {name:>14} {readers:>8} {updates_s:>10.1f} {reads_s:>9.0f} {p50:>12.1f} {p99:>12.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Load test of rate limiting across uvicorn worker processes.
+# Starts the API with WORKERS worker processes, once per rate limit storage, and sends REQUESTS concurrent requests
+# to an item detail from a single client address, with the detail limit set to LIMIT per minute. With the
+# in-memory storage every worker counts its own requests, so up to WORKERS x LIMIT requests get through; with the
+# shared SQLite storage exactly LIMIT do. Exits with an error if the shared storage lets more than LIMIT through.
+# Run from the backend directory: python -m benchmarks.load_rate_limit
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+
+WORKERS = 4
+LIMIT = 100
+REQUESTS = 600
+CONCURRENCY = 32
+STARTUP_TIMEOUT_S = 120.0
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+def start_server(storage_uri: str, port: int) -> subprocess.Popen:
+    """Starts the API with WORKERS uvicorn workers and waits until every worker answers."""
+    environment = dict(
+        os.environ,
+        RATE_LIMIT_STORAGE_URI=storage_uri,
+        RATE_LIMIT_ITEM_DETAIL=f"{LIMIT}/minute",
+        CATALOG_RELOAD_INTERVAL_SECONDS="0",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(WORKERS), "--log-level", "warning"],
+        env=environment
+    )
+    deadline = time.monotonic() + STARTUP_TIMEOUT_S
+    while time.monotonic() < deadline:
+        try:
+            # Every worker loads the catalog before accepting connections; wait a little more for the slowest
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1.0).status_code < 500:
+                time.sleep(2.0)
+                return server
+        except httpx.TransportError:
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("The server did not start in time")
+
+def run(storage_uri: str) -> Counter:
+    """Returns the count of response status codes of REQUESTS concurrent item detail requests."""
+    port = free_port()
+    server = start_server(storage_uri, port)
+    try:
+        # A new connection per request, so that requests are spread over the workers
+        def request(_):
+            return httpx.get(f"http://127.0.0.1:{port}/api/v1/items/SMA001", headers={"Connection": "close"}).status_code
+
+        with ThreadPoolExecutor(CONCURRENCY) as pool:
+            return Counter(pool.map(request, range(REQUESTS)))
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    print(f"{WORKERS} workers, limit {LIMIT}/minute, {REQUESTS} requests from one client")
+    print(f"{'storage':>8} {'200':>6} {'429':>6} {'other':>6}")
+    with tempfile.TemporaryDirectory() as directory:
+        storages = {"memory": "memory://", "sqlite": f"sqlite:///{Path(directory) / 'rate-limits.sqlite3'}"}
+        results = {}
+        for name, storage_uri in storages.items():
+            statuses = run(storage_uri)
+            results[name] = statuses
+            other = sum(count for status, count in statuses.items() if status not in (200, 429))
+            print(f"{name:>8} {statuses[200]:>6} {statuses[429]:>6} {other:>6}")
+    if results["sqlite"][200] > LIMIT:
+        sys.exit(f"The shared storage let {results['sqlite'][200]} requests through, above the limit of {LIMIT}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+# Reproducible benchmark and load-test suite of the backend, to catch performance regressions.
+# Builds a synthetic catalog of the chosen size (benchmarks.synthetic, fixed seed), times the ProductRepository
+# methods and the recommender call by call (microbenchmarks), then load-tests GET /items, /items/{id} and
+# /items/{id}/related in process, through the ASGI app, with CONCURRENCY concurrent clients. Every figure is written
+# to a JSON file; given the JSON of a previous run as baseline, the change of each figure is reported and the run
+# fails if a median, build time or throughput got worse than the tolerance (95th and 99th percentiles are reported
+# but too noisy to gate on). Every benchmark, the catalog build included, is repeated ROUNDS times and the best
+# round of each figure is kept, as timeit does, since background activity only ever makes a round slower.
+# Rate limits are disabled during the load test; the response cache stays on, as in production, but requests are
+# spread uniformly over the catalog so most of them build their response.
+# Run from the backend directory:
+#   python -m benchmarks.suite --profile medium --output baseline.json
+#   python -m benchmarks.suite --profile medium --baseline baseline.json
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import httpx
+import numpy as np
+
+from app.repositories.product_repository import ProductRepository
+from app.repositories.reviews import REVIEW_SORT_OPTIONS
+from app.services import recommender
+from benchmarks.synthetic import make_catalog
+
+class CatalogSize(NamedTuple):
+    products: int
+    reviews_per_product: int
+    categories: int
+
+PROFILES = {
+    "small": CatalogSize(products=1_000, reviews_per_product=5, categories=5),
+    "medium": CatalogSize(products=20_000, reviews_per_product=10, categories=20),
+    "large": CatalogSize(products=200_000, reviews_per_product=20, categories=50),
+}
+SEED = 0
+ROUNDS = 3
+CALLS = 500
+# generate_recommendations fits a throwaway model of the whole category on every call, so it gets fewer calls
+GENERATE_RECOMMENDATIONS_CALLS = 10
+WARMUP_CALLS = 20
+LOAD_REQUESTS = 2_000
+CONCURRENCY = 16
+PAGE_SIZE = 20
+TOLERANCE = 0.2
+DEFAULT_OUTPUT = Path("benchmarks/results/latest.json")
+
+# Figures compared against the baseline: lower is better for times, higher for throughput.
+# Tail percentiles are only reported: a handful of slow calls moves them by more than any sensible tolerance.
+LOWER_IS_BETTER = ("p50_ms", "seconds")
+HIGHER_IS_BETTER = ("throughput_rps",)
+REPORTED_ONLY = ("p95_ms", "p99_ms")
+# Calls of a few microseconds can take twice as long in one process as in another (memory placement), so a figure
+# only counts as a regression if the time per call also grew by more than this
+NOISE_FLOOR_MS = 0.05
+
+def latency_figures(latencies_s: List[float], elapsed_s: float) -> Dict[str, float]:
+    """Returns the percentiles (in milliseconds) and throughput of a series of timed calls."""
+    p50, p95, p99 = np.percentile(np.array(latencies_s) * 1000, [50, 95, 99])
+    return {
+        "calls": len(latencies_s),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "throughput_rps": round(len(latencies_s) / elapsed_s, 1),
+    }
+
+def best_round(rounds: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combines the figures of several rounds, keeping the lowest latencies and the highest throughput."""
+    best = dict(rounds[0])
+    for figures in rounds[1:]:
+        for figure, value in figures.items():
+            if figure.endswith("_ms"):
+                best[figure] = min(best[figure], value)
+            elif figure == "throughput_rps":
+                best[figure] = max(best[figure], value)
+    return best
+
+def time_calls(fn: Callable[..., Any], arguments: List[tuple]) -> Dict[str, float]:
+    """
+    Calls fn once per argument tuple, after a few warm-up calls, and returns the latency figures of the best of
+    ROUNDS rounds.
+    """
+    for args in arguments[:WARMUP_CALLS]:
+        fn(*args)
+    figures = []
+    for _ in range(ROUNDS):
+        latencies = []
+        start = time.perf_counter()
+        for args in arguments:
+            call_start = time.perf_counter()
+            fn(*args)
+            latencies.append(time.perf_counter() - call_start)
+        figures.append(latency_figures(latencies, time.perf_counter() - start))
+    return best_round(figures)
+
+def time_once(fn: Callable[[], Any]) -> float:
+    """Returns the seconds a single call of fn takes."""
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def microbenchmarks(catalog: Dict[str, Any], calls: int, rng: np.random.Generator) -> tuple:
+    """Times the ProductRepository methods and the recommender. Returns the results and the repository built."""
+    results = {}
+    repository = None
+
+    def build():
+        nonlocal repository
+        repository = ProductRepository.from_dataframes(**catalog)
+
+    # Each round builds a new repository, whose recommendation models are then fitted from scratch
+    build_seconds, warm_seconds = [], []
+    for _ in range(ROUNDS):
+        build_seconds.append(time_once(build))
+        warm_seconds.append(time_once(repository.recommendation_index.warm))
+    results["repository.build"] = {"seconds": round(min(build_seconds), 3)}
+    results["recommender.warm"] = {"seconds": round(min(warm_seconds), 3)}
+
+    products_df = catalog["products_df"]
+    product_ids = products_df["id"].to_numpy()
+    categories = catalog["categories_df"]["name"].tolist()
+    titles = products_df["title"].to_numpy()
+
+    def random_ids(size: int) -> List[str]:
+        return product_ids[rng.integers(0, len(product_ids), size=size)].tolist()
+
+    results["repository.find_product_details_by_id"] = time_calls(
+        lambda item_id: repository.find_product_details_by_id(item_id, include_related=False),
+        [(item_id,) for item_id in random_ids(calls)]
+    )
+    results["repository.find_products_by_ids"] = time_calls(
+        repository.find_products_by_ids, [(random_ids(5),) for _ in range(calls)]
+    )
+    results["repository.find_products_page"] = time_calls(
+        lambda category, sort: repository.find_products_page(category=category, sort=sort, limit=PAGE_SIZE),
+        [(categories[i], sort) for i, sort in zip(
+            rng.integers(0, len(categories), size=calls).tolist(),
+            rng.choice([None, "price_asc", "rating_desc"], size=calls).tolist()
+        )]
+    )
+    # Typeahead of the first word of a product title, cut at a random length
+    typed = [
+        (title.split()[0][:length],)
+        for title, length in zip(titles[rng.integers(0, len(titles), size=calls)], rng.integers(2, 8, size=calls).tolist())
+    ]
+    results["repository.search_products"] = time_calls(
+        lambda query: repository.search_products(query, limit=PAGE_SIZE), typed
+    )
+    results["repository.find_reviews_page"] = time_calls(
+        lambda item_id, sort: repository.find_reviews_page(item_id, sort=sort),
+        list(zip(random_ids(calls), rng.choice(REVIEW_SORT_OPTIONS, size=calls).tolist()))
+    )
+    results["recommender.recommend"] = time_calls(
+        repository.recommendation_index.recommend, [(item_id,) for item_id in random_ids(calls)]
+    )
+
+    category_ids = products_df.set_index("id")["category_id"]
+    generate_ids = random_ids(GENERATE_RECOMMENDATIONS_CALLS)
+    results["recommender.generate_recommendations"] = time_calls(
+        lambda item_id: recommender.generate_recommendations(item_id, category_ids[item_id], products_df),
+        [(item_id,) for item_id in generate_ids]
+    )
+    return results, repository
+
+async def load_endpoint(client: httpx.AsyncClient, paths: List[str], concurrency: int) -> Dict[str, Any]:
+    """Requests every path with concurrency clients sharing the list, and returns the latency figures."""
+    latencies = []
+    statuses = Counter()
+    queue = iter(paths)
+
+    async def worker():
+        for path in queue:
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    figures = latency_figures(latencies, time.perf_counter() - start)
+    figures["status_codes"] = {str(code): count for code, count in sorted(statuses.items())}
+    return figures
+
+async def load_test(
+    repository: ProductRepository,
+    catalog: Dict[str, Any],
+    requests: int,
+    concurrency: int,
+    rng: np.random.Generator
+) -> Dict[str, Any]:
+    """Load-tests the read endpoints through the ASGI app, serving the given repository."""
+    # Imported here: loading the application configures the rate limit storage and the shared executor
+    from app.api.endpoints.products import get_repository
+    from app.dependencies import executor, limiter, response_cache
+    from app.main import app
+
+    app.dependency_overrides[get_repository] = lambda: repository
+    limiter.enabled = False
+    response_cache.clear()
+    response_cache.publish(repository.version)
+
+    product_ids = catalog["products_df"]["id"].to_numpy()[rng.integers(0, len(catalog["products_df"]), size=requests)].tolist()
+    categories = catalog["categories_df"]["name"].to_numpy()[rng.integers(0, len(catalog["categories_df"]), size=requests)]
+    sorts = rng.choice(["", "&sort=price_asc", "&sort=rating_desc"], size=requests)
+    endpoints = {
+        "GET /items": [f"/api/v1/items?category={category}&limit={PAGE_SIZE}{sort}" for category, sort in zip(categories, sorts)],
+        "GET /items/{id}": [f"/api/v1/items/{item_id}" for item_id in product_ids],
+        "GET /items/{id}/related": [f"/api/v1/items/{item_id}/related" for item_id in product_ids],
+    }
+    results = {}
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for name, paths in endpoints.items():
+                # Warm-up requests are not counted
+                await load_endpoint(client, paths[:WARMUP_CALLS], concurrency)
+                rounds = []
+                for _ in range(ROUNDS):
+                    # Every round starts with an empty response cache, so rounds do the same work
+                    response_cache.clear()
+                    rounds.append(await load_endpoint(client, paths, concurrency))
+                results[name] = best_round(rounds)
+    finally:
+        app.dependency_overrides.pop(get_repository, None)
+        limiter.enabled = True
+        executor.shutdown()
+    return results
+
+def environment() -> Dict[str, Any]:
+    """Describes the machine and code the figures were measured on."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "measured_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+    }
+
+def milliseconds_per_call(figure: str, value: float) -> float:
+    """Converts a figure to the time per call it stands for, in milliseconds."""
+    if figure == "seconds":
+        return value * 1000
+    if figure == "throughput_rps":
+        return 1000 / value
+    return value
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Prints the change of every figure against the baseline and returns the figures that regressed beyond
+    the tolerance (e.g. 0.2 allows 20% slower or 20% less throughput) and the noise floor.
+    """
+    regressions = []
+    print(f"\n{'benchmark':<42} {'figure':<15} {'baseline':>11} {'current':>11} {'change':>8}")
+    for section in ("microbenchmarks", "load_test"):
+        for name, figures in results[section].items():
+            base_figures = baseline.get(section, {}).get(name)
+            if base_figures is None:
+                continue
+            for figure in LOWER_IS_BETTER + HIGHER_IS_BETTER + REPORTED_ONLY:
+                if figure not in figures or not base_figures.get(figure):
+                    continue
+                current, base = figures[figure], base_figures[figure]
+                change = current / base - 1
+                worse = change > tolerance if figure in LOWER_IS_BETTER else change < -tolerance / (1 + tolerance)
+                worse = figure not in REPORTED_ONLY and worse and (
+                    milliseconds_per_call(figure, current) - milliseconds_per_call(figure, base) > NOISE_FLOOR_MS
+                )
+                flag = "  REGRESSION" if worse else ""
+                print(f"{name:<42} {figure:<15} {base:>11} {current:>11} {change:>+7.0%}{flag}")
+                if worse:
+                    regressions.append(f"{section}/{name}/{figure}")
+    return regressions
+
+def print_results(results: Dict[str, Any]) -> None:
+    print(f"{'benchmark':<42} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>9}")
+    for section in ("microbenchmarks", "load_test"):
+        for name, figures in results[section].items():
+            if "seconds" in figures:
+                print(f"{name:<42} {'':>9} {'':>9} {'':>9} {'':>9}  {figures['seconds']} s")
+            else:
+                print(
+                    f"{name:<42} {figures['p50_ms']:>9.3f} {figures['p95_ms']:>9.3f} "
+                    f"{figures['p99_ms']:>9.3f} {figures['throughput_rps']:>9.1f}"
+                )
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Backend benchmark and load-test suite.")
+    parser.add_argument("--profile", choices=PROFILES, default="small", help="Catalog size preset.")
+    parser.add_argument("--products", type=int, help="Number of products (overrides the profile).")
+    parser.add_argument("--reviews-per-product", type=int, help="Average reviews per product (overrides the profile).")
+    parser.add_argument("--categories", type=int, help="Number of categories (overrides the profile).")
+    parser.add_argument("--calls", type=int, default=CALLS, help="Calls per microbenchmark.")
+    parser.add_argument("--requests", type=int, default=LOAD_REQUESTS, help="Requests per load-tested endpoint.")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="Concurrent clients of the load test.")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT, help="Where to write the JSON results.")
+    parser.add_argument("--baseline", type=Path, help="JSON results of a previous run to compare against.")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Allowed relative regression, e.g. 0.2.")
+    args = parser.parse_args(argv)
+
+    profile = PROFILES[args.profile]
+    size = CatalogSize(
+        products=args.products or profile.products,
+        reviews_per_product=args.reviews_per_product if args.reviews_per_product is not None else profile.reviews_per_product,
+        categories=args.categories or profile.categories,
+    )
+    # Read before running, so the output may overwrite the baseline file
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+    if baseline is not None and baseline["catalog"] != size._asdict():
+        print(f"The baseline was measured on another catalog size: {baseline['catalog']}", file=sys.stderr)
+        return 2
+
+    rng = np.random.default_rng(SEED)
+    catalog = make_catalog(
+        size.products, reviews_per_product=size.reviews_per_product, n_categories=size.categories,
+        n_sellers=max(10, size.categories), seed=SEED
+    )
+    micro, repository = microbenchmarks(catalog, args.calls, rng)
+    load = asyncio.run(load_test(repository, catalog, args.requests, args.concurrency, rng))
+    results = {
+        "catalog": size._asdict(),
+        "settings": {
+            "seed": SEED, "rounds": ROUNDS, "calls": args.calls, "requests": args.requests, "concurrency": args.concurrency
+        },
+        "environment": environment(),
+        "microbenchmarks": micro,
+        "load_test": load,
+    }
+
+    print_results(results)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f"\nResults written to {args.output}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} figures regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            return 1
+        print(f"\nNo figure regressed by more than {args.tolerance:.0%}.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
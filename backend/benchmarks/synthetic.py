@@ -0,0 +1,80 @@
+# Synthetic catalog generator used by the benchmarks.
+# Produces DataFrames with the same columns as the JSON files in app/data, at any size.
+import numpy as np
+import pandas as pd
+
+WORDS = (
+    "cuaderno lapiz borrador escritorio silla mesa armario repisa celular pantalla bateria camara "
+    "memoria titanio aluminio madera roble negro blanco azul rojo premium pro max mini ultra lite "
+    "oficina hogar escolar ergonomico compacto resistente inalambrico rapido liviano moderno clasico"
+).split()
+
+def make_products(n_products: int, n_categories: int = 3, n_brands: int = 20, seed: int = 0) -> pd.DataFrame:
+    """
+    Returns a products DataFrame with random titles and descriptions drawn from a small vocabulary.
+    """
+    rng = np.random.default_rng(seed)
+    words = np.array(WORDS)
+    title_words = words[rng.integers(0, len(words), size=(n_products, 5))]
+    description_words = words[rng.integers(0, len(words), size=(n_products, 20))]
+    ids = [f"P{i:07d}" for i in range(n_products)]
+    return pd.DataFrame({
+        "id": ids,
+        "title": [" ".join(row) for row in title_words],
+        "category_id": rng.integers(1, n_categories + 1, size=n_products),
+        "seller_id": [f"S{i:03d}" for i in rng.integers(0, 10, size=n_products)],
+        "brand": [f"Marca {i}" for i in rng.integers(0, n_brands, size=n_products)],
+        "description": [" ".join(row) for row in description_words],
+        "price": [{"amount": float(amount), "currency": "COP"} for amount in rng.integers(1_000, 5_000_000, size=n_products)],
+        "stock": rng.integers(0, 100, size=n_products),
+        "sku": ids,
+        "accepted_payment_method_ids": [[1, 2]] * n_products,
+        "images": [[f"/images/products/{product_id}/1.jpg"] for product_id in ids],
+        "specifications": [
+            {"color": color, "ram": f"{ram} GB", "screen_size": screen_size}
+            for color, ram, screen_size in zip(
+                rng.choice(["Negro", "Blanco", "Azul"], size=n_products).tolist(),
+                (2 ** rng.integers(1, 6, size=n_products)).tolist(),
+                rng.choice([5.5, 6.1, 6.7, 14.0], size=n_products).tolist()
+            )
+        ],
+    })
+
+def make_catalog(
+    n_products: int,
+    reviews_per_product: int = 2,
+    n_categories: int = 3,
+    n_sellers: int = 10,
+    n_brands: int = 20,
+    seed: int = 0
+) -> dict:
+    """
+    Returns the five catalog DataFrames keyed by the ProductRepository.from_dataframes argument names.
+    """
+    rng = np.random.default_rng(seed)
+    products_df = make_products(n_products, n_categories=n_categories, n_brands=n_brands, seed=seed)
+    products_df["seller_id"] = [f"S{i:03d}" for i in rng.integers(0, n_sellers, size=n_products)]
+
+    n_reviews = n_products * reviews_per_product
+    reviews_df = pd.DataFrame({
+        "id": [f"R{i:08d}" for i in range(n_reviews)],
+        "product_id": products_df["id"].to_numpy()[rng.integers(0, n_products, size=n_reviews)],
+        "author": "Autor",
+        "rating": rng.integers(1, 6, size=n_reviews),
+        "comment": "Comentario de prueba",
+    })
+    categories_df = pd.DataFrame({"id": range(1, n_categories + 1), "name": [f"Categoría {i}" for i in range(1, n_categories + 1)]})
+    sellers_df = pd.DataFrame({
+        "id": [f"S{i:03d}" for i in range(n_sellers)],
+        "name": [f"Vendedor {i}" for i in range(n_sellers)],
+        "is_official_store": False,
+        "reputation": [{"level": "Verde", "score": 4.5}] * n_sellers,
+    })
+    payment_methods_df = pd.DataFrame({"id": [1, 2], "name": ["Tarjeta de crédito", "Efectivo"]})
+    return {
+        "products_df": products_df,
+        "categories_df": categories_df,
+        "sellers_df": sellers_df,
+        "reviews_df": reviews_df,
+        "payment_methods_df": payment_methods_df,
+    }
@@ -0,0 +1,92 @@
+# backend/test/api/endpoints/test_backpressure.py
+
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from app.api.endpoints import products
+from app.api.endpoints.products import get_repository
+from app.core.executor import BoundedExecutor
+from app.main import app
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class SlowRepository:
+    """Repository stand-in whose recommendations block until released, like a very slow model."""
+    version = "slow-repository"
+
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+        self.recommendation_index = self
+
+    def has_product(self, item_id):
+        return True
+
+    def recommend(self, item_id, top_n=5):
+        self.calls += 1
+        self.release.wait(timeout=5)
+        return []
+
+    def find_products_by_ids(self, item_ids):
+        return []
+
+    def changed_since(self, version):
+        return None
+
+    def response_tags(self, item_id, include_related):
+        return frozenset()
+
+
+@pytest.fixture
+def slow_app(monkeypatch):
+    """Serves the app with a slow repository and an executor of two workers and one queue slot."""
+    repository = SlowRepository()
+    executor = BoundedExecutor(max_workers=2, max_queue=1)
+    monkeypatch.setattr(products, "executor", executor)
+    monkeypatch.setitem(app.dependency_overrides, get_repository, lambda: repository)
+    yield repository, executor
+    repository.release.set()
+    executor.shutdown()
+
+
+async def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached in time"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.anyio
+async def test_health_check_responsive_while_recommendations_in_flight(slow_app):
+    """
+    Tests that the event loop keeps answering the health check while every worker thread
+    is busy with heavy recommendation requests, and that requests beyond the queue get a 503.
+    """
+    repository, executor = slow_app
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        heavy = [asyncio.create_task(client.get(f"/api/v1/items/SLOW{i}/related")) for i in range(3)]
+        # Two requests occupy the workers and the third waits in the queue
+        await wait_until(lambda: repository.calls == 2 and executor.in_flight == 3)
+
+        start = time.perf_counter()
+        health = await client.get("/")
+        assert health.status_code == 200
+        assert time.perf_counter() - start < 0.5
+
+        rejected = await client.get("/api/v1/items/SLOW9/related")
+        assert rejected.status_code == 503
+        assert rejected.headers["Retry-After"] == "1"
+
+        repository.release.set()
+        responses = await asyncio.gather(*heavy)
+        assert [response.status_code for response in responses] == [200, 200, 200]
+        assert executor.in_flight == 0
@@ -0,0 +1,132 @@
+# backend/test/api/endpoints/test_catalog_updates.py
+
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.endpoints import products
+from app.api.endpoints.products import get_repository
+from app.core.config import settings
+from app.dependencies import response_cache
+from app.main import app
+from app.repositories.catalog_provider import CatalogProvider
+
+NEW_PRODUCT = {
+    "title": "Apple iPhone 15 funda de silicona",
+    "category_id": 1,
+    "seller_id": "TApple",
+    "brand": "Apple",
+    "description": "Funda para iPhone 15 Pro Max",
+    "price": {"amount": 99900, "currency": "COP"},
+    "stock": 5,
+    "accepted_payment_method_ids": [1, 2],
+    "images": ["/images/products/NEW001/1.jpg"],
+    "specifications": {"color": "Negro"},
+}
+
+
+ADMIN_TOKEN = "test-admin-token"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """
+    Serves the app from a private catalog provider, so updates do not leak into other tests,
+    to a client that sends the admin token.
+    """
+    provider = CatalogProvider(
+        Path("app/data"), on_publish=lambda repository: response_cache.publish(repository.version)
+    )
+    monkeypatch.setattr(products, "catalog", provider)
+    monkeypatch.setitem(app.dependency_overrides, get_repository, lambda: provider.repository)
+    monkeypatch.setattr(settings, "CATALOG_ADMIN_TOKEN", ADMIN_TOKEN)
+    return TestClient(app, headers={"Authorization": f"Bearer {ADMIN_TOKEN}"})
+
+
+def test_upsert_item_creates_then_replaces(client):
+    """
+    Tests that PUT /items/{id} creates a product (201), replaces it afterwards (200),
+    and that reads see the new data right away.
+    """
+    response = client.put("/api/v1/items/NEW001", json=NEW_PRODUCT)
+    assert response.status_code == 201
+    assert response.json()["id"] == "NEW001"
+    assert client.get("/api/v1/items/NEW001").json()["title"] == NEW_PRODUCT["title"]
+
+    response = client.put("/api/v1/items/NEW001", json={**NEW_PRODUCT, "stock": 0})
+    assert response.status_code == 200
+    assert client.get("/api/v1/items/NEW001").json()["stock"] == 0
+    assert "NEW001" in [p["id"] for p in client.get("/api/v1/items", params={"brand": "Apple"}).json()]
+
+
+def test_upsert_item_rejects_invalid_products(client):
+    """
+    Tests that unknown references are answered with 400 and malformed bodies with 422.
+    """
+    response = client.put("/api/v1/items/NEW001", json={**NEW_PRODUCT, "category_id": 999})
+    assert response.status_code == 400
+    assert client.put("/api/v1/items/NEW001", json={**NEW_PRODUCT, "stock": -1}).status_code == 422
+    assert client.get("/api/v1/items/NEW001").status_code == 404
+
+
+def test_add_item_review_updates_the_rating(client):
+    """
+    Tests that POST /items/{id}/reviews adds the review as the most recent one and refreshes the product's rating.
+    """
+    before = client.get("/api/v1/items/SMA001").json()
+    review = {"author": "Ana", "rating": 1, "comment": "Regular"}
+    response = client.post("/api/v1/items/SMA001/reviews", json=review)
+    assert response.status_code == 201
+    assert response.json() == review
+
+    after = client.get("/api/v1/items/SMA001").json()
+    assert after["reviews"] == [review] + before["reviews"]
+    assert after["review_count"] == before["review_count"] + 1
+    assert after["rating_histogram"]["1"] == before["rating_histogram"]["1"] + 1
+    assert after["average_rating"] < before["average_rating"]
+
+
+def test_add_item_review_not_found(client):
+    """
+    Tests that reviews for unknown products are answered with 404 and invalid ratings with 422.
+    """
+    review = {"author": "Ana", "rating": 5, "comment": "Bien"}
+    assert client.post("/api/v1/items/UNKNOWN/reviews", json=review).status_code == 404
+    assert client.post("/api/v1/items/SMA001/reviews", json={**review, "rating": 6}).status_code == 422
+
+
+def test_updates_keep_cached_responses_of_other_products(client):
+    """
+    Tests that a review only invalidates the cached responses showing the reviewed product:
+    other products' details are still served from the cache, the reviewed product's are rebuilt.
+    """
+    client.get("/api/v1/items/SMA002")
+    client.get("/api/v1/items/SMA001")
+    review = {"author": "Ana", "rating": 1, "comment": "Regular"}
+    assert client.post("/api/v1/items/SMA001/reviews", json=review).status_code == 201
+
+    hits_before = client.get("/cache/stats").json()["hits"]
+    client.get("/api/v1/items/SMA002")
+    assert client.get("/cache/stats").json()["hits"] == hits_before + 1
+    assert client.get("/api/v1/items/SMA001").json()["reviews"][0] == review
+    assert client.get("/cache/stats").json()["hits"] == hits_before + 1
+
+
+def test_updates_require_the_admin_token(client, monkeypatch):
+    """
+    Tests that updates without the admin token, or with another one, are rejected with 401 and leave the
+    catalog untouched, and that they are disabled (403) while no token is configured.
+    """
+    review = {"author": "Ana", "rating": 5, "comment": "Bien"}
+    anonymous = TestClient(app)
+    assert anonymous.put("/api/v1/items/NEW001", json=NEW_PRODUCT).status_code == 401
+    wrong = {"Authorization": "Bearer wrong-token"}
+    response = anonymous.post("/api/v1/items/SMA001/reviews", json=review, headers=wrong)
+    assert response.status_code == 401
+    assert response.headers["WWW-Authenticate"] == "Bearer"
+    assert client.get("/api/v1/items/NEW001").status_code == 404
+
+    monkeypatch.setattr(settings, "CATALOG_ADMIN_TOKEN", None)
+    assert client.put("/api/v1/items/NEW001", json=NEW_PRODUCT).status_code == 403
+    assert client.post("/api/v1/items/SMA001/reviews", json=review).status_code == 403
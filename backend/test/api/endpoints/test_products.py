@@ -1,14 +1,18 @@
 # backend/tests/api/endpoints/test_products.py
 
 from fastapi.testclient import TestClient
+from app.core.config import settings
 from app.main import app
 from app.api.endpoints.products import get_repository
+from app.dependencies import response_cache
 from app.repositories.product_repository import ProductRepository
 
 # --- Test Setup for Performance ---
 # A single, shared instance of the repository is created once to ensure
 # data files are read from disk only at the start of the test session.
 repository_instance = ProductRepository()
+# Published to the response cache like the snapshots of the catalog provider, so its responses are cached
+response_cache.publish(repository_instance.version)
 
 def get_repository_override():
     """Returns the shared repository instance for testing."""
@@ -29,7 +33,7 @@ def test_get_item_details_success():
     well-structured JSON payload, including the new 'description' and
     'related_products' fields.
     """
-    response = client.get("/api/v1/items/SMA001") # Apple iPhone 15
+    response = client.get("/api/v1/items/SMA001?include=related") # Apple iPhone 15
 
     # Assert that the request was successful
     assert response.status_code == 200
@@ -54,6 +58,20 @@ def test_get_item_details_success():
         assert related_product_data["category"]["id"] == data["category"]["id"]
 
 
+def test_get_item_details_without_related_by_default():
+    """
+    Tests that recommendations are only embedded in the detail when requested,
+    and that an unknown include option is rejected.
+    """
+    response = client.get("/api/v1/items/SMA001")
+    assert response.status_code == 200
+    assert response.json()["related_products"] == []
+
+    related = client.get("/api/v1/items/SMA001?include=related").json()["related_products"]
+    assert [p["id"] for p in related] == [p["id"] for p in client.get("/api/v1/items/SMA001/related").json()]
+    assert client.get("/api/v1/items/SMA001?include=reviews_v2").status_code == 400
+
+
 def test_get_item_details_not_found():
     """
     Tests the error path for the get_item_details endpoint.
@@ -64,6 +82,28 @@ def test_get_item_details_not_found():
     assert response.json()["detail"] == "Product with ID 'ID_DOES_NOT_EXIST' not found."
 
 
+def test_get_item_details_etag_revalidation():
+    """
+    Tests that detail responses carry a strong ETag and Cache-Control header,
+    and that a matching If-None-Match returns 304 Not Modified with an empty body.
+    """
+    response = client.get("/api/v1/items/SMA002")
+    etag = response.headers["ETag"]
+    assert etag.startswith('"')
+    assert "max-age" in response.headers["Cache-Control"]
+
+    hits_before = client.get("/cache/stats").json()["hits"]
+    not_modified = client.get("/api/v1/items/SMA002", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["ETag"] == etag
+    assert client.get("/cache/stats").json()["hits"] == hits_before + 1
+
+    changed = client.get("/api/v1/items/SMA002", headers={"If-None-Match": '"stale"'})
+    assert changed.status_code == 200
+    assert changed.json() == response.json()
+
+
 # --- Tests for the Product Listing & Filtering Endpoint ---
 
 def test_get_all_items_no_filter():
@@ -125,4 +165,199 @@ def test_get_all_items_filter_no_results():
     assert response.status_code == 200
     data = response.json()
     assert isinstance(data, list)
-    assert len(data) == 0
\ No newline at end of file
+    assert len(data) == 0
+
+
+# --- Tests for Pagination, Sorting and Projection ---
+
+def test_get_all_items_pagination_walks_every_product_once():
+    """
+    Tests that following the X-Next-Cursor header returns all products exactly once, in order.
+    """
+    all_ids = [p["id"] for p in client.get("/api/v1/items").json()]
+    page_ids, cursor = [], None
+    while True:
+        params = {"limit": 7, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/v1/items", params=params)
+        assert response.status_code == 200
+        assert len(response.json()) <= 7
+        page_ids += [p["id"] for p in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert page_ids == all_ids
+
+
+def test_get_all_items_sorted_by_price_with_pagination():
+    """
+    Tests that sorting is applied before paginating and that pages keep the sort order.
+    """
+    first = client.get("/api/v1/items?sort=price_desc&limit=5")
+    second = client.get(f"/api/v1/items?sort=price_desc&limit=5&cursor={first.headers['X-Next-Cursor']}")
+    amounts = [p["price"]["amount"] for p in first.json() + second.json()]
+    assert amounts == sorted(amounts, reverse=True)
+    all_amounts = sorted((p["price"]["amount"] for p in client.get("/api/v1/items").json()), reverse=True)
+    assert amounts == all_amounts[:10]
+
+
+def test_get_all_items_cursor_errors():
+    """
+    Tests that malformed cursors, or cursors used with another sort order, are rejected.
+    """
+    assert client.get("/api/v1/items?cursor=not-a-cursor").status_code == 400
+    cursor = client.get("/api/v1/items?sort=price_asc&limit=2").headers["X-Next-Cursor"]
+    assert client.get(f"/api/v1/items?sort=rating_desc&cursor={cursor}").status_code == 400
+    assert client.get("/api/v1/items?sort=unknown").status_code == 422
+
+
+def test_get_all_items_field_projection():
+    """
+    Tests that the fields parameter limits each product to the requested fields.
+    """
+    response = client.get("/api/v1/items?category=Muebles&fields=id,price")
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) > 0
+    assert all(set(p) == {"id", "price"} for p in data)
+    assert client.get("/api/v1/items?fields=id,password").status_code == 400
+
+
+def test_get_all_items_etag_revalidation():
+    """
+    Tests that listing pages carry an ETag that depends on the query parameters, and that a matching
+    If-None-Match returns 304 Not Modified with an empty body.
+    """
+    response = client.get("/api/v1/items?category=Muebles&limit=2")
+    etag = response.headers["ETag"]
+    assert "X-Next-Cursor" in response.headers
+    assert client.get("/api/v1/items?category=Muebles&limit=3").headers["ETag"] != etag
+
+    not_modified = client.get("/api/v1/items?category=Muebles&limit=2", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert client.get("/api/v1/items?category=Muebles&limit=2", headers={"If-None-Match": '"stale"'}).json() == response.json()
+
+# --- Tests for the Related Products Endpoint ---
+
+def test_get_related_items_success():
+    """
+    Tests that the related endpoint returns summaries of products from the same category.
+    """
+    response = client.get("/api/v1/items/SMA001/related")
+    assert response.status_code == 200
+    data = response.json()
+    assert isinstance(data, list)
+    assert len(data) > 0
+    assert all(p["id"].startswith("SMA") and p["id"] != "SMA001" for p in data)
+
+
+def test_get_related_items_not_found():
+    """
+    Tests that asking for recommendations of a non-existent product returns a 404 Not Found.
+    """
+    response = client.get("/api/v1/items/ID_DOES_NOT_EXIST/related")
+    assert response.status_code == 404
+
+
+def test_get_related_items_batch_matches_single_requests():
+    """
+    Tests that the batch endpoint returns, for every product, the same related products as the single endpoint,
+    and lists unknown IDs separately.
+    """
+    response = client.post("/api/v1/items/related:batch", json={"ids": ["SMA001", "MUE001", "ID_DOES_NOT_EXIST"]})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["not_found"] == ["ID_DOES_NOT_EXIST"]
+    assert set(data["results"]) == {"SMA001", "MUE001"}
+    for item_id in ("SMA001", "MUE001"):
+        assert data["results"][item_id] == client.get(f"/api/v1/items/{item_id}/related").json()
+
+
+def test_get_related_items_batch_validation():
+    """
+    Tests that empty and oversized batches are rejected.
+    """
+    assert client.post("/api/v1/items/related:batch", json={"ids": []}).status_code == 422
+    too_many = {"ids": [f"ID{i}" for i in range(settings.RELATED_BATCH_MAX_IDS + 1)]}
+    assert client.post("/api/v1/items/related:batch", json=too_many).status_code == 400
+
+
+# --- Tests for the Metrics Endpoint ---
+
+def test_metrics_endpoint_reports_routes_and_stages():
+    """
+    Tests that /metrics exposes, in the Prometheus text format, the latency of requests by route template,
+    the stages of the item detail and the cache, executor and catalog gauges.
+    """
+    client.get("/api/v1/items/SMA002?include=related")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/v1/items/{item_id}",status="200"}' in text
+    assert 'request_stage_duration_seconds_count{stage="repository.lookup"}' in text
+    assert 'request_stage_duration_seconds_count{stage="recommender.recommend"}' in text
+    assert "response_cache_hit_ratio" in text
+    assert "executor_queue_depth 0" in text
+    assert 'catalog_snapshot_records{table="products"}' in text
+
+
+# --- Tests for the Search Endpoint ---
+
+def test_search_items_typeahead_with_facets():
+    """
+    Tests that a partial, unaccented query finds the products, with facets and ETag revalidation.
+    """
+    response = client.get("/api/v1/items/search", params={"q": "IPHO", "limit": 2})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] >= 2 and len(data["items"]) == 2
+    assert all("iPhone" in item["title"] for item in data["items"])
+    assert data["facets"]["brands"][0]["name"] == "Apple"
+    assert data["facets"]["categories"][0].keys() == {"id", "name", "count"}
+
+    revalidated = client.get(
+        "/api/v1/items/search", params={"q": "IPHO", "limit": 2}, headers={"If-None-Match": response.headers["etag"]}
+    )
+    assert revalidated.status_code == 304
+
+
+def test_search_items_filters_and_validation():
+    """
+    Tests the brand filter, queries without matches and rejected parameters.
+    """
+    data = client.get("/api/v1/items/search", params={"q": "a", "brand": "Apple"}).json()
+    assert data["total"] == len(data["items"]) > 0
+    assert all(item["id"] in {p["id"] for p in client.get("/api/v1/items?brand=Apple").json()} for item in data["items"])
+    assert client.get("/api/v1/items/search", params={"q": "zzzzqqq"}).json()["total"] == 0
+    assert client.get("/api/v1/items/search").status_code == 422
+    assert client.get("/api/v1/items/search", params={"q": "a", "limit": settings.ITEMS_MAX_PAGE_SIZE + 1}).status_code == 422
+
+
+# --- Tests for the Product Reviews Endpoint ---
+
+def test_get_item_reviews_paginates_with_cursors():
+    """
+    Tests that /items/{id}/reviews pages through every review in the requested order, continuing from the
+    cursor embedded in the item detail, and that unknown products and malformed cursors are rejected.
+    """
+    detail = client.get("/api/v1/items/SMA001").json()
+    assert detail["review_count"] == len(detail["reviews"]) > 1
+
+    params = {"sort": "rating_desc", "limit": 1}
+    reviews = []
+    while True:
+        response = client.get("/api/v1/items/SMA001/reviews", params=params)
+        assert response.status_code == 200
+        reviews += response.json()
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+    assert [review["rating"] for review in reviews] == sorted((review["rating"] for review in detail["reviews"]), reverse=True)
+    assert client.get("/api/v1/items/SMA001/reviews").json() == detail["reviews"]
+
+    assert client.get("/api/v1/items/ID_DOES_NOT_EXIST/reviews").status_code == 404
+    assert client.get("/api/v1/items/SMA001/reviews?cursor=not-a-cursor").status_code == 400
+    assert client.get("/api/v1/items/SMA001/reviews?sort=oldest").status_code == 422
@@ -0,0 +1,8 @@
+# backend/test/conftest.py
+import os
+import tempfile
+from pathlib import Path
+
+# Rate limit counters persist in a file shared by every process of the host. Each test session gets its own
+# file, set before the application settings are loaded, so limits are not carried over between runs.
+os.environ["RATE_LIMIT_STORAGE_URI"] = f"sqlite:///{Path(tempfile.mkdtemp()) / 'rate-limits.sqlite3'}"
@@ -0,0 +1,54 @@
+# backend/test/core/test_metrics.py
+
+from app.core.metrics import Registry, span, stage_duration
+
+
+def test_histogram_buckets_are_cumulative():
+    """
+    Tests that a histogram renders cumulative bucket counts, its sum and its count per label values.
+    """
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value, "/items")
+
+    text = registry.render()
+
+    assert "# TYPE latency_seconds histogram" in text
+    assert 'latency_seconds_bucket{route="/items",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/items",le="1.0"} 3' in text
+    assert 'latency_seconds_bucket{route="/items",le="+Inf"} 4' in text
+    assert 'latency_seconds_sum{route="/items"} 4.25' in text
+    assert 'latency_seconds_count{route="/items"} 4' in text
+
+
+def test_sampled_metrics_and_label_escaping():
+    """
+    Tests that sampled metrics are read from their callback at render time, and that label values are escaped.
+    """
+    registry = Registry()
+    depth = [3]
+    registry.sampled("queue_depth", "Waiting calls.", lambda: depth[0])
+    registry.sampled("records", "Records.", lambda: {('say "hi"',): 2}, ("table",))
+
+    depth[0] = 5
+    text = registry.render()
+
+    assert "# TYPE queue_depth gauge" in text
+    assert "queue_depth 5" in text
+    assert 'records{table="say \\"hi\\""} 2' in text
+
+
+def test_span_records_stage_duration():
+    """
+    Tests that a timing span adds an observation to the stage histogram, even when the block raises.
+    """
+    before = stage_duration.count("test.stage")
+    with span("test.stage"):
+        pass
+    try:
+        with span("test.stage"):
+            raise ValueError
+    except ValueError:
+        pass
+    assert stage_duration.count("test.stage") == before + 2
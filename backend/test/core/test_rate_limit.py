@@ -0,0 +1,119 @@
+# backend/test/core/test_rate_limit.py
+
+import multiprocessing
+
+import pytest
+from limits import parse
+from limits.errors import ConfigurationError
+from limits.storage import storage_from_string
+from limits.strategies import SlidingWindowCounterRateLimiter
+
+from app.core.rate_limit import SQLiteStorage
+
+
+class FakeClock:
+    """Manually advanced clock to test expiration."""
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_storage(tmp_path, **options):
+    return SQLiteStorage(f"sqlite:///{tmp_path / 'limits.sqlite3'}", **options)
+
+
+def test_registered_for_sqlite_uris(tmp_path):
+    """
+    Tests that the storage is built from a sqlite:// URI, as slowapi does from the settings.
+    """
+    storage = storage_from_string(f"sqlite:///{tmp_path / 'limits.sqlite3'}")
+    assert isinstance(storage, SQLiteStorage)
+    assert storage.check()
+    with pytest.raises(ConfigurationError):
+        storage_from_string("sqlite://")
+
+
+def test_fixed_window_counters_expire(tmp_path):
+    """
+    Tests that a counter starts a new window once its expiry has passed.
+    """
+    clock = FakeClock()
+    storage = make_storage(tmp_path, clock=clock)
+
+    assert storage.incr("client", 60) == 1
+    assert storage.incr("client", 60, amount=2) == 3
+    assert storage.get("client") == 3
+    assert storage.get_expiry("client") == clock.now + 60
+
+    clock.now += 61
+    assert storage.get("client") == 0
+    assert storage.incr("client", 60) == 1
+
+
+def test_sliding_window_limit(tmp_path):
+    """
+    Tests the sliding window strategy: the limit holds within a window, and the previous window's hits
+    still count, weighted by how much of it the sliding window covers.
+    """
+    clock = FakeClock(now=6_000.0)  # start of a one-minute window
+    limiter = SlidingWindowCounterRateLimiter(make_storage(tmp_path, clock=clock))
+    limit = parse("10/minute")
+
+    assert all(limiter.hit(limit, "client") for _ in range(10))
+    assert not limiter.hit(limit, "client")
+    assert limiter.hit(limit, "other-client")
+
+    # Half way through the next window, half of the previous window's 10 hits still count
+    clock.now += 90
+    assert all(limiter.hit(limit, "client") for _ in range(5))
+    assert not limiter.hit(limit, "client")
+
+    limiter.clear(limit, "client")
+    assert limiter.hit(limit, "client")
+
+
+def test_expired_counters_are_evicted(tmp_path):
+    """
+    Tests that counters are deleted from the file once expired, on the next write after the eviction interval.
+    """
+    clock = FakeClock()
+    storage = make_storage(tmp_path, clock=clock, eviction_interval=30)
+    for address in range(100):
+        storage.incr(f"client-{address}", 10)
+    storage.incr("recent", 120)
+
+    clock.now += 20
+    storage.incr("recent", 120)  # within the eviction interval of the first write: nothing evicted yet
+    rows = storage._connection().execute("SELECT COUNT(*) FROM counters").fetchone()[0]
+    assert rows == 101
+
+    clock.now += 20
+    storage.incr("recent", 120)
+    rows = storage._connection().execute("SELECT COUNT(*) FROM counters").fetchone()[0]
+    assert rows == 1
+    assert storage.get("recent") == 3
+
+    clock.now += 200
+    assert storage.evict_expired() == 1
+
+
+def _hit_many(args):
+    path, hits = args
+    limiter = SlidingWindowCounterRateLimiter(SQLiteStorage(f"sqlite:///{path}"))
+    # A window of a day, so that the test is very unlikely to cross the boundary between two windows
+    limit = parse("50/day")
+    return sum(limiter.hit(limit, "shared-client") for _ in range(hits))
+
+
+def test_limit_is_enforced_across_processes(tmp_path):
+    """
+    Tests that worker processes sharing the storage file enforce a single limit between them: four processes
+    each trying 40 hits of a 50/day limit are granted exactly 50 in total, not 50 each.
+    """
+    path = tmp_path / "limits.sqlite3"
+    with multiprocessing.get_context("spawn").Pool(4) as pool:
+        granted = pool.map(_hit_many, [(path, 40)] * 4)
+
+    assert sum(granted) == 50
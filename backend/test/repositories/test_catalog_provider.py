@@ -0,0 +1,87 @@
+# backend/test/repositories/test_catalog_provider.py
+
+import json
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from app.repositories.catalog_provider import CatalogProvider
+
+DATA_PATH = Path("app/data")
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    """Copies the sample catalog to a temporary directory that tests can modify."""
+    for file_path in DATA_PATH.glob("*.json"):
+        shutil.copy(file_path, tmp_path / file_path.name)
+    return tmp_path
+
+
+def test_repository_is_loaded_once_and_shared(data_path):
+    """
+    Tests that repeated accesses return the same snapshot instead of reparsing the files.
+    """
+    provider = CatalogProvider(data_path)
+    first = provider.repository
+    assert provider.repository is first
+    assert provider.reload_if_changed() is False
+    assert provider.repository is first
+
+
+def test_snapshot_is_swapped_when_files_change(data_path):
+    """
+    Tests that modifying a data file publishes a new snapshot, while requests holding
+    the old snapshot keep reading consistent data.
+    """
+    provider = CatalogProvider(data_path)
+    old_snapshot = provider.repository
+
+    products_file = data_path / "products.json"
+    products = json.loads(products_file.read_text(encoding="utf-8"))
+    products[0]["title"] = "Título actualizado"
+    products_file.write_text(json.dumps(products), encoding="utf-8")
+    # Make sure the mtime changes even on filesystems with coarse timestamps
+    stat = products_file.stat()
+    os.utime(products_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert provider.reload_if_changed() is True
+    new_snapshot = provider.repository
+    assert new_snapshot is not old_snapshot
+    assert new_snapshot.products_df.iloc[0]["title"] == "Título actualizado"
+    assert old_snapshot.products_df.iloc[0]["title"] != "Título actualizado"
+
+
+def test_failed_reload_keeps_current_snapshot(data_path):
+    """
+    Tests that a broken data file does not replace the current snapshot.
+    """
+    provider = CatalogProvider(data_path)
+    snapshot = provider.repository
+
+    (data_path / "reviews.json").write_text("[{ not json", encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        provider.reload_if_changed()
+    assert provider.repository is snapshot
+
+
+def test_every_published_snapshot_is_reported(data_path):
+    """
+    Tests that on_publish is called with each snapshot once it is the current one, for loads and in-memory
+    updates alike, and not for a failed reload.
+    """
+    published = []
+    provider = CatalogProvider(data_path, on_publish=published.append)
+    first = provider.repository
+    updated = provider.apply(lambda repository: repository.with_reviews(
+        [{"product_id": first.products_df['id'].iat[0], "author": "Ana", "rating": 5, "comment": "Muy bueno"}]
+    ))
+    (data_path / "reviews.json").write_text("[{ not json", encoding="utf-8")
+    with pytest.raises(ValueError):
+        provider.reload_if_changed()
+
+    assert published == [first, updated]
+    assert provider.repository is updated
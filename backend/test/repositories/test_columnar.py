@@ -0,0 +1,169 @@
+# backend/test/repositories/test_columnar.py
+
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.repositories import columnar
+from app.repositories.catalog_provider import CatalogProvider
+from app.repositories.product_repository import ProductRepository
+
+DATA_PATH = Path("app/data")
+
+
+@pytest.fixture
+def compiled_path(tmp_path):
+    return columnar.compile_catalog(DATA_PATH, tmp_path / "compiled")
+
+
+def is_memory_mapped(array):
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = getattr(array, "base", None)
+    return False
+
+
+def test_compiled_catalog_serves_the_same_data(compiled_path):
+    """
+    Tests that a repository loaded from the compiled catalog answers like one loaded from the JSON files.
+    """
+    from_json = ProductRepository(DATA_PATH)
+    from_compiled = ProductRepository.from_compiled(compiled_path)
+
+    for product_id in from_json.products_df["id"]:
+        assert from_compiled.find_product_details_by_id(product_id) == from_json.find_product_details_by_id(product_id)
+    assert from_compiled.find_all_products(category="Muebles") == from_json.find_all_products(category="Muebles")
+
+
+def test_numeric_columns_are_memory_mapped(compiled_path):
+    """
+    Tests that numeric columns, prices, typed specifications and list offsets included, are read-only memory maps
+    of the compiled files rather than private copies, both when loaded and in the tables the repository serves.
+    """
+    frames = columnar.load_catalog(compiled_path)
+    assert is_memory_mapped(frames["products_df"]["stock"].to_numpy())
+    assert is_memory_mapped(frames["products_df"]["category_id"].to_numpy())
+    assert not frames["products_df"]["stock"].to_numpy().flags.writeable
+
+    repository = ProductRepository.from_compiled(compiled_path)
+    for column in ("stock", "category_id", "price.amount", "specifications.screen_size"):
+        assert is_memory_mapped(repository.products_df[column].to_numpy())
+    assert is_memory_mapped(repository.products_df["specifications.units_per_package"].array._data)
+    assert is_memory_mapped(repository.product_lists["images"].offsets)
+    assert is_memory_mapped(repository.product_lists["accepted_payment_method_ids"].values)
+    assert is_memory_mapped(repository.reviews_df["rating"].to_numpy())
+
+
+def test_products_are_stored_without_json(compiled_path):
+    """
+    Tests that prices, specifications and lists are stored as typed columns, leaving JSON documents only for the
+    attributes without a fixed shape, so loading the products parses no JSON but theirs.
+    """
+    manifest = json.loads((compiled_path / columnar.MANIFEST_FILE).read_text(encoding="utf-8"))
+    products = manifest["tables"]["products"]
+    kinds = {column["name"]: column["kind"] for column in products["columns"]}
+    assert [name for name, kind in kinds.items() if kind == "json"] == ["specifications.dimensions"]
+    assert kinds["price.amount"] == "numeric" and kinds["price.currency"] == "string"
+    assert kinds["specifications.requires_assembly"] == "nullable"
+    assert {column["name"]: column["values"]["kind"] for column in products["lists"]} == {
+        "images": "string", "accepted_payment_method_ids": "numeric"
+    }
+
+
+def test_rebuilds_are_published_atomically(compiled_path):
+    """
+    Tests that the compiled path is a link swapped to each new build, that a load reads the build the path
+    pointed to when it started, and that only the current and previous builds are kept.
+    """
+    first_build = columnar.resolve_build(compiled_path)
+    assert compiled_path.is_symlink()
+
+    columnar.compile_catalog(DATA_PATH, compiled_path)
+    second_build = columnar.resolve_build(compiled_path)
+    assert second_build != first_build
+    # A process that resolved the first build before the swap can still load it whole
+    assert len(columnar.load_catalog(first_build)["products_df"]) == len(columnar.load_catalog(compiled_path)["products_df"])
+
+    columnar.compile_catalog(DATA_PATH, compiled_path)
+    assert not first_build.exists()
+    assert second_build.exists()
+    assert sorted(path.name for path in compiled_path.parent.iterdir()) == sorted(
+        [compiled_path.name, second_build.name, columnar.resolve_build(compiled_path).name]
+    )
+
+
+def test_catalogs_compiled_into_a_plain_directory_are_replaced(tmp_path):
+    """
+    Tests that a catalog compiled before builds were versioned (a plain directory) is replaced by a linked build.
+    """
+    legacy = tmp_path / "compiled"
+    legacy.mkdir()
+    (legacy / columnar.MANIFEST_FILE).write_text("{}", encoding="utf-8")
+
+    columnar.compile_catalog(DATA_PATH, legacy)
+    assert legacy.is_symlink()
+    assert ProductRepository.from_compiled(legacy).has_product("SMA001")
+
+
+def test_provider_prefers_compiled_catalog_and_reloads_on_rebuild(compiled_path):
+    """
+    Tests that the provider loads the compiled catalog when present and picks up a rebuilt one.
+    """
+    provider = CatalogProvider(DATA_PATH, compiled_path=compiled_path)
+    snapshot = provider.repository
+    assert snapshot.data_path == compiled_path
+    assert provider.reload_if_changed() is False
+
+    columnar.compile_catalog(DATA_PATH, compiled_path)
+    assert provider.reload_if_changed() is True
+    assert provider.repository is not snapshot
+
+
+def test_missing_compiled_catalog_falls_back_to_json(tmp_path):
+    """
+    Tests that the JSON files are used while no compiled catalog has been built.
+    """
+    provider = CatalogProvider(DATA_PATH, compiled_path=tmp_path / "missing")
+    assert provider.repository.data_path == DATA_PATH
+    with pytest.raises(RuntimeError):
+        columnar.load_catalog(tmp_path / "missing")
+
+
+def test_provider_loads_data_files_newer_than_the_compiled_catalog(tmp_path, caplog):
+    """
+    Tests that once the data files change, the provider reloads them instead of the stale compiled catalog,
+    warning about it, and goes back to the compiled catalog when it is built again from them.
+    """
+    data_path = tmp_path / "data"
+    data_path.mkdir()
+    for file_path in DATA_PATH.glob("*.json"):
+        shutil.copy(file_path, data_path / file_path.name)
+    compiled_path = columnar.compile_catalog(data_path, tmp_path / "compiled")
+    provider = CatalogProvider(data_path, compiled_path=compiled_path)
+    assert provider.repository.data_path == compiled_path
+
+    products_file = data_path / "products.json"
+    products = json.loads(products_file.read_text(encoding="utf-8"))
+    products[0]["title"] = "Título actualizado"
+    products_file.write_text(json.dumps(products), encoding="utf-8")
+    # Make sure the mtime changes even on filesystems with coarse timestamps
+    stat = products_file.stat()
+    os.utime(products_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    with caplog.at_level(logging.WARNING):
+        assert provider.reload_if_changed() is True
+    assert provider.repository.data_path == data_path
+    assert provider.repository.products_df.iloc[0]["title"] == "Título actualizado"
+    assert "was not compiled from the current data files" in caplog.text
+    assert provider.reload_if_changed() is False
+
+    columnar.compile_catalog(data_path, compiled_path)
+    assert provider.reload_if_changed() is True
+    assert provider.repository.data_path == compiled_path
+    assert provider.repository.products_df.iloc[0]["title"] == "Título actualizado"
@@ -0,0 +1,90 @@
+# backend/test/repositories/test_ingestion.py
+
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from pydantic import ValidationError
+
+from app.repositories.catalog_provider import CatalogProvider
+from app.repositories.ingestion import CatalogIngestion, read_records, table_path
+from app.repositories.product_repository import ProductRepository, catalog_signature
+
+DATA_PATH = Path("app/data")
+
+
+@pytest.fixture
+def ndjson_path(tmp_path):
+    """Copies the sample catalog to a temporary directory, with products and reviews as newline-delimited JSON."""
+    for file_path in DATA_PATH.glob("*.json"):
+        if file_path.stem in ("products", "reviews"):
+            pd.read_json(file_path).to_json(tmp_path / f"{file_path.stem}.ndjson", orient="records", lines=True)
+        else:
+            shutil.copy(file_path, tmp_path / file_path.name)
+    return tmp_path
+
+
+def test_ndjson_is_read_in_chunks(ndjson_path):
+    """
+    Tests that NDJSON files are preferred over JSON ones and streamed in chunks of the requested size.
+    """
+    path = table_path(ndjson_path, "reviews")
+    assert path.name == "reviews.ndjson"
+    chunks = list(read_records(path, chunk_size=4))
+    expected = pd.read_json(DATA_PATH / "reviews.json")
+    assert all(len(chunk) <= 4 for chunk in chunks)
+    assert sum(len(chunk) for chunk in chunks) == len(expected)
+    assert table_path(ndjson_path, "categories").name == "categories.json"
+
+
+def test_streamed_catalog_matches_json_catalog(ndjson_path):
+    """
+    Tests that a catalog streamed from NDJSON in small chunks serves the same data as one read from JSON,
+    including the aggregates built while reading (ratings, category membership, recommendations).
+    """
+    streamed = ProductRepository(ndjson_path, chunk_size=3)
+    expected = ProductRepository(DATA_PATH)
+
+    for product_id in expected.products_df["id"]:
+        assert streamed.find_product_details_by_id(product_id) == expected.find_product_details_by_id(product_id)
+    assert streamed.find_all_products() == expected.find_all_products()
+    for category in expected.categories_df["name"]:
+        assert streamed.find_all_products(category=category) == expected.find_all_products(category=category)
+
+
+def test_signature_tracks_ndjson_files(ndjson_path):
+    """
+    Tests that the catalog signature covers the NDJSON files, so rewriting them triggers a reload.
+    """
+    names = [name for name, _, _ in catalog_signature(ndjson_path)]
+    assert "products.ndjson" in names and "reviews.ndjson" in names
+
+    provider = CatalogProvider(ndjson_path, chunk_size=5)
+    old_snapshot = provider.repository
+    with open(ndjson_path / "reviews.ndjson", "a", encoding="utf-8") as reviews_file:
+        reviews_file.write('{"id": 9999, "product_id": "SMA001", "author": "New", "rating": 1, "comment": "Bad"}\n')
+    assert provider.reload_if_changed() is True
+    assert provider.repository.review_stats.get("SMA001").count == old_snapshot.review_stats.get("SMA001").count + 1
+
+
+def test_chunks_are_validated_as_they_are_added():
+    """
+    Tests that each chunk is validated when it is added, before the next one is read, and that reviews are
+    accumulated as columns grouped by product rather than as one record per review.
+    """
+    reviews_df = pd.read_json(DATA_PATH / "reviews.json")
+    ingestion = CatalogIngestion()
+    ingestion.add_reviews(reviews_df.iloc[5:])
+    ingestion.add_reviews(reviews_df.iloc[:5])
+    with pytest.raises(ValidationError):
+        ingestion.add_reviews(reviews_df.iloc[:5].assign(comment=None))
+
+    grouped = ingestion.reviews_df()
+    assert len(grouped) == len(reviews_df)
+    assert grouped["product_id"].is_monotonic_increasing
+    assert grouped["rating"].dtype == "int64"
+    # Within a product, reviews keep the order in which their chunks were added
+    arrival_order = pd.concat([reviews_df.iloc[5:], reviews_df.iloc[:5]])
+    expected = arrival_order[arrival_order["product_id"] == "SMA001"]["comment"].tolist()
+    assert grouped[grouped["product_id"] == "SMA001"]["comment"].tolist() == expected
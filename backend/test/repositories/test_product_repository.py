@@ -0,0 +1,404 @@
+# backend/test/repositories/test_product_repository.py
+
+import orjson
+import pandas as pd
+import pytest
+from pydantic import ValidationError
+
+from app.core.serialization import dumps
+from app.models.product import Price, ProductDetail, ProductSpecifications, ProductSummary
+from app.repositories.listing import InvalidCursorError
+from app.repositories.product_repository import CatalogUpdateError, ProductRepository
+from app.repositories.review_stats import InvalidRatingError
+from app.services.images import ImageVariants
+from app.services.recommender import ApproximateSearch, RecommenderOptions
+
+repository = ProductRepository()
+reviews_df = pd.read_json("app/data/reviews.json")
+products_json = pd.read_json("app/data/products.json").set_index("id")
+
+
+def test_details_match_full_scans():
+    """
+    Tests that index-based lookups return the same data as scanning the DataFrames,
+    with the reviews most recent (last in the file) first, and that the nested fields assembled from the flat
+    columns match the records of the data file.
+    """
+    for product_id in repository.products_df["id"]:
+        details = repository.find_product_details_by_id(product_id)
+        expected_reviews = reviews_df[reviews_df["product_id"] == product_id][["author", "rating", "comment"]]
+        assert details["id"] == product_id
+        assert details["reviews"] == expected_reviews.iloc[::-1].to_dict("records")
+        assert details["review_count"] == len(expected_reviews)
+        assert details["reviews_next_cursor"] is None
+        assert sum(details["rating_histogram"].values()) == len(expected_reviews)
+        assert details["seller"]["id"] == repository.products_df.set_index("id").loc[product_id, "seller_id"]
+        assert [method["id"] for method in details["accepted_payment_methods"]] == \
+            products_json.loc[product_id, "accepted_payment_method_ids"]
+        assert details["images"] == products_json.loc[product_id, "images"]
+        assert details["price"] == Price.model_validate(products_json.loc[product_id, "price"]).model_dump()
+        assert details["specifications"] == \
+            ProductSpecifications.model_validate(products_json.loc[product_id, "specifications"]).model_dump()
+
+
+def test_find_products_by_ids_skips_unknown_ids():
+    """
+    Tests that summaries are returned in catalog order and unknown IDs are ignored.
+    """
+    summaries = repository.find_products_by_ids(["SMA002", "ID_DOES_NOT_EXIST", "SMA001", "SMA002"])
+    assert [summary["id"] for summary in summaries] == ["SMA001", "SMA002"]
+    assert repository.find_products_by_ids(["ID_DOES_NOT_EXIST"]) == []
+
+
+def test_has_product():
+    """
+    Tests the ID index membership check.
+    """
+    assert repository.has_product("SMA001")
+    assert not repository.has_product("ID_DOES_NOT_EXIST")
+
+
+def test_listing_filters_match_dataframe_filters():
+    """
+    Tests every category/brand combination of the columnar listing against plain DataFrame filtering.
+    """
+    products_df = repository.products_df
+    categories = {row.name: row.Index for row in repository.categories_df.itertuples()}
+    for category in [None, *categories, "Categoría inexistente"]:
+        for brand in [None, *products_df["brand"].unique(), "Marca inexistente"]:
+            expected = products_df
+            if brand:
+                expected = expected[expected["brand"] == brand]
+            if category:
+                expected = expected[expected["category_id"] == categories.get(category)]
+            summaries = repository.find_all_products(category=category, brand=brand)
+            assert [summary["id"] for summary in summaries] == expected["id"].tolist()
+
+
+def test_listing_summary_fields():
+    """
+    Tests that summaries built from the column arrays carry the product's data and average rating.
+    """
+    summary = repository.find_all_products(brand="Apple")[0]
+    assert summary == {
+        "id": "SMA001",
+        "title": repository.products_df.iloc[0]["title"],
+        "price": Price.model_validate(products_json.loc["SMA001", "price"]).model_dump(),
+        "image": "/images/products/SMA001/1.jpg",
+        "average_rating": repository.review_stats.average_rating("SMA001"),
+    }
+
+
+def test_fast_serialization_matches_response_models():
+    """
+    Tests that encoding the prevalidated catalog data directly produces the same JSON
+    as validating it against the response models.
+    """
+    for product_id in repository.products_df["id"]:
+        details = repository.find_product_details_by_id(product_id)
+        assert orjson.loads(dumps(details)) == ProductDetail.model_validate(details).model_dump(mode="json")
+    summaries = repository.find_all_products()
+    assert orjson.loads(dumps(summaries)) == [ProductSummary.model_validate(s).model_dump(mode="json") for s in summaries]
+
+
+def test_invalid_catalog_records_are_rejected_at_load():
+    """
+    Tests that malformed records fail when the catalog is loaded rather than when they are served.
+    """
+    catalog = {
+        "products_df": pd.read_json("app/data/products.json"),
+        "categories_df": pd.read_json("app/data/categories.json"),
+        "sellers_df": pd.read_json("app/data/sellers.json"),
+        "reviews_df": reviews_df.assign(author=None),
+        "payment_methods_df": pd.read_json("app/data/payment_methods.json"),
+    }
+    with pytest.raises(ValidationError):
+        ProductRepository.from_dataframes(**catalog)
+    # Ratings are checked while they are aggregated, before the records are validated
+    for rating in ("excelente", 6):
+        with pytest.raises(InvalidRatingError):
+            ProductRepository.from_dataframes(**{**catalog, "reviews_df": reviews_df.assign(rating=rating)})
+
+
+def new_product(**fields):
+    """Returns a product record with the fields of products.json, overridden by the given ones."""
+    record = {
+        "id": "NEW001",
+        "title": "Apple iPhone 15 funda de silicona",
+        "category_id": 1,
+        "seller_id": "TApple",
+        "brand": "Apple",
+        "description": "Funda para iPhone 15 Pro Max",
+        "price": {"amount": 99900, "currency": "COP"},
+        "stock": 5,
+        "sku": None,
+        "accepted_payment_method_ids": [1],
+        "images": ["/images/products/NEW001/1.jpg"],
+        "specifications": {"color": "Negro"},
+    }
+    record.update(fields)
+    return record
+
+
+def test_with_products_inserts_and_replaces_without_touching_the_snapshot():
+    """
+    Tests that upserts publish the product in a new snapshot (details, listing, filters, recommendations)
+    while the original snapshot keeps serving the previous data.
+    """
+    base = ProductRepository()
+    base.recommendation_index.warm()
+    updated = base.with_products([new_product()])
+    updated.recommendation_index.warm()
+
+    assert updated.version != base.version
+    assert not base.has_product("NEW001") and updated.has_product("NEW001")
+    assert updated.find_product_details_by_id("NEW001")["specifications"]["color"] == "Negro"
+    assert [p["id"] for p in updated.find_all_products(brand="Apple")][-1] == "NEW001"
+    assert "NEW001" in updated.recommendation_index.recommend("SMA001", top_n=30)
+    assert len(updated.listing) == len(base.listing) + 1
+
+    replaced = updated.with_products([new_product(id="SMA001", category_id=2, price={"amount": 1, "currency": "COP"})])
+    category_1 = base.categories_df.loc[1, "name"]
+    category_2 = base.categories_df.loc[2, "name"]
+    assert "SMA001" not in [p["id"] for p in replaced.find_all_products(category=category_1)]
+    assert "SMA001" in [p["id"] for p in replaced.find_all_products(category=category_2)]
+    assert replaced.find_products_by_ids(["SMA001"])[0]["price"]["amount"] == 1
+    assert base.find_products_by_ids(["SMA001"])[0]["price"]["amount"] == 5999900
+    assert "SMA001" in [p["id"] for p in base.find_all_products(category=category_1)]
+
+
+def test_updated_products_are_served_from_typed_columns():
+    """
+    Tests that upserted records are written to the flat columns without changing their types, and that their
+    prices, specifications, images and payment methods are served as given while the original snapshot keeps its own.
+    """
+    base = ProductRepository()
+    specifications = {"screen_size": 6.1, "requires_assembly": False, "units_per_package": 2, "dimensions": {"height": "1 cm"}}
+    updated = base.with_products([
+        new_product(images=["/a.jpg", "/b.jpg"], accepted_payment_method_ids=[1, 2], specifications=specifications),
+        new_product(id="SMA001", images=[], accepted_payment_method_ids=[]),
+    ])
+
+    details = updated.find_product_details_by_id("NEW001", include_related=False)
+    assert details["images"] == ["/a.jpg", "/b.jpg"]
+    assert [method["id"] for method in details["accepted_payment_methods"]] == [1, 2]
+    assert details["price"] == {"amount": 99900.0, "currency": "COP"}
+    assert details["specifications"] == ProductSpecifications.model_validate(specifications).model_dump()
+    assert updated.find_product_details_by_id("SMA001", include_related=False)["images"] == []
+    assert updated.find_products_by_ids(["SMA001"])[0]["image"] == ""
+    assert base.find_product_details_by_id("SMA001", include_related=False)["images"] == ["/images/products/SMA001/1.jpg"]
+    assert updated.products_df.dtypes.equals(base.products_df.dtypes)
+
+
+def test_with_products_updates_only_the_affected_categories():
+    """
+    Tests that an update keeps the fitted recommendation models of the categories it does not touch
+    and updates the affected one without changing the original snapshot's model.
+    """
+    base = ProductRepository()
+    base.recommendation_index.warm()
+    updated = base.with_products([new_product(category_id=1)])
+    for category_id, category_index in base.recommendation_index._categories.items():
+        if category_id == 1:
+            assert updated.recommendation_index._categories[category_id] is not category_index
+            assert "NEW001" not in category_index.positions
+        else:
+            assert updated.recommendation_index._categories[category_id] is category_index
+
+
+def test_approximate_cross_category_recommendations_follow_updates():
+    """
+    Tests that with the approximate backend across categories, upserted products are recommended for products of
+    any category and a product moved to another category stays in the single cross-category model.
+    """
+    options = RecommenderOptions(approximate=ApproximateSearch(n_lists=4, n_probe=4), cross_category=True)
+    base = ProductRepository(recommender_options=options)
+    base.recommendation_index.warm()
+    updated = base.with_products([new_product(), new_product(id="SMA002", category_id=3)])
+
+    everything = len(base.products_df)
+    assert "NEW001" in updated.recommendation_index.recommend("SMA001", top_n=everything)
+    assert "NEW001" in updated.recommendation_index.recommend("PAP001", top_n=everything)
+    assert "SMA002" in updated.recommendation_index.recommend("PAP001", top_n=everything)
+    assert len(updated.recommendation_index.recommend("SMA001", top_n=everything + 10)) == everything
+    assert "NEW001" not in base.recommendation_index.recommend("SMA001", top_n=everything)
+
+
+def test_with_reviews_updates_ratings_incrementally():
+    """
+    Tests that added reviews show up in the details and in the aggregated and listed ratings of the new snapshot only.
+    """
+    base = ProductRepository()
+    updated = base.with_reviews([{"product_id": "SMA001", "author": "Ana", "rating": 1, "comment": "Regular"}])
+
+    summary = updated.review_stats.get("SMA001")
+    assert summary.count == base.review_stats.get("SMA001").count + 1
+    assert updated.find_product_details_by_id("SMA001")["reviews"][0] == {"author": "Ana", "rating": 1, "comment": "Regular"}
+    assert updated.find_products_by_ids(["SMA001"])[0]["average_rating"] == round(summary.mean, 2)
+    assert len(base.find_product_details_by_id("SMA001")["reviews"]) == base.review_stats.get("SMA001").count
+    assert base.find_products_by_ids(["SMA001"])[0]["average_rating"] == base.review_stats.average_rating("SMA001")
+
+
+def test_changed_since_reports_the_responses_each_update_changes():
+    """
+    Tests that derived snapshots report the products and categories changed since an earlier version,
+    and that unrelated snapshots report nothing is known.
+    """
+    base = ProductRepository()
+    sma001_category = int(base.products_df.loc[base.products_df["id"] == "SMA001", "category_id"].iloc[0])
+    reviewed = base.with_reviews([{"product_id": "SMA001", "author": "Ana", "rating": 5, "comment": "Bien"}])
+    moved = reviewed.with_products([new_product(id="SMA001", category_id=3)])
+
+    assert reviewed.changed_since(reviewed.version) == frozenset()
+    assert reviewed.changed_since(base.version) == {"catalog", "product:SMA001", f"category:{sma001_category}"}
+    assert moved.changed_since(base.version) == {"catalog", "product:SMA001", f"category:{sma001_category}", "category:3"}
+    assert base.changed_since(moved.version) is None
+    assert base.response_tags("SMA001", include_related=False) == {"product:SMA001"}
+    assert base.response_tags("SMA001", include_related=True) == {"product:SMA001", f"category:{sma001_category}"}
+
+
+def test_snapshots_only_keep_the_changes_changed_since_can_walk():
+    """
+    Tests that a long run of updates keeps a bounded change log per snapshot, without touching the logs of the
+    snapshots it was derived from, while recent versions are still resolved.
+    """
+    snapshots = [ProductRepository()]
+    for i in range(100):
+        snapshots.append(snapshots[-1].with_reviews(
+            [{"product_id": "SMA001", "author": f"Autor {i}", "rating": 5, "comment": "Bien"}]
+        ))
+    latest = snapshots[-1]
+
+    assert len(latest._changes) == 64
+    assert len(snapshots[10]._changes) == 10
+    assert latest.changed_since(snapshots[-64].version) == {"catalog", "product:SMA001", "category:1"}
+    assert latest.changed_since(snapshots[0].version) is None
+
+
+def test_find_reviews_page_walks_every_review_once_per_sort():
+    """
+    Tests that following the cursors returns each review of a product exactly once, in the requested order,
+    including reviews added in memory (the most recent ones), and that the detail's cursor continues its first page.
+    """
+    updated = repository.with_reviews([
+        {"product_id": "SMA001", "author": "Ana", "rating": 1, "comment": "Regular"},
+        {"product_id": "SMA001", "author": "Luis", "rating": 5, "comment": "Excelente"},
+    ])
+    loaded = reviews_df[reviews_df["product_id"] == "SMA001"][["author", "rating", "comment"]].to_dict("records")
+    recent = [
+        {"author": "Luis", "rating": 5, "comment": "Excelente"},
+        {"author": "Ana", "rating": 1, "comment": "Regular"},
+        *loaded[::-1],
+    ]
+    expected = {
+        "recent": recent,
+        "rating_desc": sorted(recent, key=lambda review: -review["rating"]),
+        "rating_asc": sorted(recent, key=lambda review: review["rating"]),
+    }
+    for sort, expected_reviews in expected.items():
+        for limit in (1, 2, 10):
+            reviews, cursor = updated.find_reviews_page("SMA001", sort=sort, limit=limit)
+            while cursor is not None:
+                page, cursor = updated.find_reviews_page("SMA001", sort=sort, limit=limit, cursor=cursor)
+                reviews += page
+            assert reviews == expected_reviews
+
+    details = updated.find_product_details_by_id("SMA001", include_related=False, reviews_limit=2)
+    rest, _ = updated.find_reviews_page("SMA001", limit=None, cursor=details["reviews_next_cursor"])
+    assert details["reviews"] + rest == recent
+    assert repository.find_reviews_page("SMA001", limit=None)[0] == loaded[::-1]
+    assert repository.find_reviews_page("UNKNOWN") is None
+    with pytest.raises(InvalidCursorError):
+        updated.find_reviews_page("SMA001", sort="rating_asc", cursor=details["reviews_next_cursor"])
+
+
+def test_reviews_added_one_by_one_page_like_a_single_batch():
+    """
+    Tests that reviews added one at a time page in the same order as expected from their ratings and arrival,
+    and that each snapshot, including one branched off an older snapshot, only sees the reviews it was built with.
+    """
+    added = [
+        {"product_id": "SMA001", "author": f"Autor {i}", "rating": i % 5 + 1, "comment": f"Comentario {i}"}
+        for i in range(40)
+    ]
+    snapshots = [repository]
+    for record in added:
+        snapshots.append(snapshots[-1].with_reviews([record]))
+    branched = snapshots[10].with_reviews([{**added[0], "author": "Otra rama"}])
+
+    loaded = reviews_df[reviews_df["product_id"] == "SMA001"][["author", "rating", "comment"]].to_dict("records")
+
+    def expected(records, sort):
+        recent = [{key: record[key] for key in ("author", "rating", "comment")} for record in records[::-1]] + loaded[::-1]
+        if sort == "recent":
+            return recent
+        return sorted(recent, key=lambda review: -review["rating"] if sort == "rating_desc" else review["rating"])
+
+    for sort in ("recent", "rating_desc", "rating_asc"):
+        for snapshot, records in (
+            (snapshots[-1], added), (snapshots[10], added[:10]), (branched, added[:10] + [{**added[0], "author": "Otra rama"}])
+        ):
+            reviews, cursor = snapshot.find_reviews_page("SMA001", sort=sort, limit=7)
+            while cursor is not None:
+                page, cursor = snapshot.find_reviews_page("SMA001", sort=sort, limit=7, cursor=cursor)
+                reviews += page
+            assert reviews == expected(records, sort)
+    assert len(snapshots[-1].review_index) == len(repository.review_index) + 40
+    assert len(branched.review_index) == len(repository.review_index) + 11
+
+
+def test_updates_with_unknown_references_are_rejected():
+    """
+    Tests that updates referring to missing categories, sellers or products, or with invalid ratings, raise
+    CatalogUpdateError.
+    """
+    with pytest.raises(CatalogUpdateError):
+        repository.with_products([new_product(category_id=999)])
+    with pytest.raises(CatalogUpdateError):
+        repository.with_products([new_product(seller_id="UNKNOWN")])
+    with pytest.raises(CatalogUpdateError):
+        repository.with_reviews([{"product_id": "UNKNOWN", "author": "Ana", "rating": 5, "comment": "Bien"}])
+    with pytest.raises(CatalogUpdateError):
+        repository.with_reviews([{"product_id": "SMA001", "author": "Ana", "rating": 6, "comment": "Bien"}])
+
+
+def test_image_variants_replace_the_original_urls():
+    """
+    Tests that with image variants, summaries link the thumbnail of the main image and details the detail-size
+    variant of every image, also in snapshots derived by updates; images without variants keep their URL.
+    """
+    base = ProductRepository().use_image_variants(ImageVariants({"/images/products/SMA001/1.jpg": "abc"}))
+
+    assert base.find_products_by_ids(["SMA001"])[0]["image"] == "/images/variants/abc/thumbnail.webp"
+    assert base.find_product_details_by_id("SMA001", include_related=False)["images"] == [
+        "/images/variants/abc/detail.webp"
+    ]
+    assert base.find_products_by_ids(["SMA002"])[0]["image"] == "/images/products/SMA002/1.jpg"
+
+    updated = base.with_products([new_product()])
+    assert updated.find_products_by_ids(["SMA001"])[0]["image"] == "/images/variants/abc/thumbnail.webp"
+    assert repository.find_products_by_ids(["SMA001"])[0]["image"] == "/images/products/SMA001/1.jpg"
+
+
+def test_search_products_filters_pages_and_follows_updates():
+    """
+    Tests that search results are paged in relevance order, that the category and brand filters narrow the results
+    but not the facets, and that upserted products are searchable in the new snapshot only.
+    """
+    results = repository.search_products("iphone")
+    assert results["total"] == len(results["items"]) > 1
+    assert all("iPhone" in item["title"] for item in results["items"])
+    assert results["facets"]["brands"] == [{"name": "Apple", "count": results["total"]}]
+    assert repository.search_products("iphone", limit=1, offset=1)["items"] == results["items"][1:2]
+
+    category = repository.categories_df.loc[1, "name"]
+    filtered = repository.search_products("a", category=category)
+    unfiltered = repository.search_products("a")
+    assert filtered["facets"] == unfiltered["facets"]
+    assert filtered["total"] == next(
+        facet["count"] for facet in unfiltered["facets"]["categories"] if facet["name"] == category
+    )
+
+    updated = repository.with_products([new_product(title="Funda magnética MagSafe")])
+    assert [item["id"] for item in updated.search_products("magsaf")["items"]] == ["NEW001"]
+    assert repository.search_products("magsaf")["total"] == 0
@@ -0,0 +1,71 @@
+# backend/test/repositories/test_review_stats.py
+
+import pandas as pd
+import pytest
+
+from app.repositories.review_stats import InvalidRatingError, ReviewStats
+
+reviews_df = pd.read_json("app/data/reviews.json")
+
+
+def test_stats_match_reviews():
+    """
+    Tests that the aggregated figures match a direct computation over the reviews.
+    """
+    stats = ReviewStats(reviews_df)
+    for product_id, product_reviews in reviews_df.groupby("product_id"):
+        summary = stats.get(product_id)
+        assert summary.count == len(product_reviews)
+        assert summary.total == product_reviews["rating"].sum()
+        assert stats.average_rating(product_id) == round(product_reviews["rating"].mean(), 2)
+        assert sum(summary.histogram.values()) == summary.count
+        assert summary.histogram[5] == (product_reviews["rating"] == 5).sum()
+
+
+def test_product_without_reviews():
+    """
+    Tests that products without reviews have an empty summary and a 0.0 average.
+    """
+    stats = ReviewStats(reviews_df)
+    assert stats.get("ID_WITHOUT_REVIEWS").count == 0
+    assert stats.average_rating("ID_WITHOUT_REVIEWS") == 0.0
+    assert ReviewStats(reviews_df.iloc[0:0]).average_rating("SMA001") == 0.0
+
+
+def test_add_review_updates_stats():
+    """
+    Tests the incremental update performed when a review is added.
+    """
+    stats = ReviewStats(pd.DataFrame({"product_id": ["A", "A"], "rating": [5, 4]}))
+    stats.add("A", 3)
+    stats.add("B", 1)
+
+    assert stats.get("A").count == 3
+    assert stats.average_rating("A") == 4.0
+    assert stats.get("A").histogram == {1: 0, 2: 0, 3: 1, 4: 1, 5: 1}
+    assert stats.average_rating("B") == 1.0
+
+
+def test_update_in_chunks_matches_single_batch():
+    """
+    Tests that merging the reviews chunk by chunk yields the same statistics as a single batch.
+    """
+    stats = ReviewStats()
+    for start in range(0, len(reviews_df), 7):
+        stats.update(reviews_df.iloc[start:start + 7])
+    expected = ReviewStats(reviews_df)
+    for product_id in reviews_df["product_id"].unique():
+        assert stats.get(product_id) == expected.get(product_id)
+
+
+def test_ratings_outside_the_levels_are_rejected():
+    """
+    Tests that ratings outside 1-5 are rejected, in batches and one by one, instead of skewing the averages
+    without showing up in the histogram.
+    """
+    with pytest.raises(InvalidRatingError):
+        ReviewStats(pd.DataFrame({"product_id": ["A", "A"], "rating": [5, 6]}))
+    stats = ReviewStats(pd.DataFrame({"product_id": ["A"], "rating": [5]}))
+    with pytest.raises(InvalidRatingError):
+        stats.add("A", 0)
+    assert stats.get("A").count == 1 and stats.average_rating("A") == 5.0
@@ -0,0 +1,173 @@
+# backend/test/repositories/test_search.py
+
+import numpy as np
+import pandas as pd
+
+from app.repositories import search
+from app.repositories.search import SearchIndex, fold, rank, tokenize
+
+
+def catalog(*products):
+    """Returns a products DataFrame with the searchable columns of the given (title, brand, category_id, ...) tuples."""
+    return pd.DataFrame([
+        {
+            "id": f"P{i}",
+            "title": title,
+            "brand": brand,
+            "category_id": category_id,
+            "description": description,
+            "specifications": specifications,
+        }
+        for i, (title, brand, category_id, description, specifications) in enumerate(products)
+    ])
+
+
+products_df = catalog(
+    ("Cámara de acción 4K", "GoPro", 1, "Sumergible hasta 10 metros", {"color": "Negro"}),
+    ("Camarógrafo profesional", "Sony", 1, "Grabación en cámara lenta", {"color": "Gris"}),
+    ("Silla ergonómica", "Herman", 2, "Silla de oficina con soporte lumbar", {"material": "Malla", "dimensions": {"height": 120}}),
+    ("Escritorio de madera", "Ikea", 2, "Escritorio para oficina", {"material": "Madera"}),
+    ("Cuaderno argollado", None, 3, "Ideal para la oficina", {"page_count": 80}),
+)
+index = SearchIndex(products_df)
+
+
+def ids(positions):
+    return products_df["id"].to_numpy()[positions].tolist()
+
+
+def test_folding_ignores_accents_case_and_stopwords():
+    """
+    Tests that terms are folded to unaccented lowercase and Spanish stopwords are dropped.
+    """
+    assert fold("CÁMARA Ñandú") == "camara nandu"
+    assert tokenize("La cámara de ACCIÓN, 4K") == ["camara", "accion", "4k"]
+    positions, _ = index.match("camara accion", prefix=False)
+    assert ids(positions) == ["P0"]
+    assert ids(index.match("CÁMARA ACCIÓN", prefix=False)[0]) == ["P0"]
+
+
+def test_every_term_must_match_and_the_last_one_as_a_prefix():
+    """
+    Tests that queries are conjunctive and that only the last term matches as a prefix.
+    """
+    assert ids(index.match("cam")[0]) == ["P0", "P1"]
+    assert ids(index.match("cam", prefix=False)[0]) == []
+    assert ids(index.match("silla ofi")[0]) == ["P2"]
+    assert ids(index.match("ofi silla")[0]) == []
+    assert ids(index.match("oficina")[0]) == ["P2", "P3", "P4"]
+    assert ids(index.match("de la", prefix=False)[0]) == []
+    # A stopword being typed may be the start of a longer word
+    assert ids(index.match("silla e")[0]) == ["P2"]
+
+
+def test_specifications_and_brand_are_searchable():
+    """
+    Tests that specification values, nested ones included, and brands are indexed.
+    """
+    assert ids(index.match("malla")[0]) == ["P2"]
+    assert ids(index.match("120")[0]) == ["P2"]
+    assert ids(index.match("gopro")[0]) == ["P0"]
+
+
+def test_bm25_ranks_title_matches_and_rare_terms_first():
+    """
+    Tests that a term in the title outweighs the same term in the description, and that ties keep catalog order.
+    """
+    positions, scores = index.match("escritorio oficina")
+    assert ids(positions) == ["P3"]
+    positions, scores = index.match("camara")
+    # P0 has it in the title, P1 only in the description
+    assert ids(rank(positions, scores)) == ["P0", "P1"]
+    positions, scores = np.array([4, 1, 2, 3]), np.array([1.0, 2.0, 1.0, 2.0], dtype=np.float32)
+    assert rank(positions, scores).tolist() == [1, 3, 2, 4]
+    assert rank(positions, scores, limit=3).tolist() == [1, 3, 2]
+
+
+def test_facets_count_matches_per_category_and_brand():
+    """
+    Tests that facets count the given products per category and brand, most frequent first, skipping missing brands.
+    """
+    positions, _ = index.match("oficina")
+    categories, brands = index.facets(positions)
+    assert categories == {2: 2, 3: 1}
+    assert brands == {"Herman": 1, "Ikea": 1}
+
+
+def test_with_rows_reindexes_updated_and_new_rows_only():
+    """
+    Tests that updated rows stop matching their old text, new rows are searchable,
+    and the original index is left untouched.
+    """
+    updated_df = pd.concat([
+        products_df,
+        catalog(("Cámara instantánea", "Fujifilm", 1, "", {})).assign(id="P5"),
+    ], ignore_index=True)
+    updated_df.loc[2, "title"] = "Sillón reclinable"
+    updated_df.loc[2, "description"] = ""
+    updated = index.with_rows(updated_df, np.array([2, 5]))
+
+    assert updated.match("silla")[0].tolist() == []
+    assert updated.match("sillon")[0].tolist() == [2]
+    assert updated.match("camara")[0].tolist() == [0, 1, 5]
+    assert updated.facets(updated.match("camara")[0]) == ({1: 3}, {"GoPro": 1, "Sony": 1, "Fujifilm": 1})
+    assert index.match("silla")[0].tolist() == [2]
+    assert index.match("camara")[0].tolist() == [0, 1]
+
+    # A row updated again is indexed in its latest version only
+    updated_df.loc[5, "title"] = "Trípode"
+    again = updated.with_rows(updated_df, np.array([5]))
+    assert again.match("camara")[0].tolist() == [0, 1]
+    assert again.match("tripode")[0].tolist() == [5]
+    assert again.match("sillon")[0].tolist() == [2]
+
+
+def test_precomputed_prefixes_match_computed_results(monkeypatch):
+    """
+    Tests that the answers precomputed for broad prefixes, also after updates, equal the ones computed per query.
+    """
+    monkeypatch.setattr(search, "BROAD_POSTINGS", 2)
+    monkeypatch.setattr(search, "PRECOMPUTED_RESULTS", 2)
+    broad = SearchIndex(products_df)
+    assert {"c", "ca", "o", "of"} <= set(broad._precomputed)
+
+    updated_df = pd.concat([
+        products_df,
+        catalog(("Cámara instantánea", "Fujifilm", 1, "Para la oficina", {})).assign(id="P5"),
+    ], ignore_index=True)
+    updated_df.loc[3, "title"] = "Cafetera"
+    updated_df.loc[3, "brand"] = "Oster"
+    updated_df.loc[3, "category_id"] = 4
+    for index_ in (broad, broad.with_rows(updated_df, np.array([3, 5]))):
+        for query in ("c", "ca", "o", "of", "x"):
+            for limit in (1, 2, 3, None):
+                positions, scores = index_.match(query)
+                categories, brands = index_.facets(positions)
+                expected = (rank(positions, scores, limit).tolist(), len(positions), categories, brands)
+                results = index_.search(query, limit=limit)
+                assert (results.positions.tolist(), results.total, results.categories, results.brands) == expected
+
+
+def test_large_deltas_are_compacted_into_a_new_index(monkeypatch):
+    """
+    Tests that once more rows were updated than the delta may hold, the index is rebuilt from the current rows
+    and answers like an index built from them.
+    """
+    # Three rows for a catalog of five
+    monkeypatch.setattr(search, "MIN_DELTA_ROWS", 1)
+    updated_df = products_df.copy()
+    updated_df.loc[0, "title"] = "Trípode"
+    updated_df.loc[3, "title"] = "Cámara de seguridad"
+    updated_df.loc[4, "title"] = "Cuaderno cuadriculado"
+    updated_df.loc[1, "title"] = "Cámara réflex"
+
+    updated = index.with_rows(updated_df, np.array([0, 3])).with_rows(updated_df, np.array([4, 3]))
+    assert updated._delta is not None
+    compacted = updated.with_rows(updated_df, np.array([1]))
+
+    assert compacted._delta is None
+    rebuilt = SearchIndex(updated_df)
+    for query in ("camara", "tripode", "cuaderno cuad", "oficina", "reflex"):
+        results, expected = compacted.search(query), rebuilt.search(query)
+        assert results.positions.tolist() == expected.positions.tolist()
+        assert (results.total, results.categories, results.brands) == (expected.total, expected.categories, expected.brands)
@@ -0,0 +1,152 @@
+# backend/test/services/test_images.py
+
+import os
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from PIL import Image
+from starlette.applications import Starlette
+
+from app.repositories.catalog_provider import CatalogProvider
+from app.services.images import IMMUTABLE_CACHE_CONTROL, ImageService, ImageVariantFiles, ImageVariants
+
+WEBP_ACCEPT = "image/avif,image/webp,image/apng,image/*,*/*;q=0.8"
+
+
+def make_image(path, size=(1600, 900), color=(200, 30, 30)):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", size, color).save(path, format="JPEG")
+
+
+def test_build_renders_variants_keyed_by_content(tmp_path):
+    """
+    Tests that every original gets a resized thumbnail and detail variant in WebP and JPEG, stored under the digest
+    of its content, and that identical originals share their variants.
+    """
+    source, output = tmp_path / "images", tmp_path / "variants"
+    make_image(source / "products" / "A" / "1.jpg")
+    make_image(source / "products" / "B" / "1.jpg")
+    make_image(source / "products" / "C" / "1.jpg", size=(200, 100), color=(0, 0, 255))
+
+    variants = ImageService(source, output).build()
+
+    thumbnail = variants.url("/images/products/A/1.jpg", "thumbnail")
+    assert thumbnail.startswith("/images/variants/") and thumbnail.endswith("/thumbnail.webp")
+    assert thumbnail == variants.url("/images/products/B/1.jpg", "thumbnail")
+    assert variants.url("/images/products/C/1.jpg", "thumbnail") != thumbnail
+
+    directory = output / thumbnail.split("/")[3]
+    assert sorted(path.name for path in directory.iterdir()) == [
+        "detail.jpg", "detail.webp", "thumbnail.jpg", "thumbnail.webp"
+    ]
+    with Image.open(directory / "thumbnail.webp") as image:
+        assert image.format == "WEBP"
+        assert max(image.size) == 400
+    with Image.open(directory / "detail.jpg") as image:
+        assert image.size == (1200, 675)
+    # Smaller originals are not enlarged
+    small_directory = output / variants.url("/images/products/C/1.jpg", "detail").split("/")[3]
+    with Image.open(small_directory / "detail.webp") as image:
+        assert image.size == (200, 100)
+
+
+def test_build_only_renders_changed_originals(tmp_path):
+    """
+    Tests that a second build reuses the variants of unchanged originals, and that replacing an original
+    gives it new URLs.
+    """
+    source, output = tmp_path / "images", tmp_path / "variants"
+    original = source / "A.jpg"
+    make_image(original)
+    service = ImageService(source, output)
+    first_url = service.build().url("/images/A.jpg", "detail")
+    rendered = output / first_url.split("/")[3] / "detail.webp"
+    os.utime(rendered, ns=(0, 0))
+
+    assert service.build().url("/images/A.jpg", "detail") == first_url
+    assert rendered.stat().st_mtime_ns == 0
+
+    make_image(original, color=(0, 255, 0))
+    assert service.build().url("/images/A.jpg", "detail") != first_url
+
+
+def test_unknown_and_broken_images_keep_their_original_url(tmp_path):
+    """
+    Tests that images without variants, including originals that cannot be decoded, resolve to themselves.
+    """
+    source = tmp_path / "images"
+    source.mkdir()
+    (source / "broken.jpg").write_bytes(b"not an image")
+
+    variants = ImageService(source, tmp_path / "variants").build()
+
+    assert variants.url("/images/broken.jpg", "thumbnail") == "/images/broken.jpg"
+    assert variants.url("/images/missing.jpg", "detail") == "/images/missing.jpg"
+    assert ImageVariants().url("/images/a.jpg", "detail") == "/images/a.jpg"
+
+
+def test_variants_are_served_as_immutable(tmp_path):
+    """
+    Tests that variant files are served with a long-lived immutable Cache-Control and an ETag that
+    revalidates with 304 Not Modified.
+    """
+    make_image(tmp_path / "images" / "A.jpg")
+    service = ImageService(tmp_path / "images", tmp_path / "variants")
+    url = service.build().url("/images/A.jpg", "thumbnail")
+    app = Starlette()
+    app.mount("/images/variants", ImageVariantFiles(directory=tmp_path / "variants"))
+    client = TestClient(app, headers={"Accept": WEBP_ACCEPT})
+
+    response = client.get(url)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    revalidated = client.get(url, headers={"If-None-Match": response.headers["etag"]})
+    assert revalidated.status_code == 304
+
+
+def test_clients_without_webp_support_get_the_jpeg_variant(tmp_path):
+    """
+    Tests that a variant URL is answered with the JPEG rendering when the Accept header does not list WebP,
+    and that responses vary on Accept.
+    """
+    make_image(tmp_path / "images" / "A.jpg")
+    url = ImageService(tmp_path / "images", tmp_path / "variants").build().url("/images/A.jpg", "detail")
+    app = Starlette()
+    app.mount("/images/variants", ImageVariantFiles(directory=tmp_path / "variants"))
+    client = TestClient(app)
+
+    for accept in ("image/png,image/*;q=0.8,*/*;q=0.5", "*/*"):
+        response = client.get(url, headers={"Accept": accept})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/jpeg"
+        assert response.headers["vary"] == "Accept"
+        with Image.open(tmp_path / "variants" / url.split("/")[3] / "detail.jpg") as image:
+            assert image.format == "JPEG"
+    webp = client.get(url, headers={"Accept": WEBP_ACCEPT})
+    assert webp.headers["content-type"] == "image/webp"
+    assert webp.headers["vary"] == "Accept"
+
+
+def test_catalog_links_variants_rebuilt_after_it_was_loaded(tmp_path):
+    """
+    Tests that the reload check picks up a manifest rewritten after the catalog was loaded,
+    publishing a snapshot (under a new version) that links the new variants.
+    """
+    original = "/images/products/SMA001/1.jpg"
+    service = ImageService(tmp_path / "images", tmp_path / "variants")
+    provider = CatalogProvider(Path("app/data"), images=service)
+    snapshot = provider.repository
+    assert provider.reload_if_changed() is False
+    assert snapshot.find_product_details_by_id("SMA001", include_related=False)["images"][0] == original
+
+    make_image(tmp_path / "images" / "products" / "SMA001" / "1.jpg")
+    service.build()
+    assert provider.reload_if_changed() is True
+    refreshed = provider.repository
+    assert refreshed.version != snapshot.version
+    assert refreshed.find_product_details_by_id("SMA001", include_related=False)["images"][0].startswith("/images/variants/")
+    assert refreshed.find_products_by_ids(["SMA001"])[0]["image"].startswith("/images/variants/")
+    assert snapshot.find_products_by_ids(["SMA001"])[0]["image"] == original
+    assert provider.reload_if_changed() is False
@@ -0,0 +1,108 @@
+# backend/test/services/test_neighbor_tables.py
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.repositories.catalog_provider import CatalogProvider
+from app.services import neighbor_tables
+from app.services.recommender import RecommendationIndex, ScoringWeights
+from benchmarks.synthetic import make_products
+
+products_df = pd.read_json("app/data/products.json")
+
+
+def test_parallel_precompute_matches_the_index(monkeypatch):
+    """
+    Tests that the neighbour tables ranked in blocks by worker processes equal those the index computes itself.
+    """
+    monkeypatch.setattr(neighbor_tables, "ROWS_PER_TASK", 64)
+    catalog = make_products(500, n_categories=2, seed=7)
+    index = RecommendationIndex(catalog, weights=ScoringWeights(text=1.0, price=0.5))
+    tables = neighbor_tables.compute_neighbors(index, workers=2)
+
+    assert set(tables) == set(index.groups())
+    for category_id, (ids, neighbors, scores) in tables.items():
+        fitted = index._category(category_id)
+        assert ids.tolist() == fitted.ids.tolist()
+        np.testing.assert_array_equal(neighbors, fitted.neighbors)
+        np.testing.assert_array_equal(scores, fitted.neighbor_scores)
+
+
+def test_saved_tables_are_used_by_a_matching_index(tmp_path):
+    """
+    Tests that tables written to a file are used instead of ranking again by an index with the same options,
+    and ignored by an index with other options.
+    """
+    index = RecommendationIndex(products_df)
+    path = neighbor_tables.save_neighbors(
+        neighbor_tables.compute_neighbors(index), neighbor_tables.table_metadata(index), tmp_path / "neighbors.npz"
+    )
+
+    loaded = RecommendationIndex(products_df)
+    assert neighbor_tables.attach_neighbors(loaded, path)
+    _, tables = neighbor_tables.load_neighbors(path)
+    # The loaded table is served as is
+    np.testing.assert_array_equal(loaded._category(1).neighbors, tables[1][1])
+    for product_id in products_df['id']:
+        assert loaded.recommend(product_id) == index.recommend(product_id)
+
+    other_weights = RecommendationIndex(products_df, weights=ScoringWeights(brand=1.0))
+    assert not neighbor_tables.attach_neighbors(other_weights, path)
+    assert not neighbor_tables.attach_neighbors(RecommendationIndex(products_df), tmp_path / "missing.npz")
+
+
+def test_tables_of_changed_groups_are_not_used():
+    """
+    Tests that a group whose products changed after the tables were computed ranks its products again.
+    """
+    index = RecommendationIndex(products_df)
+    tables = neighbor_tables.compute_neighbors(index)
+    # Tables computed for a catalog in which category 1 had one product less
+    fewer_products = products_df[products_df['id'] != "SMA008"].reset_index(drop=True)
+    stale_tables = neighbor_tables.compute_neighbors(RecommendationIndex(fewer_products))
+    tables[1] = stale_tables[1]
+
+    loaded = RecommendationIndex(products_df).use_neighbors(tables)
+    for product_id in products_df['id']:
+        assert loaded.recommend(product_id) == index.recommend(product_id)
+
+
+def test_tables_of_groups_whose_content_changed_are_not_used(tmp_path):
+    """
+    Tests that a saved table is ignored when the products of its group were edited (same IDs, other text),
+    while the tables of unchanged groups are still used.
+    """
+    index = RecommendationIndex(products_df)
+    path = neighbor_tables.save_neighbors(
+        neighbor_tables.compute_neighbors(index), neighbor_tables.table_metadata(index), tmp_path / "neighbors.npz"
+    )
+    edited_df = products_df.copy()
+    edited = edited_df['id'] == "SMA001"
+    edited_df.loc[edited, 'title'] = "Cafetera de goteo"
+    edited_df.loc[edited, 'description'] = "Cafetera programable para doce tazas"
+    edited_category = int(edited_df.loc[edited, 'category_id'].iloc[0])
+
+    loaded = RecommendationIndex(edited_df)
+    assert neighbor_tables.attach_neighbors(loaded, path)
+    assert edited_category not in loaded._precomputed
+    assert set(loaded._precomputed) == set(index.groups()) - {edited_category}
+    fresh = RecommendationIndex(edited_df)
+    for product_id in edited_df['id']:
+        assert loaded.recommend(product_id) == fresh.recommend(product_id)
+
+
+def test_catalog_provider_loads_precomputed_neighbors(tmp_path):
+    """
+    Tests that the catalog provider serves the neighbour tables found at neighbors_path.
+    """
+    index = RecommendationIndex(products_df)
+    tables = neighbor_tables.compute_neighbors(index)
+    # Swaps the first two neighbours of the first product so that serving the file is observable
+    tables[1][1][0, :2] = tables[1][1][0, 1::-1]
+    neighbor_tables.save_neighbors(tables, neighbor_tables.table_metadata(index), tmp_path / "neighbors.npz")
+
+    provider = CatalogProvider(Path("app/data"), neighbors_path=tmp_path / "neighbors.npz")
+    first, second = index.recommend("SMA001", top_n=2)
+    assert provider.repository.recommendation_index.recommend("SMA001", top_n=2) == [second, first]
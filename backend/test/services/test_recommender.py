@@ -0,0 +1,284 @@
+# backend/test/services/test_recommender.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+from app.services import recommender
+from app.services.attribute_features import AttributeFeatures, parse_quantity
+from app.services.recommender import ApproximateSearch, RecommendationIndex, ScoringWeights, top_n_indices
+from benchmarks.bench_ann import recall_at_k
+from benchmarks.synthetic import make_products
+
+products_df = pd.read_json("app/data/products.json")
+
+
+def reference_recommendations(product_id, category_id, top_n=5):
+    """The original per-request algorithm, used as the expected output of the index."""
+    category_products_df = products_df[products_df['category_id'] == category_id].copy()
+    if len(category_products_df) < 2:
+        return []
+    category_products_df['combined_features'] = category_products_df['title'] + ' ' + category_products_df['description']
+    tfidf_matrix = TfidfVectorizer(stop_words='english').fit_transform(category_products_df['combined_features'].fillna(''))
+    cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
+    local_idx = list(category_products_df['id']).index(product_id)
+    sim_scores = sorted(enumerate(cosine_sim[local_idx]), key=lambda x: x[1], reverse=True)
+    return category_products_df.iloc[[i[0] for i in sim_scores[1:top_n + 1]]]['id'].tolist()
+
+
+def test_index_matches_per_request_algorithm():
+    """
+    Tests that the precomputed index returns the same recommendations as fitting TF-IDF per request.
+    """
+    index = RecommendationIndex(products_df)
+    for product in products_df.itertuples():
+        expected = reference_recommendations(product.id, product.category_id)
+        assert index.recommend(product.id) == expected
+        assert recommender.generate_recommendations(product.id, product.category_id, products_df) == expected
+
+
+def test_index_serves_requests_larger_than_top_k():
+    """
+    Tests that asking for more neighbours than were precomputed still returns the full ranking.
+    """
+    index = RecommendationIndex(products_df, top_k=2)
+    expected = reference_recommendations("SMA001", 1, top_n=6)
+    assert index.recommend("SMA001", top_n=6) == expected
+    assert index.recommend("SMA001", top_n=2) == expected[:2]
+
+
+def test_index_unknown_product():
+    """
+    Tests that an unknown product yields no recommendations.
+    """
+    index = RecommendationIndex(products_df)
+    assert index.recommend("ID_DOES_NOT_EXIST") == []
+
+
+def test_reference_product_is_excluded_by_id_on_ties():
+    """
+    Tests that a product is never recommended to itself, even when other products tie with it
+    at the highest score and it is not ranked first.
+    """
+    duplicates_df = pd.DataFrame({
+        "id": ["A", "B", "C", "D"],
+        "category_id": [1, 1, 1, 1],
+        "title": ["Cuaderno rayado", "Cuaderno rayado", "Cuaderno rayado", "Lápiz negro"],
+        "description": ["Norma 100 hojas"] * 3 + ["Punta fina"],
+    })
+    index = RecommendationIndex(duplicates_df)
+    assert index.recommend("C", top_n=2) == ["A", "B"]
+    assert index.recommend("A", top_n=3) == ["B", "C", "D"]
+
+
+def test_top_n_indices_breaks_ties_by_position():
+    """
+    Tests that the argpartition-based selection orders by score and then by position.
+    """
+    scores = np.array([0.2, 0.9, 0.5, 0.9, 0.5, -np.inf, 0.1])
+    assert top_n_indices(scores.copy(), 3).tolist() == [1, 3, 2]
+    assert top_n_indices(scores.copy(), 4).tolist() == [1, 3, 2, 4]
+    assert top_n_indices(scores.copy(), 10).tolist() == [1, 3, 2, 4, 0, 6]
+
+
+HYBRID_WEIGHTS = ScoringWeights(text=1.0, specifications=0.5, price=0.3, brand=0.2, seller_reputation=0.1)
+SELLER_REPUTATIONS = {f"S{i:03d}": i / 9 for i in range(10)}
+
+
+@pytest.mark.parametrize("weights", [ScoringWeights(), HYBRID_WEIGHTS])
+def test_incremental_changes_match_rescoring_every_row(weights):
+    """
+    Tests that the neighbour table of an incrementally updated category equals ranking every row again
+    against the updated TF-IDF matrix and attributes, for replaced, appended and removed products.
+    """
+    catalog = make_products(300, n_categories=1, seed=3)
+    ids = catalog['id'].to_numpy()
+    features = AttributeFeatures(catalog, SELLER_REPUTATIONS)
+    index = recommender._CategoryIndex(ids, recommender.product_term_counts(catalog), 5, weights, features)
+
+    changes = make_products(4, n_categories=1, seed=4)
+    changes['id'] = [ids[0], ids[150], "NEW1", "NEW2"]
+    updated = index.with_changes(changes, recommender.product_term_counts(changes), [ids[7], ids[42]])
+
+    assert len(updated.ids) == 302 and len(index.ids) == 300
+    removed = {updated.positions[ids[7]], updated.positions[ids[42]]}
+    for local_idx in range(len(updated.ids)):
+        if local_idx in removed:
+            assert (updated.neighbors[local_idx] == -1).all()
+            continue
+        expected = updated._rank(local_idx, updated._score_row(local_idx), 5)
+        assert updated.neighbors[local_idx].tolist() == expected.tolist()
+        assert not removed & set(updated.neighbors[local_idx].tolist())
+
+
+def reference_hybrid_scores(category_df, weights, seller_reputations):
+    """Scores every pair of products one at a time, from the definition of each component."""
+    text = cosine_similarity(recommender._CategoryIndex(
+        category_df['id'].to_numpy(), recommender.product_term_counts(category_df), 1
+    ).tfidf_matrix)
+    features = AttributeFeatures(category_df, seller_reputations)
+    n_products = len(category_df)
+    scores = np.zeros((n_products, n_products))
+    for i in range(n_products):
+        for j in range(n_products):
+            shared = [
+                1 - (features.quantities[i, k] - features.quantities[j, k]) ** 2
+                for k in range(features.quantities.shape[1])
+                if features.quantity_mask[i, k] and features.quantity_mask[j, k]
+            ]
+            categories_i = set(features.categories[i].indices.tolist())
+            categories_j = set(features.categories[j].indices.tolist())
+            n_categorical = int((features.category_mask[i] * features.category_mask[j]).sum())
+            matches = len(categories_i & categories_j)
+            n_shared = len(shared) + n_categorical
+            specifications = (sum(shared) + matches) / n_shared if n_shared else 0.0
+            price = 1 - (features.prices[i] - features.prices[j]) ** 2
+            brand = float(features.brands[i] == features.brands[j] and features.brands[i] >= 0)
+            # Score of product j as a recommendation for product i
+            scores[i, j] = (
+                weights.text * text[i, j] + weights.specifications * specifications + weights.price * price
+                + weights.brand * brand + weights.seller_reputation * features.reputations[j]
+            ) / weights.total
+    return scores
+
+
+def test_hybrid_scores_match_pairwise_reference():
+    """
+    Tests that the batched hybrid scores of a category equal scoring every pair of products one at a time.
+    """
+    category_df = products_df[products_df['category_id'] == 1].reset_index(drop=True)
+    reputations = {seller_id: 0.5 for seller_id in category_df['seller_id']}
+    features = AttributeFeatures(category_df, reputations)
+    index = recommender._CategoryIndex(
+        category_df['id'].to_numpy(), recommender.product_term_counts(category_df), 3, HYBRID_WEIGHTS, features
+    )
+    expected = reference_hybrid_scores(category_df, HYBRID_WEIGHTS, reputations)
+    for local_idx in range(len(category_df)):
+        np.testing.assert_allclose(index._score_row(local_idx), expected[local_idx])
+
+
+def test_default_weights_rank_by_text_only():
+    """
+    Tests that the default scoring weights leave the recommendations of the text model unchanged.
+    """
+    index = RecommendationIndex(products_df, weights=ScoringWeights(), seller_reputations={"TApple": 5.0})
+    for product in products_df.itertuples():
+        assert index.recommend(product.id) == reference_recommendations(product.id, product.category_id)
+
+
+def test_specification_weight_favours_similar_specifications():
+    """
+    Tests that, among products with the same text, the one with the closest specifications ranks first.
+    """
+    phones_df = pd.DataFrame({
+        "id": ["A", "B", "C", "D"],
+        "category_id": [1, 1, 1, 1],
+        "title": ["Celular"] * 4,
+        "description": ["Pantalla grande"] * 4,
+        "seller_id": ["S1"] * 4,
+        "brand": ["Marca"] * 4,
+        "price": [{"amount": 1_000_000, "currency": "COP"}] * 4,
+        "specifications": [
+            {"ram": "8 GB", "storage": "256 GB", "color": "Negro"},
+            {"ram": "4 GB", "storage": "64 GB", "color": "Azul"},
+            {"ram": "8 GB", "storage": "256 GB", "color": "Negro"},
+            {"ram": "2 GB", "storage": "32 GB", "color": "Azul"},
+        ],
+    })
+    text_only = RecommendationIndex(phones_df)
+    assert text_only.recommend("A", top_n=3) == ["B", "C", "D"]
+    hybrid = RecommendationIndex(phones_df, weights=ScoringWeights(specifications=1.0))
+    assert hybrid.recommend("A", top_n=3) == ["C", "B", "D"]
+
+
+def test_parse_quantity_converts_units():
+    """
+    Tests that specification values are parsed into numbers on a common scale per kind of quantity.
+    """
+    assert parse_quantity("256 GB") == 256.0
+    assert parse_quantity("1 TB") == 1024.0
+    assert parse_quantity("0,7 mm") == pytest.approx(0.07)
+    assert parse_quantity(6.7) == 6.7
+    assert parse_quantity("Negro") is None
+    assert parse_quantity(None) is None
+
+
+def test_approximate_index_probing_every_list_is_exact():
+    """
+    Tests that the IVF backend scanning all its clusters returns exactly the recommendations of the exact engine,
+    within categories and across them.
+    """
+    catalog = make_products(600, n_categories=2, seed=5)
+    for cross_category in (False, True):
+        exact = RecommendationIndex(catalog, cross_category=cross_category)
+        approximate = RecommendationIndex(
+            catalog, approximate=ApproximateSearch(n_lists=8, n_probe=8), cross_category=cross_category
+        )
+        for product_id in catalog['id']:
+            assert approximate.recommend(product_id) == exact.recommend(product_id)
+
+
+def test_approximate_index_recall_grows_with_probes():
+    """
+    Tests the recall/latency knob: recall@10 against the exact engine grows with the number of probed clusters.
+    """
+    catalog = make_products(2000, n_categories=1, seed=6)
+    exact = RecommendationIndex(catalog)
+    approximate = RecommendationIndex(catalog, approximate=ApproximateSearch(n_lists=20))
+    product_ids = catalog['id'].iloc[:100]
+    recalls = [
+        recall_at_k(lambda product_id, k: approximate.recommend(product_id, k, n_probe=n_probe), exact.recommend, product_ids)
+        for n_probe in (1, 5, 20)
+    ]
+    assert recalls[0] < recalls[1] < recalls[2] == 1.0
+
+
+def test_cross_category_recommendations():
+    """
+    Tests that products of other categories are recommended when comparing across categories.
+    """
+    index = RecommendationIndex(products_df, approximate=ApproximateSearch(n_probe=100), cross_category=True)
+    categories = dict(zip(products_df['id'], products_df['category_id']))
+    recommended = {product_id for product in products_df.itertuples() for product_id in index.recommend(product.id, 10)}
+    assert {categories[product_id] for product_id in recommended} == set(products_df['category_id'])
+    assert len(index.recommend("SMA001", 30)) == len(products_df) - 1
+
+
+def test_approximate_incremental_changes_match_exact_scan():
+    """
+    Tests that an incrementally updated IVF index keeps every product in exactly one list and, scanning every
+    list, ranks like the exact engine on the updated TF-IDF matrix.
+    """
+    catalog = make_products(300, n_categories=1, seed=3)
+    ids = catalog['id'].to_numpy()
+    index = recommender._ApproximateIndex(ids, recommender.product_term_counts(catalog), ApproximateSearch(n_lists=6))
+
+    changes = make_products(4, n_categories=1, seed=4)
+    changes['id'] = [ids[0], ids[150], "NEW1", "NEW2"]
+    updated = index.with_changes(changes, recommender.product_term_counts(changes), [ids[7], ids[42]])
+
+    members = np.concatenate(updated._lists)
+    removed = {updated.positions[ids[7]], updated.positions[ids[42]]}
+    assert sorted(members.tolist()) == sorted(set(range(302)) - removed)
+    assert len(np.concatenate(index._lists)) == 300
+    for local_idx in set(range(302)) - removed:
+        scores = updated.tfidf_matrix @ updated.tfidf_matrix[local_idx].toarray().ravel()
+        scores[[local_idx, *removed]] = -np.inf
+        assert updated.search(np.array([local_idx]), 5, n_probe=6)[0].tolist() == top_n_indices(scores, 5).tolist()
+
+
+@pytest.mark.parametrize("approximate", [None, ApproximateSearch(n_lists=4, n_probe=2)])
+def test_recommend_many_matches_single_recommendations(approximate):
+    """
+    Tests that batched recommendations equal one recommend() call per product, from the neighbour table
+    and beyond it, with unknown products getting an empty list.
+    """
+    catalog = make_products(400, n_categories=3, seed=8)
+    index = RecommendationIndex(catalog, top_k=5, approximate=approximate)
+    product_ids = catalog['id'].iloc[::7].tolist() + ["ID_DOES_NOT_EXIST"]
+    for top_n in (3, 12):
+        batch = index.recommend_many(product_ids, top_n=top_n)
+        assert list(batch) == product_ids
+        assert batch == {product_id: index.recommend(product_id, top_n=top_n) for product_id in product_ids}
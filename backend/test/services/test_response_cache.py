@@ -0,0 +1,107 @@
+# backend/test/services/test_response_cache.py
+
+from app.services.response_cache import ResponseCache
+
+
+class FakeClock:
+    """Manually advanced clock to test expiration."""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_hits_misses_and_etag():
+    """
+    Tests that a stored body is served on later lookups and carries a strong ETag.
+    """
+    cache = ResponseCache()
+    cache.publish("v1")
+    assert cache.get("v1", "SMA001") is None
+    stored = cache.put("v1", "SMA001", b'{"id": "SMA001"}')
+
+    assert cache.get("v1", "SMA001") is stored
+    assert stored.etag.startswith('"') and not stored.etag.startswith('W/')
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_lru_eviction_and_ttl():
+    """
+    Tests that the least recently used entry is evicted and that entries expire.
+    """
+    clock = FakeClock()
+    cache = ResponseCache(max_entries=2, ttl_seconds=10, clock=clock)
+    cache.publish("v1")
+    cache.put("v1", "A", b"a")
+    cache.put("v1", "B", b"b")
+    cache.get("v1", "A")
+    cache.put("v1", "C", b"c")
+
+    assert cache.get("v1", "A").body == b"a"
+    assert cache.get("v1", "B") is None
+
+    clock.now = 11
+    assert cache.get("v1", "A") is None
+
+
+def test_bodies_from_a_replaced_snapshot_are_not_stored():
+    """
+    Tests that a body built from a version that is no longer the current one is returned but not cached.
+    """
+    cache = ResponseCache()
+    cache.publish("v1")
+    cache.publish("v2")
+    assert cache.put("v1", "A", b"old").body == b"old"
+    assert cache.get("v2", "A") is None
+
+
+def test_lookups_from_a_replaced_snapshot_keep_the_current_version():
+    """
+    Tests that a request still reading a replaced snapshot does not move the cache back to its version,
+    so bodies built from the current snapshot keep being stored.
+    """
+    cache = ResponseCache()
+    cache.publish("v1")
+    cache.publish("v2")
+
+    assert cache.get("v1", "A") is None
+    cache.put("v2", "A", b"a")
+    cache.put("v1", "B", b"b")
+
+    assert cache.get("v2", "A").body == b"a"
+    assert cache.get("v1", "B") is None
+
+
+def test_new_catalog_version_invalidates_entries():
+    """
+    Tests that entries built from a previous catalog snapshot are not served for an unrelated version.
+    """
+    cache = ResponseCache()
+    cache.publish("v1")
+    cache.put("v1", "A", b"old", tags=frozenset({"product:A"}))
+    cache.publish("v2")
+    assert cache.get("v2", "A") is None
+    assert cache.get("v2", "A", changed_since=lambda version: None) is None
+
+
+def test_updates_only_invalidate_the_entries_they_affect():
+    """
+    Tests that entries whose tags were not changed since their version are carried over to the new version,
+    while changed and untagged entries are rebuilt.
+    """
+    cache = ResponseCache()
+    cache.publish("v1")
+    cache.put("v1", "A", b"a", tags=frozenset({"product:A", "category:1"}))
+    cache.put("v1", "B", b"b", tags=frozenset({"product:B"}))
+    cache.put("v1", "search", b"results")
+    changes = {"v1": frozenset({"product:C", "category:1", "catalog"})}
+    changed_since = lambda version: changes.get(version)
+    cache.publish("v2")
+
+    assert cache.get("v2", "B", changed_since).body == b"b"
+    assert cache.get("v2", "A", changed_since) is None
+    assert cache.get("v2", "search", changed_since) is None
+    # Carried-over entries now belong to the new version
+    assert cache.get("v2", "B").body == b"b"
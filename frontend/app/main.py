@@ -1,53 +1,219 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Tuple
+
 import httpx
 from fastapi import FastAPI, Request, Query
+from fastapi.responses import HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from typing import Optional
+
+from app.page_cache import CachedPage, PageCache
+
+logger = logging.getLogger(__name__)
 
 templates = Jinja2Templates(directory="templates")
 
-app = FastAPI()
+# Backend API URL. Docker Compose allows using the service name for internal networking.
+BACKEND_API_URL = os.getenv("BACKEND_API_URL", "http://backend:8000/api/v1")
+
+# Connection pool and timeouts of the client used to call the backend
+BACKEND_MAX_CONNECTIONS = int(os.getenv("BACKEND_MAX_CONNECTIONS", "100"))
+BACKEND_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("BACKEND_MAX_KEEPALIVE_CONNECTIONS", "20"))
+BACKEND_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("BACKEND_KEEPALIVE_EXPIRY_SECONDS", "30"))
+BACKEND_CONNECT_TIMEOUT_SECONDS = float(os.getenv("BACKEND_CONNECT_TIMEOUT_SECONDS", "1"))
+BACKEND_TIMEOUT_SECONDS = float(os.getenv("BACKEND_TIMEOUT_SECONDS", "3"))
+
+# Rendered pages kept in memory: served as they are for PAGE_CACHE_FRESH_SECONDS, then for
+# PAGE_CACHE_STALE_SECONDS more while they are revalidated against the backend's ETag in the background
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "512"))
+PAGE_CACHE_FRESH_SECONDS = float(os.getenv("PAGE_CACHE_FRESH_SECONDS", "5"))
+PAGE_CACHE_STALE_SECONDS = float(os.getenv("PAGE_CACHE_STALE_SECONDS", "60"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Creates a single HTTP client for the whole application, so page views reuse
+    keep-alive connections to the backend instead of opening new ones.
+    """
+    app.state.backend = httpx.AsyncClient(
+        base_url=BACKEND_API_URL,
+        limits=httpx.Limits(
+            max_connections=BACKEND_MAX_CONNECTIONS,
+            max_keepalive_connections=BACKEND_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=BACKEND_KEEPALIVE_EXPIRY_SECONDS
+        ),
+        timeout=httpx.Timeout(BACKEND_TIMEOUT_SECONDS, connect=BACKEND_CONNECT_TIMEOUT_SECONDS)
+    )
+    yield
+    await app.state.backend.aclose()
+
+app = FastAPI(lifespan=lifespan)
 
 # Mounts the static files directory for serving CSS and images
 app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
 
-# Backend API URL. Docker Compose allows using the service name for internal networking.
-BACKEND_API_URL = "http://backend:8000/api/v1"
+# Number of products rendered per page on the main page
+PAGE_SIZE = 12
+
+page_cache = PageCache(
+    max_entries=PAGE_CACHE_MAX_ENTRIES,
+    fresh_seconds=PAGE_CACHE_FRESH_SECONDS,
+    stale_seconds=PAGE_CACHE_STALE_SECONDS
+)
+# References to the background revalidations in progress, so they are not garbage collected before they finish
+_revalidations: Set[asyncio.Task] = set()
+
+# Renders a page from the decoded backend response (None if the call failed) and its headers
+PageRenderer = Callable[[Optional[Any], httpx.Headers], Response]
+
+
+async def fetch_backend(request: Request, path: str, params: Optional[Dict[str, Any]] = None) -> Tuple[Optional[Any], httpx.Headers]:
+    """
+    Calls the backend with the shared client and returns the decoded JSON body and the response headers.
+    Failed calls (connection errors, timeouts, invalid bodies) are logged and, like non-200 responses,
+    return None so the page can still be rendered.
+    """
+    try:
+        response = await request.app.state.backend.get(path, params=params)
+        if response.status_code != 200:
+            return None, response.headers
+        return response.json(), response.headers
+    except (httpx.HTTPError, ValueError) as e:
+        logger.warning("Backend request to %s failed: %r", path, e)
+        return None, httpx.Headers()
+
+
+async def refresh_page(
+    request: Request,
+    key: Hashable,
+    path: str,
+    params: Optional[Dict[str, Any]],
+    render: PageRenderer,
+    page: Optional[CachedPage]
+) -> Response:
+    """
+    Calls the backend for the data of a page, conditionally when a previous rendering of it is cached: if the
+    backend answers 304 Not Modified, the cached page is kept without rendering it again. Pages rendered from a
+    successful response with an ETag are cached; if the backend cannot be reached, the cached page is served.
+    """
+    headers = {"If-None-Match": page.etag} if page is not None else None
+    try:
+        response = await request.app.state.backend.get(path, params=params, headers=headers)
+        if response.status_code == 304 and page is not None:
+            return HTMLResponse(page_cache.touch(key, page).body)
+        data = response.json() if response.status_code == 200 else None
+    except (httpx.HTTPError, ValueError) as e:
+        logger.warning("Backend request to %s failed: %r", path, e)
+        if page is not None:
+            return HTMLResponse(page.body)
+        return render(None, httpx.Headers())
+
+    rendered = render(data, response.headers)
+    etag = response.headers.get("ETag")
+    if data is not None and etag:
+        page_cache.put(key, rendered.body, etag)
+    else:
+        page_cache.discard(key)
+    return rendered
+
+
+async def revalidate_page(
+    request: Request,
+    key: Hashable,
+    path: str,
+    params: Optional[Dict[str, Any]],
+    render: PageRenderer,
+    page: CachedPage
+) -> None:
+    try:
+        await refresh_page(request, key, path, params, render, page)
+    finally:
+        page_cache.end_revalidation(key)
+
+
+async def cached_page(
+    request: Request,
+    key: Hashable,
+    path: str,
+    params: Optional[Dict[str, Any]],
+    render: PageRenderer
+) -> Response:
+    """
+    Serves a page rendered from a single backend call through the page cache. Fresh pages are served without
+    calling the backend; stale ones are served while a background task revalidates them (one per page at a time);
+    older ones are revalidated before responding.
+    """
+    page = page_cache.get(key)
+    if page is not None:
+        if page_cache.is_fresh(page):
+            return HTMLResponse(page.body)
+        if page_cache.is_servable_stale(page):
+            if page_cache.start_revalidation(key):
+                task = asyncio.create_task(revalidate_page(request, key, path, params, render, page))
+                _revalidations.add(task)
+                task.add_done_callback(_revalidations.discard)
+            return HTMLResponse(page.body)
+    return await refresh_page(request, key, path, params, render, page)
 
 
 @app.get("/")
 async def home(
     request: Request,
+    q: Optional[str] = Query(None),
     category: Optional[str] = Query(None),
-    brand: Optional[str] = Query(None)
+    brand: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None),
+    offset: int = Query(0, ge=0)
 ):
     """
-    Renders the main page with a list of products, supporting optional filtering by category and brand.
-    Fetches product data from the backend API and provides hardcoded categories and brands for demonstration purposes.
+    Renders the main page with a page of products, supporting optional filtering by category and brand.
+    With a search query (q), the products are the best matches of the backend's full-text search, and the category
+    and brand options are the search's facets; otherwise the listing is shown with hardcoded options.
     """
-    async with httpx.AsyncClient() as client:
+    q = q.strip() if q else None
+    if q:
+        path = "/items/search"
+        params = {"q": q, "category": category, "brand": brand, "limit": PAGE_SIZE, "offset": offset}
+    else:
         # Request the product list from the backend API
-        params = {"category": category, "brand": brand}
-        # Remove None values to avoid sending empty query parameters
-        active_params = {k: v for k, v in params.items() if v is not None}
-
-        products_response = await client.get(f"{BACKEND_API_URL}/items", params=active_params)
-        products = products_response.json() if products_response.status_code == 200 else []
-
-        # In a real scenario, categories and brands would be fetched from the API
-        # For this test, they are hardcoded for simplicity
-        categories = ["Smartphones", "Muebles", "Papelería"]
-        brands = ["Apple", "Samsung", "Motorola", "Maderkit", "Madesa", "Norma", "Scribe", "Offi-Esco"]
-
-    return templates.TemplateResponse("index.html", {
-        "request": request,
-        "products": products,
-        "categories": categories,
-        "brands": brands,
-        "selected_category": category,
-        "selected_brand": brand
-    })
+        path = "/items"
+        params = {"category": category, "brand": brand, "limit": PAGE_SIZE, "cursor": cursor}
+    # Remove None values to avoid sending empty query parameters
+    active_params = {k: v for k, v in params.items() if v is not None}
+
+    def render(data: Optional[Any], headers: httpx.Headers) -> Response:
+        next_cursor = next_offset = None
+        if q:
+            products = data["items"] if data else []
+            categories = [facet["name"] for facet in data["facets"]["categories"]] if data else []
+            brands = [facet["name"] for facet in data["facets"]["brands"]] if data else []
+            if data and data["total"] > offset + len(products):
+                next_offset = offset + len(products)
+        else:
+            products = data
+            if products is not None:
+                next_cursor = headers.get("X-Next-Cursor")
+
+            # In a real scenario, categories and brands would be fetched from the API
+            # For this test, they are hardcoded for simplicity
+            categories = ["Smartphones", "Muebles", "Papelería"]
+            brands = ["Apple", "Samsung", "Motorola", "Maderkit", "Madesa", "Norma", "Scribe", "Offi-Esco"]
+
+        return templates.TemplateResponse(request, "index.html", {
+            "products": products or [],
+            "categories": categories,
+            "brands": brands,
+            "query": q,
+            "selected_category": category,
+            "selected_brand": brand,
+            "next_cursor": next_cursor,
+            "next_offset": next_offset
+        })
+
+    return await cached_page(request, ("home", q, category, brand, cursor, offset), path, active_params, render)
 
 
 
@@ -55,14 +221,41 @@ async def home(
 async def item_detail(request: Request, item_id: str):
     """
     Renders the detail page for a specific product.
-    Fetches product details from the backend API and passes them to the template.
+    Fetches the product details, without recommendations, from the backend API and passes them to the template.
+    Related products are loaded by the page after the first paint, from the item_related fragment.
+    The rendered page is cached and revalidated against the ETag of the backend's item response.
     """
-    async with httpx.AsyncClient() as client:
-        # Request product details from the backend API
-        product_response = await client.get(f"{BACKEND_API_URL}/items/{item_id}")
-        product = product_response.json() if product_response.status_code == 200 else None
+    def render(product: Optional[Any], headers: httpx.Headers) -> Response:
+        return templates.TemplateResponse(request, "detail.html", {
+            "product": product
+        })
 
-    return templates.TemplateResponse("detail.html", {
-        "request": request,
-        "product": product
-    })
\ No newline at end of file
+    return await cached_page(request, ("item", item_id), f"/items/{item_id}", None, render)
+
+
+@app.get("/item/{item_id}/related")
+async def item_related(request: Request, item_id: str):
+    """
+    Renders the related products of an item as an HTML fragment, inserted into the detail page once it has loaded.
+    Renders an empty fragment if the recommendations cannot be fetched.
+    """
+    related_products, _ = await fetch_backend(request, f"/items/{item_id}/related")
+
+    return templates.TemplateResponse(request, "related.html", {
+        "related_products": related_products or []
+    })
+
+
+@app.get("/item/{item_id}/reviews")
+async def item_reviews(request: Request, item_id: str, cursor: Optional[str] = Query(None)):
+    """
+    Renders the page of an item's reviews that follows the cursor as an HTML fragment, appended to the detail page
+    when more reviews are requested. The fragment ends with the button that loads the next page, if there is one.
+    """
+    reviews, headers = await fetch_backend(request, f"/items/{item_id}/reviews", params={"cursor": cursor} if cursor else None)
+
+    return templates.TemplateResponse(request, "reviews.html", {
+        "reviews": reviews or [],
+        "next_cursor": headers.get("X-Next-Cursor") if reviews is not None else None,
+        "item_id": item_id
+    })
@@ -0,0 +1,89 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Hashable, Optional, Set
+
+@dataclass(frozen=True)
+class CachedPage:
+    """A rendered page and the ETag of the backend response it was rendered from."""
+    body: bytes
+    etag: str
+    fetched_at: float
+
+class PageCache:
+    """
+    In-process LRU cache of rendered HTML pages, keyed by the route and its parameters.
+    Each page remembers the backend ETag it was rendered from, so once it gets old it can be revalidated with a
+    conditional request: a 304 Not Modified from the backend keeps the page without rendering it again.
+    Pages younger than fresh_seconds are served without calling the backend; for stale_seconds more they are still
+    served, while they are revalidated in the background (stale-while-revalidate).
+    Only used from the event loop, so it needs no lock.
+    """
+    def __init__(
+        self,
+        max_entries: int = 512,
+        fresh_seconds: float = 5.0,
+        stale_seconds: float = 60.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_entries = max_entries
+        self.fresh_seconds = fresh_seconds
+        self.stale_seconds = stale_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, CachedPage]" = OrderedDict()
+        # Keys being revalidated in the background, so a burst of requests triggers a single revalidation
+        self._revalidating: Set[Hashable] = set()
+
+    def get(self, key: Hashable) -> Optional[CachedPage]:
+        """
+        Returns the cached page for key, however old it is, or None if there is none.
+        """
+        page = self._entries.get(key)
+        if page is None:
+            return None
+        self._entries.move_to_end(key)
+        return page
+
+    def is_fresh(self, page: CachedPage) -> bool:
+        """Returns True if the page can be served without contacting the backend."""
+        return self._clock() - page.fetched_at < self.fresh_seconds
+
+    def is_servable_stale(self, page: CachedPage) -> bool:
+        """Returns True if the page is stale but may still be served while it is revalidated in the background."""
+        return self._clock() - page.fetched_at < self.fresh_seconds + self.stale_seconds
+
+    def put(self, key: Hashable, body: bytes, etag: str) -> CachedPage:
+        """
+        Caches a page rendered from the backend response with the given ETag and returns it.
+        """
+        page = CachedPage(body=body, etag=etag, fetched_at=self._clock())
+        self._entries[key] = page
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return page
+
+    def touch(self, key: Hashable, page: CachedPage) -> CachedPage:
+        """
+        Marks a page as fresh again after the backend confirmed it is unchanged (304 Not Modified).
+        """
+        return self.put(key, page.body, page.etag)
+
+    def discard(self, key: Hashable) -> None:
+        """Drops the cached page for key, e.g. when its product no longer exists."""
+        self._entries.pop(key, None)
+
+    def start_revalidation(self, key: Hashable) -> bool:
+        """
+        Claims the background revalidation of key. Returns False if one is already in progress.
+        """
+        if key in self._revalidating:
+            return False
+        self._revalidating.add(key)
+        return True
+
+    def end_revalidation(self, key: Hashable) -> None:
+        self._revalidating.discard(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,275 @@
+# frontend/test/test_main.py
+
+import asyncio
+
+import httpx
+import pytest
+
+from app import main
+from app.main import app
+from app.page_cache import PageCache
+
+ITEM_PATH = "/api/v1/items/MLA1"
+
+
+def product(title):
+    return {
+        "id": "MLA1",
+        "title": title,
+        "images": ["/images/products/MLA1/1.jpg"],
+        "average_rating": 4.5,
+        "seller": {"name": "Tienda", "reputation": {"level": "green"}},
+        "price": {"amount": 1000, "currency": "COP"},
+        "stock": 3,
+        "accepted_payment_methods": [],
+        "description": "",
+        "specifications": {},
+        "review_count": 0,
+    }
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class FakeClock:
+    """Clock moved forward by hand, so the age of cached pages is exact."""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeBackend:
+    """
+    Backend stand-in serving a single product. Its ETag changes with the product's title; conditional requests
+    for the current ETag get a 304. Records every request, and can be made unreachable or held until released.
+    """
+    def __init__(self):
+        self.title = "Producto v1"
+        self.status_code = 200
+        self.down = False
+        self.requests = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    @property
+    def etag(self):
+        return f'"{self.title}"'
+
+    async def handle(self, request):
+        self.requests.append(request)
+        await self.release.wait()
+        if self.down:
+            raise httpx.ConnectError("Connection refused", request=request)
+        if self.status_code != 200:
+            return httpx.Response(self.status_code, json={"detail": "Not found"})
+        if request.headers.get("If-None-Match") == self.etag:
+            return httpx.Response(304, headers={"ETag": self.etag})
+        return httpx.Response(200, json=product(self.title), headers={"ETag": self.etag})
+
+
+@pytest.fixture
+def frontend(monkeypatch):
+    """
+    Serves the frontend against a fake backend, with an empty page cache driven by a fake clock.
+    Yields the client, the backend, the clock and a counter of rendered pages.
+    """
+    backend = FakeBackend()
+    clock = FakeClock()
+    monkeypatch.setattr(main, "page_cache", PageCache(fresh_seconds=5, stale_seconds=60, clock=clock))
+    renders = []
+    template_response = main.templates.TemplateResponse
+
+    def counting_template_response(request, name, context, *args, **kwargs):
+        renders.append(name)
+        return template_response(request, name, context, *args, **kwargs)
+
+    monkeypatch.setattr(main.templates, "TemplateResponse", counting_template_response)
+    app.state.backend = httpx.AsyncClient(
+        transport=httpx.MockTransport(backend.handle), base_url="http://backend/api/v1"
+    )
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    yield client, backend, clock, renders
+    del app.state.backend
+
+
+async def finish_revalidations():
+    """Waits for the background revalidations started by the requests served so far."""
+    await asyncio.gather(*main._revalidations)
+
+
+@pytest.mark.anyio
+async def test_first_view_renders_and_caches_the_page(frontend):
+    """
+    Tests that an uncached page is fetched unconditionally, rendered, and cached under the backend's ETag.
+    """
+    client, backend, clock, renders = frontend
+
+    response = await client.get("/item/MLA1")
+
+    assert response.status_code == 200
+    assert "Producto v1" in response.text
+    assert [request.url.path for request in backend.requests] == [ITEM_PATH]
+    assert "If-None-Match" not in backend.requests[0].headers
+    assert renders == ["detail.html"]
+    assert main.page_cache.get(("item", "MLA1")).etag == backend.etag
+
+
+@pytest.mark.anyio
+async def test_fresh_pages_are_served_without_calling_the_backend(frontend):
+    """
+    Tests that within fresh_seconds the cached HTML is served as is, without a backend call or a new rendering.
+    """
+    client, backend, clock, renders = frontend
+    first = await client.get("/item/MLA1")
+    backend.title = "Producto v2"
+    clock.now += 4
+
+    response = await client.get("/item/MLA1")
+
+    assert response.content == first.content
+    assert len(backend.requests) == 1
+    assert renders == ["detail.html"]
+
+
+@pytest.mark.anyio
+async def test_stale_pages_are_served_while_revalidated_in_the_background(frontend):
+    """
+    Tests that a stale page is served at once from the cache, and that the background revalidation renders and
+    caches the new version of the page when the backend's ETag changed.
+    """
+    client, backend, clock, renders = frontend
+    first = await client.get("/item/MLA1")
+    backend.title = "Producto v2"
+    clock.now += 10
+
+    response = await client.get("/item/MLA1")
+    await finish_revalidations()
+
+    assert response.content == first.content
+    assert len(backend.requests) == 2
+    assert backend.requests[1].headers["If-None-Match"] == '"Producto v1"'
+    assert renders == ["detail.html", "detail.html"]
+    assert b"Producto v2" in main.page_cache.get(("item", "MLA1")).body
+
+    response = await client.get("/item/MLA1")
+
+    assert "Producto v2" in response.text
+    assert len(backend.requests) == 2
+
+
+@pytest.mark.anyio
+async def test_a_burst_on_a_stale_page_triggers_a_single_revalidation(frontend):
+    """
+    Tests that concurrent requests for a stale page are all served from the cache while a single background
+    revalidation is in flight, and that once it gets a 304 the page is fresh again without being rendered again.
+    """
+    client, backend, clock, renders = frontend
+    first = await client.get("/item/MLA1")
+    clock.now += 10
+    backend.release.clear()
+
+    responses = await asyncio.gather(*(client.get("/item/MLA1") for _ in range(5)))
+
+    assert all(response.content == first.content for response in responses)
+    assert len(main._revalidations) == 1
+    backend.release.set()
+    await finish_revalidations()
+
+    assert len(backend.requests) == 2
+    assert renders == ["detail.html"]
+    assert main.page_cache.is_fresh(main.page_cache.get(("item", "MLA1")))
+
+
+@pytest.mark.anyio
+async def test_old_pages_are_revalidated_before_responding(frontend):
+    """
+    Tests that a page older than the stale window is revalidated before the response: a 304 serves the cached
+    HTML without rendering it again and makes it fresh, while a changed ETag serves the page rendered anew.
+    """
+    client, backend, clock, renders = frontend
+    first = await client.get("/item/MLA1")
+    clock.now += 100
+
+    response = await client.get("/item/MLA1")
+
+    assert response.content == first.content
+    assert len(backend.requests) == 2
+    assert backend.requests[1].headers["If-None-Match"] == '"Producto v1"'
+    assert renders == ["detail.html"]
+    assert not main._revalidations
+    assert main.page_cache.is_fresh(main.page_cache.get(("item", "MLA1")))
+
+    backend.title = "Producto v2"
+    clock.now += 100
+
+    response = await client.get("/item/MLA1")
+
+    assert "Producto v2" in response.text
+    assert renders == ["detail.html", "detail.html"]
+    assert main.page_cache.get(("item", "MLA1")).etag == '"Producto v2"'
+
+
+@pytest.mark.anyio
+async def test_cached_pages_are_served_while_the_backend_is_down(frontend):
+    """
+    Tests that when the backend cannot be reached the last cached rendering is served, in the background and
+    before responding alike, and is kept in the cache.
+    """
+    client, backend, clock, renders = frontend
+    first = await client.get("/item/MLA1")
+    backend.down = True
+
+    clock.now += 10
+    stale = await client.get("/item/MLA1")
+    await finish_revalidations()
+    clock.now += 100
+    old = await client.get("/item/MLA1")
+
+    assert stale.content == first.content
+    assert old.status_code == 200
+    assert old.content == first.content
+    assert len(backend.requests) == 3
+    assert renders == ["detail.html"]
+    assert main.page_cache.get(("item", "MLA1")) is not None
+
+
+@pytest.mark.anyio
+async def test_uncached_pages_render_empty_while_the_backend_is_down(frontend):
+    """
+    Tests that without a cached rendering, a backend failure renders the page without data and caches nothing.
+    """
+    client, backend, clock, renders = frontend
+    backend.down = True
+
+    response = await client.get("/item/MLA1")
+
+    assert response.status_code == 200
+    assert "Producto no encontrado" in response.text
+    assert renders == ["detail.html"]
+    assert len(main.page_cache) == 0
+
+
+@pytest.mark.anyio
+async def test_pages_whose_data_is_gone_are_discarded(frontend):
+    """
+    Tests that when a revalidation gets an error response, e.g. the product was deleted, the page is rendered
+    without data and dropped from the cache, so the next request calls the backend again.
+    """
+    client, backend, clock, renders = frontend
+    await client.get("/item/MLA1")
+    backend.status_code = 404
+    clock.now += 100
+
+    response = await client.get("/item/MLA1")
+
+    assert "Producto no encontrado" in response.text
+    assert main.page_cache.get(("item", "MLA1")) is None
+
+    await client.get("/item/MLA1")
+
+    assert len(backend.requests) == 3
+    assert renders == ["detail.html"] * 3
@@ -0,0 +1,92 @@
+# frontend/test/test_page_cache.py
+
+from app.page_cache import PageCache
+
+
+class FakeClock:
+    """Clock moved forward by hand, so the age of cached pages is exact."""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_pages_are_fresh_then_servable_stale_then_expired():
+    """
+    Tests that a page is fresh for fresh_seconds, can then be served stale for stale_seconds more, and
+    is still returned by get once it is too old, so it can be revalidated against its ETag.
+    """
+    clock = FakeClock()
+    cache = PageCache(fresh_seconds=5, stale_seconds=60, clock=clock)
+    page = cache.put("home", b"<html>v1</html>", '"v1"')
+
+    assert cache.is_fresh(page)
+
+    clock.now += 5
+    assert not cache.is_fresh(page)
+    assert cache.is_servable_stale(page)
+
+    clock.now += 60
+    assert not cache.is_servable_stale(page)
+    assert cache.get("home") == page
+
+
+def test_touch_makes_a_page_fresh_again():
+    """
+    Tests that touching a page after a 304 keeps its body and ETag and restarts its age.
+    """
+    clock = FakeClock()
+    cache = PageCache(fresh_seconds=5, stale_seconds=60, clock=clock)
+    page = cache.put("home", b"<html>v1</html>", '"v1"')
+    clock.now += 100
+
+    touched = cache.touch("home", page)
+
+    assert (touched.body, touched.etag) == (page.body, page.etag)
+    assert cache.is_fresh(touched)
+    assert cache.get("home") == touched
+
+
+def test_least_recently_used_pages_are_evicted():
+    """
+    Tests that once max_entries pages are cached, adding one evicts the page least recently read or written.
+    """
+    cache = PageCache(max_entries=2, clock=FakeClock())
+    cache.put("a", b"a", '"a"')
+    cache.put("b", b"b", '"b"')
+    cache.get("a")
+
+    cache.put("c", b"c", '"c"')
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_discard_drops_the_page():
+    """
+    Tests that a discarded page is no longer returned, and that discarding a missing key is a no-op.
+    """
+    cache = PageCache(clock=FakeClock())
+    cache.put("item", b"item", '"item"')
+
+    cache.discard("item")
+    cache.discard("item")
+
+    assert cache.get("item") is None
+    assert len(cache) == 0
+
+
+def test_a_page_is_revalidated_by_one_task_at_a_time():
+    """
+    Tests that the background revalidation of a key can only be claimed again once the previous one ended.
+    """
+    cache = PageCache(clock=FakeClock())
+
+    assert cache.start_revalidation("item")
+    assert not cache.start_revalidation("item")
+    assert cache.start_revalidation("other")
+
+    cache.end_revalidation("item")
+    assert cache.start_revalidation("item")